@@ -0,0 +1,242 @@
+# Dashboard benchmark: startup (import + data load), render_content for every tab, every team chart
+# callback over 1, 6 and 30 teams and several season spans, the conference/division group callbacks over each
+# level and season span, the similar seasons panel and the projections at each number of simulations, on
+# NBA_long and on synthetic scaled-up
+# versions of it (75 seasons, and game-level rows). Each dataset runs in fresh subprocesses pointed at
+# it through NBA_DATA_CSV, once with no snapshot or prerendered views (cold start) and once with them built
+# (warm start). Snapshots and prerendered views go to a temp directory, never the repo's data directory.
+# Results are written as JSON tagged with the git commit, so two runs can be compared.
+#
+#   python benchmarks/bench_dash.py                       # writes benchmarks/results/dash-<commit>.json
+#   python benchmarks/bench_dash.py --datasets NBA_long --output before.json
+#   python benchmarks/bench_dash.py --compare before.json after.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, '..')
+DASH_DIR = os.path.join(REPO_DIR, 'nba_dash')
+
+default_teams = ['Los Angeles Lakers', 'Toronto Raptors', 'Golden State Warriors', 'Dallas Mavericks', 'Oklahoma City Thunder', 'Miami Heat']
+
+TEAM_COUNTS = [1, 6, 30]
+SEASON_SPANS = [1, 5, None]  # None is every season in the data
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+# Runs inside the subprocess: import the app against whatever NBA_DATA_CSV points at and time it
+def child(periods_per_season, run_callbacks, repeat):
+    sys.path.insert(0, DASH_DIR)
+
+    start = time.perf_counter()
+    import nba_dash
+    state = nba_dash.current()
+    results = {'import_seconds': time.perf_counter() - start,
+               'load_seconds': state.snapshot.load_seconds,
+               'snapshot_rebuilt': state.snapshot.rebuilt,
+               'rows': len(state.store)}
+
+    if run_callbacks:
+        from plotly.utils import PlotlyJSONEncoder
+
+        # Projections run as in a gunicorn worker, on its simulation pool
+        nba_dash.simulator.start()
+
+        # What Dash does with a callback's return value before sending it
+        def respond(func, *args):
+            return json.dumps(func(*args), cls=PlotlyJSONEncoder)
+
+        results['render_content'] = {tab: {'seconds': best_of(lambda: respond(nba_dash.render_content, tab), repeat)}
+                                     for tab in nba_dash.tabs}
+
+        store = state.store
+        teams = [team for team in default_teams if team in store.team_lookup] + \
+                [team for team in store.team_names.tolist() if team not in default_teams]
+        years = sorted(set(store.year.tolist()))
+
+        def first_year(seasons):
+            return years[0] if seasons is None else years[max(len(years) - seasons * periods_per_season, 0)]
+
+        def span(seasons):
+            return 'all seasons' if seasons is None else '{} seasons'.format(seasons)
+
+        # Callback arguments after n_clicks, from (teams, start_year, end_year). Line graphs aren't zoomed (relayoutData None)
+        callbacks = [('update_line_graph_1', lambda teams, start_year, end_year: (None, teams, start_year, end_year)),
+                     ('update_line_graph_2', lambda teams, start_year, end_year: (None, teams, 'nrtg_a', start_year, end_year)),
+                     ('update_scatter_graph_1', lambda teams, start_year, end_year: (teams, start_year, end_year)),
+                     ('update_scatter_graph_2', lambda teams, start_year, end_year: (teams, start_year, end_year))]
+        # Group callbacks, from (level, start_year, end_year)
+        group_callbacks = [('update_group_line_graph', lambda level, start_year, end_year: (level, 'nrtg_a', start_year, end_year)),
+                           ('update_group_scatter_graph', lambda level, start_year, end_year: (level, start_year, end_year))]
+
+        # (case, callback, arguments)
+        cases = []
+        for name, arguments in callbacks:
+            for n_teams in TEAM_COUNTS:
+                for seasons in SEASON_SPANS:
+                    cases.append(('{}/{} teams/{}'.format(name, n_teams, span(seasons)), name,
+                                  (1,) + arguments(teams[:n_teams], first_year(seasons), years[-1])))
+        for name, arguments in group_callbacks:
+            for level in nba_dash.group_levels:
+                for seasons in SEASON_SPANS:
+                    cases.append(('{}/{}/{}'.format(name, level, span(seasons)), name,
+                                  (1,) + arguments(level, first_year(seasons), years[-1])))
+        # A click on the first team's last season in a rating scatter, as the browser sends it
+        click_data = {'points': [{'customdata': [teams[0], years[-1]]}]}
+        cases.append(('update_similar_seasons_1/1 season', 'update_similar_seasons_1', (click_data,)))
+        # Projections of the last season: cold runs simulate, cached ones reuse the projection and its figures
+        for n_sims in nba_dash.projection_sims:
+            cases.append(('update_projection_graphs/{} sims'.format(n_sims), 'update_projection_graphs', (1, years[-1], n_sims)))
+
+        results['callbacks'] = {}
+        for case, name, args in cases:
+            # The undecorated function, so it can be called without Dash's request context
+            func = getattr(nba_dash, name)
+            func = getattr(func, '__wrapped__', func)
+
+            def cold():
+                nba_dash.figure_cache.clear()
+                nba_dash.simulator.clear()
+                return respond(func, *args)
+
+            # A failing case is recorded rather than ending the run, so regressions show up in compare
+            try:
+                results['callbacks'][case] = {'cold_seconds': best_of(cold, repeat),
+                                              'cached_seconds': best_of(lambda: respond(func, *args), repeat),
+                                              'payload_bytes': len(cold())}
+            except Exception as e:
+                results['callbacks'][case] = {'error': '{}: {}'.format(type(e).__name__, str(e).strip().splitlines()[0])}
+
+    print(json.dumps(results))
+
+def run_child(env, periods_per_season, run_callbacks, repeat):
+    command = [sys.executable, os.path.abspath(__file__), '--child',
+               '--periods-per-season', str(periods_per_season), '--repeat', str(repeat)]
+    if run_callbacks:
+        command.append('--callbacks')
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode:
+        sys.exit('Benchmark subprocess failed:\n{}'.format(process.stderr))
+    results = json.loads(process.stdout.strip().splitlines()[-1])
+    results['process_seconds'] = time.perf_counter() - start
+    return results
+
+# Datasets by name: (NBA_long-shaped frame, rows per team per season)
+def datasets(names):
+    from synthetic import load_nba_long, scale_nba_long, game_level_nba_long
+
+    NBA_long = load_nba_long()
+    builders = {'NBA_long': lambda: (NBA_long, 1),
+                'seasons_75': lambda: (seasons_75(scale_nba_long(NBA_long, season_factor=4)), 1),
+                'games': lambda: (game_level_nba_long(NBA_long), 82)}
+    for name in names:
+        yield (name,) + builders[name]()
+
+def seasons_75(df):
+    years = df.index.get_level_values('year')
+    return df[years > years.max() - 75]
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, check=True,
+                                    stdout=subprocess.PIPE, universal_newlines=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+def run(names, repeat, output):
+    commit, dirty = git_commit()
+    results = {'commit': commit, 'dirty': dirty, 'python': platform.python_version(),
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'datasets': {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, df, periods_per_season in datasets(names):
+            csv_path = os.path.join(tmp, '{}.csv'.format(name))
+            df.reset_index().to_csv(csv_path, index=False)
+            env = dict(os.environ, NBA_DATA_CSV=csv_path, NBA_SNAPSHOT_DIR=os.path.join(tmp, 'snapshots'),
+                       NBA_PRERENDER_DIR=os.path.join(tmp, 'prerendered'))
+
+            cold = run_child(env, periods_per_season, False, repeat)
+            warm = run_child(env, periods_per_season, True, repeat)
+            results['datasets'][name] = dict(warm, cold_start=cold)
+            errors = sum('error' in case for case in warm['callbacks'].values())
+            print('{:<12}{:>9} rows  import cold {:>7.0f} ms  warm {:>7.0f} ms  {} callback cases failed'.format(
+                name, warm['rows'], cold['import_seconds'] * 1000, warm['import_seconds'] * 1000, errors))
+
+    output = output or os.path.join(BENCH_DIR, 'results', 'dash-{}{}.json'.format(commit, '-dirty' if dirty else ''))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Wrote {}'.format(output))
+
+# Values from a results file whose key ends with suffix, as {'dataset/.../metric': value}
+def flatten(tree, prefix='', suffix='seconds'):
+    flat = {}
+    for key, value in tree.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + '/', suffix))
+        elif key.endswith(suffix):
+            flat[path] = value
+    return flat
+
+# Print every timing in both files with the ratio new / base. Exits non-zero if any is slower than threshold
+def compare(base_path, new_path, threshold):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    base_times, new_times = flatten(base['datasets']), flatten(new['datasets'])
+
+    print('{} -> {}'.format(base['commit'], new['commit']))
+    regressions = 0
+    for key in sorted(set(base_times) & set(new_times)):
+        ratio = new_times[key] / base_times[key] if base_times[key] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{:<70}{:>10.2f}{:>10.2f}{:>8.2f}x{}'.format(key, base_times[key] * 1000, new_times[key] * 1000, ratio, flag))
+    print('{} of {} timings slower than {:.2f}x'.format(regressions, len(set(base_times) & set(new_times)), threshold))
+
+    base_errors, new_errors = flatten(base['datasets'], suffix='error'), flatten(new['datasets'], suffix='error')
+    for key in sorted(set(new_errors) - set(base_errors)):
+        print('NEW FAILURE {}: {}'.format(key, new_errors[key]))
+    for key in sorted(set(base_errors) - set(new_errors)):
+        print('fixed {}'.format(key))
+    return 1 if regressions or set(new_errors) - set(base_errors) else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', nargs='+', default=['NBA_long', 'seasons_75', 'games'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--callbacks', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--periods-per-season', type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.periods_per_season, args.callbacks, args.repeat)
+    elif args.compare:
+        sys.exit(compare(args.compare[0], args.compare[1], args.threshold))
+    else:
+        run(args.datasets, args.repeat, args.output)
@@ -0,0 +1,49 @@
+# Compare the old BeautifulSoup ratings parse with the targeted lxml parse in nba_team_scrape/parse.py
+# over a directory of saved NBA_{year}_ratings.html pages (the scrape's pages/ directory).
+#
+#   python benchmarks/bench_parse.py /path/to/nba_team_scrape/pages
+
+import os
+import sys
+import glob
+import time
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nba_team_scrape'))
+
+from parse import parse_ratings
+
+def soup_ratings(html):
+    soup = BeautifulSoup(html, 'lxml')
+    header = [th.get_text() for th in soup.find_all('tr')[1].find_all('th')][1:]
+    header = [item.replace('%', '_percent').replace('/', '_').lower() for item in header]
+    stats = pd.DataFrame([[td.text for td in row.find_all('td')] for row in soup.find_all('tr', class_=None)], columns=header).drop([0])
+    for col in [c for c in stats.columns if c not in ['team', 'conf', 'div']]:
+        stats[col] = pd.to_numeric(stats[col])
+    return stats
+
+def time_pages(func, pages):
+    start = time.perf_counter()
+    for html in pages:
+        func(html)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    paths = sorted(glob.glob(os.path.join(sys.argv[1], 'NBA_*_ratings.html')))
+
+    start = time.perf_counter()
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    read_time = time.perf_counter() - start
+
+    soup_time = time_pages(soup_ratings, pages)
+    lxml_time = time_pages(parse_ratings, pages)
+
+    print('{} pages, {:.1f} MB'.format(len(pages), sum(map(len, pages)) / 2 ** 20))
+    print('{:<16}{:>10.1f} ms'.format('read', read_time * 1000))
+    print('{:<16}{:>10.1f} ms'.format('BeautifulSoup', soup_time * 1000))
+    print('{:<16}{:>10.1f} ms  ({:.1f}x)'.format('parse_ratings', lxml_time * 1000, soup_time / lxml_time))
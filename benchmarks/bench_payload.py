@@ -0,0 +1,42 @@
+# Bytes per figure before and after the payload budget in nba_dash/payload.py, raw and compressed,
+# for each chart over 6 and 30 teams and all seasons. Runs on whatever data the app loads, so point
+# NBA_DATA_CSV at a larger file (e.g. one written from synthetic.game_level_nba_long) to see the effect at scale.
+#
+#   python benchmarks/bench_payload.py
+
+import gzip
+import time
+
+import brotli
+
+import synthetic  # noqa: F401 (puts nba_dash on the path)
+
+import nba_dash
+from payload import budget_figure
+
+def sizes(payload):
+    data = payload.encode('utf-8')
+    return len(data), len(gzip.compress(data, compresslevel=6)), len(brotli.compress(data, quality=4))
+
+if __name__ == '__main__':
+    store = nba_dash.current().store
+    teams = nba_dash.default_teams + [team for team in store.team_names.tolist() if team not in nba_dash.default_teams]
+    start_year, end_year = int(store.year.min()), int(store.year.max())
+
+    charts = [('line-graph-1', lambda teams: nba_dash.build_line_graph_1(store, teams, start_year, end_year)),
+              ('line-graph-2', lambda teams: nba_dash.build_line_graph_2(store, teams, 'nrtg_a', start_year, end_year)),
+              ('scatter-graph-1', lambda teams: nba_dash.build_scatter_graph_1(store, teams, start_year, end_year)),
+              ('scatter-graph-2', lambda teams: nba_dash.build_scatter_graph_2(store, teams, start_year, end_year))]
+
+    print('{:<18}{:>7}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}'.format(
+        'chart', 'teams', 'raw', 'raw gzip', 'raw br', 'budget', 'budget gzip', 'budget br', 'budget ms'))
+    for name, build in charts:
+        for n_teams in (6, len(teams)):
+            raw = sizes(build(teams[:n_teams]).to_json())
+            fig = build(teams[:n_teams])
+            start = time.perf_counter()
+            fig = budget_figure(fig)
+            elapsed = time.perf_counter() - start
+            budgeted = sizes(fig.to_json())
+            print('{:<18}{:>7}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12.1f}'.format(
+                name, n_teams, *(raw + budgeted), elapsed * 1000))
@@ -0,0 +1,68 @@
+# Compare the old outer-merge + wide_to_long reshape of the per-season team frames with the
+# direct long build in nba_team_scrape/reshape.py, by wall time and peak traced memory.
+#
+#   python benchmarks/bench_reshape.py
+
+import os
+import sys
+import time
+import tracemalloc
+from functools import reduce
+
+import pandas as pd
+
+from synthetic import load_nba_long
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nba_team_scrape'))
+
+from reshape import build_long
+
+STUBS = ['w_l_percent', 'mov', 'ortg', 'drtg', 'nrtg', 'mov_a', 'ortg_a', 'drtg_a', 'nrtg_a']
+
+# Per-season frames shaped like nba_team_stats_{year}.csv, cycling through the real seasons.
+# Divisions are renamed for the earliest third of seasons, like the 2005 realignment
+def season_frames(NBA_long, n_seasons):
+    base = NBA_long.reset_index()
+    real_years = sorted(base['year'].unique())
+    dfs = {}
+    for i in range(n_seasons):
+        year = 2020 - n_seasons + 1 + i
+        frame = base[base['year'] == real_years[i % len(real_years)]].drop(columns='year').fillna(0).reset_index(drop=True)
+        if i < n_seasons // 3:
+            frame['div'] = frame['div'].replace({'SE': 'A', 'SW': 'M', 'NW': 'M'})
+        dfs[str(year)] = frame
+    return dfs
+
+def legacy_long(dfs):
+    dfs = {year: df.copy() for year, df in dfs.items()}
+    for year in dfs:
+        dfs[year].columns = dfs[year].columns.map(lambda x: x + '_' + str(year) if x not in ('team', 'conf', 'div') else x)
+    merged = reduce(lambda left, right: pd.merge(left, right, on=['team', 'conf', 'div'], how='outer'), dfs.values())
+    NBA = merged.groupby('team').first().reset_index()
+    return pd.wide_to_long(NBA, stubnames=STUBS, i='team', j='year', sep='_', suffix=r'\d+')
+
+def measure(func, dfs, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(dfs)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(dfs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+if __name__ == '__main__':
+    NBA_long = load_nba_long()
+    print('{:>8}{:>12}{:>12}{:>12}{:>12}'.format('seasons', 'path', 'time (ms)', 'peak (MB)', 'rows'))
+    for n_seasons in (21, 75):
+        dfs = season_frames(NBA_long, n_seasons)
+        rows = len(build_long(dfs))
+        results = {}
+        for path, func in [('merge', legacy_long), ('direct', build_long)]:
+            results[path] = measure(func, dfs)
+            elapsed, peak = results[path]
+            print('{:>8}{:>12}{:>12.1f}{:>12.2f}{:>12}'.format(n_seasons, path, elapsed * 1000, peak / 2 ** 20, rows))
+        print('{:>8}{:>12}{:>11.1f}x{:>11.1f}x'.format('', 'speedup', results['merge'][0] / results['direct'][0], results['merge'][1] / results['direct'][1]))
@@ -0,0 +1,50 @@
+# Compare the MultiIndex .loc slicing the callbacks used to do with TeamSeasonStore gathers.
+#
+#   python benchmarks/bench_team_season_store.py
+
+import timeit
+
+from synthetic import load_nba_long, scale_nba_long
+
+from team_season_store import TeamSeasonStore
+
+default_teams = ['Los Angeles Lakers', 'Toronto Raptors', 'Golden State Warriors', 'Dallas Mavericks', 'Oklahoma City Thunder', 'Miami Heat']
+
+def loc_line(df, teams, start_year, end_year):
+    years = list(range(start_year, end_year + 1))
+    return df.loc[(teams, years), :].reset_index()
+
+def loc_scatter(df, teams, start_year, end_year):
+    years = list(range(start_year, end_year + 1))
+    return df.loc[(teams, years), :].fillna(0).reset_index()
+
+def store_line(store, teams, start_year, end_year):
+    return store.select(teams, start_year, end_year, ['conf', 'div', 'w_l_percent'])
+
+def store_scatter(store, teams, start_year, end_year):
+    return store.select(teams, start_year, end_year, fill_value=0)
+
+def best_of(func, *args, number=20, repeat=5):
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number
+
+def run(label, df):
+    store = TeamSeasonStore.from_frame(df)
+    teams = list(store.team_names)
+    years = df.index.get_level_values('year')
+    start_year, end_year = int(years.min()), int(years.max())
+    queries = [('6 teams, all seasons', default_teams, start_year, end_year),
+               ('all teams, all seasons', teams, start_year, end_year),
+               ('6 teams, last 5 seasons', default_teams, end_year - 4, end_year)]
+
+    print('\n{} ({} teams x {} seasons, {} rows)'.format(label, len(teams), end_year - start_year + 1, len(df)))
+    print('{:<26}{:>10}{:>14}{:>14}{:>10}'.format('query', 'path', '.loc (ms)', 'store (ms)', 'speedup'))
+    for name, query_teams, lo, hi in queries:
+        for path, loc_func, store_func in [('line', loc_line, store_line), ('scatter', loc_scatter, store_scatter)]:
+            loc_time = best_of(loc_func, df, query_teams, lo, hi)
+            store_time = best_of(store_func, store, query_teams, lo, hi)
+            print('{:<26}{:>10}{:>14.3f}{:>14.3f}{:>9.1f}x'.format(name, path, loc_time * 1000, store_time * 1000, loc_time / store_time))
+
+if __name__ == '__main__':
+    NBA_long = load_nba_long()
+    run('NBA_long', NBA_long)
+    run('100x synthetic', scale_nba_long(NBA_long, team_factor=10, season_factor=10))
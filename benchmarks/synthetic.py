@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nba_dash'))
+
+from data_snapshot import load_snapshot
+
+# NBA_long as the dashboard loads it
+def load_nba_long():
+    return load_snapshot().data
+
+# Scale NBA_long up by copying teams (suffixed names) and seasons (shifted years), jittering the metrics
+# so the copies aren't identical. team_factor=10, season_factor=10 gives a 100x frame
+def scale_nba_long(df, team_factor=1, season_factor=1, seed=0):
+    rng = np.random.default_rng(seed)
+    base = df.reset_index()
+    span = base['year'].max() - base['year'].min() + 1
+    metrics = base.select_dtypes('number').columns.drop('year')
+
+    frames = []
+    for t in range(team_factor):
+        for s in range(season_factor):
+            frame = base.copy()
+            if t:
+                frame['team'] = frame['team'].astype(str) + ' {}'.format(t)
+            frame['year'] = frame['year'] - s * span
+            frame[metrics] = frame[metrics] * rng.normal(1, 0.02, size=(len(frame), len(metrics)))
+            frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True).sort_values(['year', 'team']).set_index(['team', 'year'])
+
+# Game-level stand-in for NBA_long: every season split into games rows per team, with the year column
+# holding a running game number (season s, game g -> s * games + g + 1) so the dashboard's season
+# filters and store work unchanged on it
+def game_level_nba_long(df, games=82, seed=0):
+    rng = np.random.default_rng(seed)
+    base = df.reset_index()
+    metrics = base.select_dtypes('number').columns.drop('year')
+    season = base['year'] - base['year'].min()
+
+    frame = base.loc[base.index.repeat(games)].reset_index(drop=True)
+    game = np.tile(np.arange(games), len(base))
+    frame['year'] = np.repeat(season.to_numpy(), games) * games + game + 1
+    frame[metrics] = frame[metrics] * rng.normal(1, 0.05, size=(len(frame), len(metrics)))
+
+    return frame.sort_values(['year', 'team']).set_index(['team', 'year'])
@@ -0,0 +1,155 @@
+// Clientside versions of the chart callbacks, used when the app runs with NBA_DASH_CLIENTSIDE=1.
+// The team-season arrays arrive once per session in the team-season-data store (TeamSeasonStore.to_payload),
+// so Submit filters and draws in the browser without a round trip. Figures mirror what plotly express builds
+// on the server in nba_dash.py.
+
+(function() {
+    // Column value for row i, decoding label/code columns
+    function value(data, col, i) {
+        var column = data.columns[col];
+        return Array.isArray(column) ? column[i] : column.labels[column.codes[i]];
+    }
+
+    // Rows for the selected teams and seasons, in store order (season by season, teams alphabetical)
+    function selectRows(data, teams, startYear, endYear) {
+        var selected = {};
+        (teams || []).forEach(function(team) { selected[team] = true; });
+        var rows = [];
+        for (var i = 0; i < data.year.length; i++) {
+            var year = data.year[i];
+            if (year >= startYear && year <= endYear && selected[data.teams[data.team[i]]]) {
+                rows.push(i);
+            }
+        }
+        return rows;
+    }
+
+    function teamName(data, i) {
+        return data.teams[data.team[i]];
+    }
+
+    // Split rows into traces by key, in order of first appearance (as plotly express does)
+    function groupRows(rows, key) {
+        var order = [];
+        var groups = {};
+        rows.forEach(function(i) {
+            var k = key(i);
+            if (!(k in groups)) {
+                groups[k] = [];
+                order.push(k);
+            }
+            groups[k].push(i);
+        });
+        return order.map(function(k) { return {key: k, rows: groups[k]}; });
+    }
+
+    function layout(data, extra) {
+        var base = {template: data.template, legend: {tracegroupgap: 0}};
+        return Object.assign(base, extra);
+    }
+
+    function lineFigure(data, teams, startYear, endYear, y, hoverColumns, hoverTemplate, extraLayout) {
+        var rows = selectRows(data, teams, startYear, endYear);
+        var colors = data.colors.plotly;
+        var traces = groupRows(rows, function(i) { return teamName(data, i); }).map(function(group, n) {
+            return {
+                type: 'scatter',
+                mode: 'lines',
+                name: group.key,
+                legendgroup: group.key,
+                showlegend: true,
+                line: {color: colors[n % colors.length], dash: 'solid', shape: 'spline'},
+                x: group.rows.map(function(i) { return data.year[i]; }),
+                y: group.rows.map(function(i) { return value(data, y, i); }),
+                hovertext: group.rows.map(function(i) { return teamName(data, i); }),
+                customdata: group.rows.map(function(i) {
+                    return [teamName(data, i)].concat(hoverColumns.map(function(col) { return value(data, col, i); }));
+                }),
+                hovertemplate: hoverTemplate
+            };
+        });
+        return {data: traces, layout: layout(data, extraLayout)};
+    }
+
+    // Scatter of defensive vs offensive rating, sized by win-loss % and colored by colorBy ('div' or 'team').
+    // Missing values are drawn as 0, like fillna(0) on the server
+    function scatterFigure(data, teams, startYear, endYear, colorBy, palette, hoverTemplate, legendTitle) {
+        var rows = selectRows(data, teams, startYear, endYear);
+        var num = function(col, i) { var v = value(data, col, i); return v === null ? 0 : v; };
+        var key = colorBy === 'team' ? function(i) { return teamName(data, i); } : function(i) { return value(data, colorBy, i); };
+        var maxSize = rows.reduce(function(m, i) { return Math.max(m, num('w_l_percent', i)); }, 0);
+        var traces = groupRows(rows, key).map(function(group, n) {
+            return {
+                type: 'scatter',
+                mode: 'markers',
+                name: group.key,
+                legendgroup: group.key,
+                showlegend: true,
+                x: group.rows.map(function(i) { return num('drtg_a', i); }),
+                y: group.rows.map(function(i) { return num('ortg_a', i); }),
+                marker: {
+                    color: palette[n % palette.length],
+                    opacity: 0.7,
+                    size: group.rows.map(function(i) { return num('w_l_percent', i); }),
+                    sizemode: 'area',
+                    sizeref: maxSize / 400,
+                    symbol: 'circle'
+                },
+                hovertext: group.rows.map(key),
+                customdata: group.rows.map(function(i) {
+                    return [teamName(data, i), data.year[i], value(data, 'conf', i), value(data, 'div', i),
+                            num('w_l_percent', i), num('nrtg_a', i)];
+                }),
+                hovertemplate: hoverTemplate
+            };
+        });
+        return {data: traces, layout: layout(data, {
+            title: {text: 'Offensive vs. Defensive Rating (Adjusted)'},
+            xaxis: {title: {text: 'Defensive Rating (Adj)'}, range: [90, 120]},
+            yaxis: {title: {text: 'Offensive Rating (Adj)'}, range: [90, 122]},
+            legend: {title: {text: legendTitle}, tracegroupgap: 0, itemsizing: 'constant'},
+            width: 1000,
+            height: 800
+        })};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        nba: {
+            // A line chart's zoom goes on to the server (its zoom store) only when the figure is missing points of
+            // the selection; otherwise plotly zooms what it already has
+            zoomIfPartial: function(relayoutData, figure) {
+                var meta = figure && figure.layout && figure.layout.meta;
+                if (!relayoutData || !meta || !meta.partial) {
+                    return window.dash_clientside.no_update;
+                }
+                return relayoutData;
+            },
+
+            lineGraph1: function(n_clicks, teams, startYear, endYear, data) {
+                return lineFigure(data, teams, startYear, endYear, 'w_l_percent', ['conf', 'div'],
+                    '<b>%{hovertext}</b><br><br>year=%{x}<br>w_l_percent=%{y:.2%}<br>conf=%{customdata[1]}<br>div=%{customdata[2]}<extra></extra>',
+                    {title: {text: 'Win-Loss %'}, xaxis: {title: {text: 'Season'}}, yaxis: {title: {text: ''}, tickformat: '%'},
+                     legend: {title: {text: 'Team'}, tracegroupgap: 0}, hovermode: 'closest', width: 1250, height: 600});
+            },
+
+            lineGraph2: function(n_clicks, teams, rating, startYear, endYear, data) {
+                return lineFigure(data, teams, startYear, endYear, rating, [],
+                    '<b>%{hovertext}</b><br><br>year=%{x}<br>' + rating + '=%{y:.2f}<extra></extra>',
+                    {title: {text: 'Rating'}, xaxis: {title: {text: 'Season'}}, yaxis: {title: {text: /_z$/.test(rating) ? 'Std. dev. from league mean' : 'Points'}},
+                     legend: {title: {text: 'Team'}, tracegroupgap: 0}, hovermode: 'closest', width: 1250, height: 600});
+            },
+
+            scatterGraph1: function(n_clicks, teams, startYear, endYear, data) {
+                return scatterFigure(data, teams, startYear, endYear, 'div', data.colors.vivid_r,
+                    '<b>%{hovertext}</b><br><br>drtg_a=%{x:.2f}<br>ortg_a=%{y:.2f}<br>w_l_percent=%{customdata[4]:.2%}<br>team=%{customdata[0]}<br>year=%{customdata[1]}<br>conf=%{customdata[2]}<br>nrtg_a=%{customdata[5]:.2f}<extra></extra>',
+                    'Division');
+            },
+
+            scatterGraph2: function(n_clicks, teams, startYear, endYear, data) {
+                return scatterFigure(data, teams, startYear, endYear, 'team', data.colors.bold_r,
+                    '<b>%{hovertext}</b><br><br>drtg_a=%{x:.2f}<br>ortg_a=%{y:.2f}<br>w_l_percent=%{customdata[4]:.2%}<br>year=%{customdata[1]}<br>conf=%{customdata[2]}<br>div=%{customdata[3]}<br>nrtg_a=%{customdata[5]:.2f}<extra></extra>',
+                    'Team');
+            }
+        }
+    });
+})();
@@ -0,0 +1,52 @@
+// Revalidation for callback responses. Browsers never send If-None-Match on a POST, so this keeps the last few
+// responses for each callback output with their ETags (http_cache.py) and sends the tags with the next request
+// for that output. When the server answers 304 the kept response is replayed to the renderer instead.
+
+(function() {
+    var MAX_PER_OUTPUT = 8;
+    var kept = {};
+
+    var fetch = window.fetch.bind(window);
+
+    window.fetch = function(url, options) {
+        if (typeof url !== 'string' || url.indexOf('_dash-update-component') === -1 || !options || !options.body) {
+            return fetch(url, options);
+        }
+
+        var output;
+        try {
+            output = JSON.parse(options.body).output;
+        } catch (e) {
+            return fetch(url, options);
+        }
+
+        var entries = kept[output] || [];
+        if (entries.length) {
+            var headers = new Headers(options.headers || {});
+            headers.set('If-None-Match', entries.map(function(entry) { return entry.etag; }).join(', '));
+            options = Object.assign({}, options, {headers: headers});
+        }
+
+        return fetch(url, options).then(function(response) {
+            var etag = response.headers.get('ETag');
+            if (response.status === 304) {
+                var entry = entries.filter(function(entry) { return entry.etag === etag; })[0];
+                if (entry) {
+                    return new Response(entry.body, {status: 200, headers: {'Content-Type': 'application/json'}});
+                }
+                // A tag we sent but no longer have: ask again without any
+                var headers = new Headers(options.headers || {});
+                headers.delete('If-None-Match');
+                return fetch(url, Object.assign({}, options, {headers: headers}));
+            }
+            if (response.status === 200 && etag) {
+                return response.clone().text().then(function(body) {
+                    kept[output] = [{etag: etag, body: body}].concat(
+                        entries.filter(function(entry) { return entry.etag !== etag; })).slice(0, MAX_PER_OUTPUT);
+                    return response;
+                });
+            }
+            return response;
+        });
+    };
+})();
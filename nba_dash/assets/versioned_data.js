@@ -0,0 +1,80 @@
+// Versioned resources (http_cache.versioned_json). The layout's versioned stores hold only the URL of their JSON,
+// as {versioned: '/data/<version>-<build>-roll3/teams.json'}. The layout response is held back until each URL has
+// been fetched and its JSON put in the store in place of the URL. The URLs name the data version and are served
+// immutable, so after the first visit the browser (or the CDN) answers them without asking the app.
+// The clientside callbacks below fill the pickers and the franchise graph from the stores.
+
+(function() {
+    var fetch = window.fetch.bind(window);
+
+    // Components of a layout tree whose data is a versioned URL
+    function versionedStores(component, found) {
+        if (Array.isArray(component)) {
+            component.forEach(function(child) { versionedStores(child, found); });
+        } else if (component && typeof component === 'object' && component.props) {
+            var data = component.props.data;
+            if (data && typeof data.versioned === 'string') {
+                found.push(component);
+            }
+            versionedStores(component.props.children, found);
+        }
+        return found;
+    }
+
+    // Put the JSON of each versioned URL in its store. A store whose JSON can't be fetched keeps its URL, and the
+    // pickers it fills stay empty
+    function resolve(layout) {
+        return Promise.all(versionedStores(layout, []).map(function(store) {
+            var url = store.props.data.versioned;
+            return fetch(url, {credentials: 'same-origin'}).then(function(response) {
+                if (!response.ok) {
+                    throw new Error(url + ': ' + response.status);
+                }
+                return response.json();
+            }).then(function(data) {
+                store.props.data = data;
+            }).catch(function(error) {
+                console.error('Versioned resource not loaded', error);
+            });
+        })).then(function() { return layout; });
+    }
+
+    window.fetch = function(url, options) {
+        if (typeof url !== 'string' || !/_dash-layout$/.test(url.split('?')[0])) {
+            return fetch(url, options);
+        }
+        return fetch(url, options).then(function(response) {
+            if (response.status !== 200) {
+                return response;
+            }
+            return response.clone().json().then(resolve).then(function(layout) {
+                return new Response(JSON.stringify(layout), {status: 200, headers: {'Content-Type': 'application/json'}});
+            });
+        });
+    };
+
+    function loaded(data, field) {
+        return data && data[field] !== undefined;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        nba_data: {
+            // Team, start and end season options of one tab's pickers
+            pickerOptions: function(data) {
+                var noUpdate = window.dash_clientside.no_update;
+                if (!loaded(data, 'teams')) {
+                    return [noUpdate, noUpdate, noUpdate];
+                }
+                return [data.teams, data.seasons, data.seasons];
+            },
+
+            seasonOptions: function(data) {
+                return loaded(data, 'seasons') ? data.seasons : window.dash_clientside.no_update;
+            },
+
+            figure: function(data) {
+                return loaded(data, 'data') ? data : window.dash_clientside.no_update;
+            }
+        }
+    });
+})();
@@ -0,0 +1,112 @@
+import time
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Groupings the cube aggregates teams over, each season on its own
+LEVELS = ['conf', 'div']
+
+# Numeric columns of the store, base and derived alike
+def cube_metrics(store):
+    return [col for col, values in store.columns.items() if values.dtype.kind == 'f']
+
+# Rows of one season, teams in store order
+def season_rows(store, year):
+    rows = store.offsets[:, year - store.year_min]
+    return rows[rows >= 0]
+
+# Fingerprint of what a season's aggregates are computed from: its teams, their conference and division and
+# every metric value. A season whose fingerprint is unchanged in a new data version keeps its aggregates
+def season_digest(store, rows, metrics, values):
+    digest = hashlib.sha1()
+    digest.update('\0'.join(metrics).encode('utf-8'))
+    for labels in [store.team_names[store.team_code[rows]]] + [store.columns[level][rows] for level in LEVELS]:
+        digest.update('\0'.join(labels.astype(str).tolist()).encode('utf-8'))
+    digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+def season_values(store, rows, metrics):
+    return np.column_stack([store.columns[metric][rows].astype(np.float64) for metric in metrics])
+
+# Stats of every metric for each group of one season: the group labels, teams per group and, for each stat, a
+# groups x metrics array. Mean, min, max and count skip missing values; one sort and a reduceat per stat
+def aggregate(groups, values):
+    labels, codes = np.unique(groups.astype(str), return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(labels)))
+    values = values[order]
+
+    present = ~np.isnan(values)
+    count = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    total = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    return {'groups': labels,
+            'teams': np.bincount(codes, minlength=len(labels)),
+            'stats': {'mean': mean,
+                      'min': np.fmin.reduceat(values, starts, axis=0),
+                      'max': np.fmax.reduceat(values, starts, axis=0),
+                      'count': count}}
+
+# Aggregates of every metric over (conference or division, season), built from a TeamSeasonStore one season at a
+# time. Building from the previous version's cube only recomputes the seasons whose rows changed (a rescraped
+# season, a new one), reusing the rest, and never modifies the previous cube, which requests may still be reading
+class GroupCube:
+    def __init__(self, metrics, cells, digests):
+        self.metrics = metrics
+        self.metric_index = {metric: i for i, metric in enumerate(metrics)}
+        self.cells = cells
+        self.digests = digests
+
+    # Bytes per level of the group labels and stats arrays, cells reused from an earlier cube included
+    def column_memory(self):
+        memory = {level: 0 for level in LEVELS}
+        for (level, _), cell in self.cells.items():
+            memory[level] += cell['groups'].nbytes + cell['teams'].nbytes + sum(a.nbytes for a in cell['stats'].values())
+        return memory
+
+    @classmethod
+    def build(cls, store, previous=None):
+        start = time.perf_counter()
+        metrics = cube_metrics(store)
+        cells, digests = {}, {}
+        rebuilt = 0
+        for year in store.years.tolist():
+            rows = season_rows(store, year)
+            if not len(rows):
+                continue
+            values = season_values(store, rows, metrics)
+            digest = season_digest(store, rows, metrics, values)
+            if previous is not None and previous.digests.get(year) == digest:
+                for level in LEVELS:
+                    cells[level, year] = previous.cells[level, year]
+            else:
+                for level in LEVELS:
+                    cells[level, year] = aggregate(store.columns[level][rows], values)
+                rebuilt += 1
+            digests[year] = digest
+        logger.info('Aggregate cube: %d of %d seasons computed in %.1f ms', rebuilt, len(digests),
+                    (time.perf_counter() - start) * 1000)
+        return cls(metrics, cells, digests)
+
+    # One row per group and season from start_year to end_year, ready for plotly express: the group (under the
+    # level's name), year, teams in the group and '{metric}_{stat}' for each metric and stat asked for
+    def select(self, level, start_year, end_year, metrics, stats=('mean',)):
+        columns = [self.metric_index[metric] for metric in metrics]
+        years = [year for year in range(int(start_year), int(end_year) + 1) if (level, year) in self.cells]
+        cells = [self.cells[level, year] for year in years]
+        if not cells:
+            return {level: np.empty(0, dtype=str), 'year': np.empty(0, dtype=np.int64), 'teams': np.empty(0, dtype=np.int64),
+                    **{'{}_{}'.format(metric, stat): np.empty(0) for stat in stats for metric in metrics}}
+
+        selected = {level: np.concatenate([cell['groups'] for cell in cells]),
+                    'year': np.concatenate([np.full(len(cell['groups']), year) for year, cell in zip(years, cells)]),
+                    'teams': np.concatenate([cell['teams'] for cell in cells])}
+        for stat in stats:
+            values = np.concatenate([cell['stats'][stat][:, columns] for cell in cells])
+            for i, metric in enumerate(metrics):
+                selected['{}_{}'.format(metric, stat)] = values[:, i]
+        return selected
@@ -0,0 +1,88 @@
+import os
+import time
+import logging
+import threading
+
+from data_snapshot import CSV_PATH
+
+logger = logging.getLogger(__name__)
+
+# How often each process checks the csv for a new scrape, in seconds. 0 turns reloading off
+RELOAD_SECONDS = float(os.environ.get('NBA_DASH_RELOAD_SECONDS', 30))
+
+# Holds the state built from the current data version (anything with a version attribute) and swaps in a new one
+# when the csv changes. The next state is loaded and built entirely on the reload thread while requests keep
+# using the current one; the swap is a single reference assignment, so a request that read current() once
+# finishes on the version it started with, and the old state is freed when the last such request is done.
+# cleanup, if given, runs after every check, once the state of the check before is gone, to remove what the old
+# versions left behind
+class DataReloader:
+    def __init__(self, load, build, csv_path=CSV_PATH, interval=RELOAD_SECONDS, on_swap=None, cleanup=None):
+        self.load = load
+        self.build = build
+        self.csv_path = csv_path
+        self.interval = interval
+        self.on_swap = on_swap
+        self.cleanup = cleanup
+        self.reloads = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stat = self.csv_stat()
+        self._state = build(load())
+
+    def current(self):
+        return self._state
+
+    # Size and modification time of the csv, a cheap check before hashing it. None while it's missing
+    def csv_stat(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    # Load and swap in the data if the csv has a new version. Returns True if it did
+    def check(self):
+        with self._lock:
+            stat = self.csv_stat()
+            if stat is None or stat == self._stat:
+                return False
+
+            start = time.perf_counter()
+            snapshot = self.load()
+            old = self._state
+            if snapshot.version == old.version:
+                self._stat = stat
+                return False
+            self._state = state = self.build(snapshot)
+            # Only once the new state is in place, so a failed load is retried on the next check
+            self._stat = stat
+            self.reloads += 1
+            logger.info('Reloaded data version %s -> %s in %.1f ms', old.version, state.version,
+                        (time.perf_counter() - start) * 1000)
+        if self.on_swap is not None:
+            self.on_swap(old, state)
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                self.failures += 1
+                logger.exception('Reloading %s failed, still serving version %s', self.csv_path, self._state.version)
+            if self.cleanup is not None:
+                try:
+                    self.cleanup()
+                except Exception:
+                    logger.exception('Cleaning up after data version %s failed', self._state.version)
+
+    # Start checking in the background. Threads don't survive fork, so under gunicorn each worker starts its own
+    # once it's running (gunicorn.conf.py) rather than the preloading master
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name='nba-dash-reload', daemon=True)
+        self._thread.start()
@@ -0,0 +1,221 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import namedtuple
+from urllib.request import urlopen
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import numpy as np
+import pandas as pd
+
+from derived import DERIVED_KEY, add_derived
+
+logger = logging.getLogger(__name__)
+
+# Where the scraped data lives. NBA_long.csv is the source of truth, snapshots are derived from it
+DATA_URL = 'https://raw.githubusercontent.com/hrishipoola/NBA_dashboard/main/data/NBA_long.csv'
+DATA_DIR = os.environ.get('NBA_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+CSV_PATH = os.environ.get('NBA_DATA_CSV', os.path.join(DATA_DIR, 'NBA_long.csv'))
+SNAPSHOT_DIR = os.environ.get('NBA_SNAPSHOT_DIR', os.path.join(DATA_DIR, 'snapshots'))
+
+INDEX_COLS = ['team', 'year']
+
+# Bumped when what a snapshot holds for the same csv changes (2: derived columns, 3: compact dtypes), so older
+# snapshots are rebuilt
+SNAPSHOT_FORMAT = 3
+
+# Float columns are stored as float32 when no value moves by more than this in the round trip, else kept float64
+FLOAT32_TOLERANCE = float(os.environ.get('NBA_DASH_FLOAT32_TOLERANCE', 1e-4))
+
+# Shared mode: workers read the team-season columns straight out of one memory-mapped Arrow file
+# (load_shared_snapshot), so the data lives once in the page cache however many workers there are
+SHARED = os.environ.get('NBA_DASH_SHARED') == '1'
+
+Snapshot = namedtuple('Snapshot', ['data', 'version', 'load_seconds', 'rebuilt'])
+
+# Snapshot files of any version, format and window, named as every format so far has named them:
+# NBA_long.<version>[.v<format>][.roll<window>](.feather|.shared.arrow). Not the temp files of one being built
+SNAPSHOT_FILE = re.compile(r'^NBA_long\.[0-9a-f]{16}(\.v[0-9]+)?(\.roll[0-9]+)?(\.feather|\.shared\.arrow)$')
+
+# Content hash of the source csv, used as the data version
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+def snapshot_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, 'NBA_long.{}.v{}.{}.feather'.format(version, SNAPSHOT_FORMAT, DERIVED_KEY))
+
+# Only used when the csv isn't shipped next to the app, so the network is hit once rather than on every boot
+def download_csv(csv_path, url=DATA_URL):
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(csv_path, os.getpid())
+    with urlopen(url) as response, open(tmp_path, 'wb') as f:
+        f.write(response.read())
+    os.replace(tmp_path, csv_path)
+
+# Smallest dtypes that hold a flat NBA_long frame: string columns (team, conf, div) as categoricals with sorted
+# labels, so team codes are the ones TeamSeasonStore uses, year as the smallest integer type that fits (int16) and
+# each float column as float32 if that changes no value by more than tolerance. Columns that would are left float64
+def compact_dtypes(df, tolerance=FLOAT32_TOLERANCE):
+    compact = {}
+    kept = []
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object:
+            compact[col] = pd.Categorical(values.astype(str))
+        elif values.dtype.kind in 'iu':
+            compact[col] = pd.to_numeric(values, downcast='integer')
+        elif values.dtype == np.float64:
+            narrow = values.to_numpy().astype(np.float32)
+            if np.allclose(narrow, values.to_numpy(), rtol=0, atol=tolerance, equal_nan=True):
+                compact[col] = narrow
+            else:
+                compact[col] = values
+                kept.append(col)
+        else:
+            compact[col] = values
+    if kept:
+        logger.info('Kept float64 for %s: float32 would change values by more than %g', ', '.join(kept), tolerance)
+    return pd.DataFrame(compact, index=df.index)
+
+# Parse the csv once, add the derived metric columns (derived.py), compact the dtypes and write an uncompressed feather file so it
+# can be memory-mapped. Written to a temp file and renamed, since several workers may race to build the same version
+def build_snapshot(csv_path, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = compact_dtypes(add_derived(pd.read_csv(csv_path)))
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+# Load NBA_long from the local snapshot for the current csv version, rebuilding it only if the csv changed
+def load_snapshot(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    start = time.perf_counter()
+
+    if not os.path.exists(csv_path):
+        logger.warning('%s not found, downloading from %s', csv_path, DATA_URL)
+        download_csv(csv_path)
+
+    version = file_hash(csv_path)
+    path = snapshot_path(version, snapshot_dir)
+
+    rebuilt = not os.path.exists(path)
+    if rebuilt:
+        build_snapshot(csv_path, path)
+
+    table = feather.read_table(path, memory_map=True)
+    data = table.to_pandas().set_index(INDEX_COLS)
+
+    load_seconds = time.perf_counter() - start
+    logger.info('Loaded NBA_long %s (%d rows) in %.1f ms%s',
+                version, len(data), load_seconds * 1000, ', snapshot rebuilt' if rebuilt else '')
+
+    return Snapshot(data, version, load_seconds, rebuilt)
+
+def shared_snapshot_path(version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, 'NBA_long.{}.v{}.{}.shared.arrow'.format(version, SNAPSHOT_FORMAT, DERIVED_KEY))
+
+# Arrow layout for shared mode, one chunk per column so every column maps to one contiguous buffer.
+# Numeric columns keep NaN as NaN rather than null, so they can be viewed as numpy arrays without a copy.
+# Dtypes are compacted as for the feather snapshot, and the categoricals become dictionary arrays over the same
+# codes (for team, the codes TeamSeasonStore uses)
+def build_shared_snapshot(csv_path, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = compact_dtypes(add_derived(pd.read_csv(csv_path)))
+    arrays = []
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays.append(pa.DictionaryArray.from_arrays(values.cat.codes.to_numpy(), pa.array(values.cat.categories.to_numpy())))
+        else:
+            arrays.append(pa.array(values.to_numpy(), from_pandas=False))
+    table = pa.Table.from_arrays(arrays, names=list(df.columns))
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=max(len(df), 1))
+    os.replace(tmp_path, path)
+
+# Shared-mode counterpart of load_snapshot: data is the memory-mapped Arrow table, not a DataFrame.
+# Nothing is read until a column is touched, and the pages touched are shared with every other process mapping the file
+def load_shared_snapshot(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    start = time.perf_counter()
+
+    if not os.path.exists(csv_path):
+        logger.warning('%s not found, downloading from %s', csv_path, DATA_URL)
+        download_csv(csv_path)
+
+    version = file_hash(csv_path)
+    path = shared_snapshot_path(version, snapshot_dir)
+
+    rebuilt = not os.path.exists(path)
+    if rebuilt:
+        build_shared_snapshot(csv_path, path)
+
+    table = feather.read_table(path, memory_map=True)
+
+    load_seconds = time.perf_counter() - start
+    logger.info('Mapped NBA_long %s (%d rows) from %s in %.1f ms%s',
+                version, table.num_rows, path, load_seconds * 1000, ', snapshot rebuilt' if rebuilt else '')
+
+    return Snapshot(table, version, load_seconds, rebuilt)
+
+# Pids of the processes mapping or holding open each of paths (files or directories), from /proc/<pid>/maps and
+# /proc/<pid>/fd. Processes whose maps or fds can't be read (another user's) are skipped. None where /proc isn't
+# available (non-Linux)
+def mapped_by(paths):
+    if not os.path.isdir('/proc/self'):
+        return None
+    mapped = {os.path.realpath(path): set() for path in paths}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/{}/maps'.format(pid)) as f:
+                for line in f:
+                    parts = line.rstrip('\n').split(None, 5)
+                    if len(parts) == 6 and parts[5] in mapped:
+                        mapped[parts[5]].add(int(pid))
+            fd_dir = '/proc/{}/fd'.format(pid)
+            for fd in os.listdir(fd_dir):
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target in mapped:
+                    mapped[target].add(int(pid))
+        except OSError:
+            continue
+    return mapped
+
+# Delete the snapshots in snapshot_dir other than keep (the files of the version being served) that no process
+# maps any more, leaving out the pids in ignore (the gunicorn master, whose preloaded mapping of the version it
+# started with workers no longer use). Every worker calls this after it has moved to a new version, so the last to
+# let go of an old snapshot removes it. Nothing is removed where mappings can't be read
+def remove_stale_snapshots(keep, snapshot_dir=SNAPSHOT_DIR, ignore=()):
+    if not os.path.isdir(snapshot_dir):
+        return []
+    keep = {os.path.realpath(path) for path in keep}
+    stale = [os.path.join(snapshot_dir, name) for name in os.listdir(snapshot_dir) if SNAPSHOT_FILE.match(name)]
+    stale = [path for path in stale if os.path.realpath(path) not in keep]
+    if not stale:
+        return []
+    mapped = mapped_by(stale)
+    if mapped is None:
+        return []
+
+    removed = []
+    for path in stale:
+        if mapped[os.path.realpath(path)] - set(ignore):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed.append(path)
+        logger.info('Removed snapshot %s, no longer mapped', path)
+    return removed
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+# Seasons in the rolling average
+WINDOW = int(os.environ.get('NBA_DASH_ROLLING_SEASONS', 3))
+
+# The derived columns' names and values depend on the window as well as the data, so it's part of the key of
+# everything built from them: snapshots, prerendered figures and ETags
+DERIVED_KEY = 'roll{}'.format(WINDOW)
+
+# Metrics derived columns are computed for: every rating and record column of NBA_long
+METRICS = ['w_l_percent', 'mov', 'ortg', 'drtg', 'nrtg', 'mov_a', 'ortg_a', 'drtg_a', 'nrtg_a']
+
+# Derived column suffix -> how the rating picker describes it
+KINDS = [('roll{}'.format(WINDOW), '{}-season avg'.format(WINDOW)),
+         ('yoy', 'change vs. prior season'),
+         ('z', 'z-score vs. league')]
+
+def derived_name(metric, kind):
+    return '{}_{}'.format(metric, kind)
+
+# Mean of each run of window consecutive seasons ending at a season, along the rows of a (team, season) grid.
+# Seasons with any missing value in their window (e.g. an expansion team's first seasons) stay missing
+def rolling_mean(grid, window):
+    filled = np.where(np.isnan(grid), 0.0, grid)
+    sums = np.cumsum(filled, axis=1)
+    counts = np.cumsum(~np.isnan(grid), axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+def season_delta(grid):
+    delta = np.full(grid.shape, np.nan)
+    delta[:, 1:] = grid[:, 1:] - grid[:, :-1]
+    return delta
+
+# Standard deviations from the league mean of that season
+def league_z(grid):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(grid, axis=0)
+        std = np.nanstd(grid, axis=0)
+        return (grid - mean) / np.where(std > 0, std, np.nan)
+
+# Add the rolling average, season-over-season change and league z-score of every metric to a flat NBA_long
+# frame (team and year as columns), as {metric}_roll{N} (N being WINDOW), {metric}_yoy and {metric}_z. Each
+# metric is scattered into a team x season grid once and all three are computed on the whole grid, so this is one
+# vectorized pass per data version (run when the snapshot is built), and the columns are then served like any
+# base column
+def add_derived(df):
+    teams, team_code = np.unique(df['team'].to_numpy().astype(str), return_inverse=True)
+    seasons, season_code = np.unique(df['year'].to_numpy(), return_inverse=True)
+
+    derived = {}
+    for metric in METRICS:
+        if metric not in df.columns:
+            continue
+        grid = np.full((len(teams), len(seasons)), np.nan)
+        grid[team_code, season_code] = df[metric].to_numpy(dtype=float)
+        for (kind, _), values in zip(KINDS, (rolling_mean(grid, WINDOW), season_delta(grid), league_z(grid))):
+            derived[derived_name(metric, kind)] = values[team_code, season_code]
+    return df.assign(**derived)
+
+# Rating picker options: each base rating followed by its derived versions
+def rating_options(ratings):
+    options = []
+    for label, metric in ratings:
+        options.append({'label': label, 'value': metric})
+        options.extend({'label': '{} ({})'.format(label, description), 'value': derived_name(metric, kind)}
+                       for kind, description in KINDS)
+    return options
+
+def is_z_score(column):
+    return column.endswith('_z')
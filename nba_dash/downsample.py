@@ -0,0 +1,59 @@
+import numpy as np
+
+# Min/max bucketing: split a series into buckets of consecutive points and keep each bucket's lowest and
+# highest point (plus the first and last point of the series), so peaks and troughs survive and a line drawn
+# through the result looks the same at the plot's resolution. Buckets with no values keep one missing point,
+# so gaps in a line stay gaps. Returns sorted positions into y
+def minmax_indices(y, max_points):
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max(max_points // 2, 1)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+
+    starts = np.arange(buckets) * size
+    lows = starts + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = starts + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+
+    keep = np.unique(np.concatenate([[0, n - 1], lows, highs]))
+    return keep[keep < n]
+
+# Downsample the selected rows (store.select output) trace by trace, grouping on the by column, so every
+# trace has at most max_points points. Rows keep their original order
+def downsample(selected, y, max_points, by='team'):
+    groups = selected[by]
+    if len(groups) <= max_points:
+        return selected
+
+    values = np.asarray(selected[y], dtype=float)
+    rows = []
+    for group in np.unique(groups):
+        positions = np.flatnonzero(groups == group)
+        rows.append(positions[minmax_indices(values[positions], max_points)])
+    rows = np.sort(np.concatenate(rows))
+    return {col: np.asarray(array)[rows] for col, array in selected.items()}
+
+# The x range the user has zoomed a graph to, from its relayoutData, as whole seasons (start, end).
+# None when the graph shows the full range (no zoom yet, or autorange after a double click)
+def zoom_range(relayout_data):
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        lo, hi = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        lo, hi = relayout_data['xaxis.range']
+    else:
+        return None
+    try:
+        return int(np.floor(float(lo))), int(np.ceil(float(hi)))
+    except (TypeError, ValueError):
+        return None
+
+# Whether a relayout moved the x axis (a zoom, pan or reset) rather than something that leaves the data as it
+# is, like the autosize on first draw, a y-only zoom or a legend click
+def zoom_changed(relayout_data):
+    return any(key.startswith(('xaxis.range', 'xaxis.autorange')) for key in (relayout_data or {}))
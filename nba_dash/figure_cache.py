@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import threading
+from collections import OrderedDict
+
+from metrics import phase
+
+MAX_ENTRIES = int(os.environ.get('NBA_DASH_FIGURE_CACHE_ENTRIES', 256))
+MAX_BYTES = int(os.environ.get('NBA_DASH_FIGURE_CACHE_MB', 64)) * 1024 * 1024
+
+# Normalize callback inputs so the same view always maps to the same key (team order doesn't change the figure)
+def figure_key(name, version, teams, start_year, end_year, *extra):
+    teams = tuple(sorted(teams or []))
+    return (name, version, teams, int(start_year), int(end_year)) + tuple(extra)
+
+# Bytes a parsed JSON value (dicts, lists, strings, numbers) takes in memory, every object counted once. A figure
+# takes several times the length of its json this way, so this is what the cache's byte budget is charged
+def object_size(value):
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return size
+
+# Bounded LRU of figures as plain JSON-ready dicts, parsed once when stored, so a hit hands back the dict without
+# parsing anything. Each entry is kept with its size in memory (object_size), which the byte budget evicts by.
+# Entries are shared by every request that hits them, so callers must not modify what they get (copy first)
+class FigureCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Store a figure dict under key, size being the bytes it takes in memory
+    def put(self, key, figure, size):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            # Figures bigger than the whole budget are served but never stored
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (figure, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    # Return the cached figure for key, building and storing it on a miss. The figure is serialized and parsed
+    # back once, on the miss (the figure_json phase), so what's cached (and returned) is plain lists and numbers.
+    # Encoding the response that carries it is timed per request, as the encode phase (metrics.time_encoding)
+    def get_or_build(self, key, build):
+        figure = self.get(key)
+        if figure is None:
+            built = build()
+            with phase('figure_json'):
+                payload = built.to_json()
+                figure = json.loads(payload)
+            self.put(key, figure, object_size(figure))
+        return figure
+
+    # Drop figures built from any other data version, e.g. once a new version has been swapped in
+    def retain_version(self, version):
+        with self._lock:
+            for key in [key for key in self._entries if key[1] != version]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'bytes': self._bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
@@ -0,0 +1,109 @@
+import os
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+import http_cache
+from data_snapshot import DATA_DIR
+
+# Game results written by the scraper (nba_team_scrape/games.py), one parquet partition per season
+GAMES_DIR = os.environ.get('NBA_GAMES_DIR', os.path.join(DATA_DIR, 'games'))
+
+GAME_COLUMNS = ['visitor_franchise', 'visitor_pts', 'home_franchise', 'home_pts', 'overtimes', 'season']
+
+# Data version of the games directory: its partition files and when they were last written, so aggregates are
+# recomputed after the scraper rewrites a season
+def games_version(games_dir=GAMES_DIR):
+    files = []
+    for root, _, names in os.walk(games_dir):
+        for name in names:
+            if name.endswith('.parquet'):
+                path = os.path.join(root, name)
+                files.append((os.path.relpath(path, games_dir), os.stat(path).st_mtime_ns))
+    return tuple(sorted(files))
+
+def games_dataset(games_dir=GAMES_DIR):
+    return ds.dataset(games_dir, format='parquet', partitioning='hive')
+
+# Read only the columns and seasons (partitions) asked for, and only games involving the teams, if given
+def read_games(seasons=None, teams=None, playoffs=False, games_dir=GAMES_DIR):
+    condition = ds.field('playoffs') == playoffs
+    if seasons is not None:
+        condition = condition & ds.field('season').isin([int(season) for season in seasons])
+    if teams is not None:
+        condition = condition & (ds.field('home_franchise').isin(list(teams)) | ds.field('visitor_franchise').isin(list(teams)))
+    return games_dataset(games_dir).to_table(columns=GAME_COLUMNS, filter=condition).to_pandas()
+
+# Per franchise-season totals from the games played: games, wins, losses, win percentage, points scored and
+# allowed per game, margin of victory and overtime games. Indexed by (team, year) like NBA_long
+def aggregate_frame(games):
+    games = games[games['home_pts'].notna() & games['visitor_pts'].notna()]
+    home_win = (games['home_pts'] > games['visitor_pts']).to_numpy()
+    overtime = games['overtimes'].fillna('').str.len().to_numpy() > 0
+
+    sides = pd.DataFrame({
+        'team': np.concatenate([games['home_franchise'].to_numpy(), games['visitor_franchise'].to_numpy()]),
+        'year': np.concatenate([games['season'].to_numpy(), games['season'].to_numpy()]).astype(np.int64),
+        'win': np.concatenate([home_win, ~home_win]).astype(np.int64),
+        'pts': np.concatenate([games['home_pts'].to_numpy(), games['visitor_pts'].to_numpy()]),
+        'opp_pts': np.concatenate([games['visitor_pts'].to_numpy(), games['home_pts'].to_numpy()]),
+        'ot': np.concatenate([overtime, overtime]).astype(np.int64),
+    })
+
+    grouped = sides.groupby(['team', 'year'])
+    totals = grouped[['win', 'pts', 'opp_pts', 'ot']].sum()
+    played = grouped.size()
+    return pd.DataFrame({
+        'games': played,
+        'wins': totals['win'],
+        'losses': played - totals['win'],
+        'w_l_percent': totals['win'] / played,
+        'pts': totals['pts'] / played,
+        'opp_pts': totals['opp_pts'] / played,
+        'mov': (totals['pts'] - totals['opp_pts']) / played,
+        'ot_games': totals['ot'],
+    })
+
+@lru_cache(maxsize=64)
+def _aggregate(seasons, teams, playoffs, games_dir, version):
+    aggregated = aggregate_frame(read_games(seasons, teams, playoffs, games_dir))
+    if teams is not None:
+        aggregated = aggregated[aggregated.index.get_level_values('team').isin(teams)]
+    return aggregated
+
+# Aggregate game results on demand, e.g. regular season records for a few teams over a range of seasons.
+# Only the partitions and columns needed are read, and results are cached until the games are rewritten
+def aggregate_games(seasons=None, teams=None, playoffs=False, games_dir=GAMES_DIR):
+    seasons = tuple(sorted(int(season) for season in seasons)) if seasons is not None else None
+    teams = tuple(sorted(teams)) if teams is not None else None
+    return _aggregate(seasons, teams, playoffs, games_dir, games_version(games_dir)).copy()
+
+# GET /api/games?team=Boston%20Celtics&start_year=2008&end_year=2010&playoffs=1 as JSON records, one per team and
+# season, aggregated from the games on demand. team can repeat; no team means all of them. Revalidated against the
+# games directory's version, so a rescrape is picked up without a restart. 404 until the scraper has written games
+def init_app(server, games_dir=GAMES_DIR):
+    from flask import Response, abort, request
+
+    @server.route('/api/games')
+    def games():
+        version = games_version(games_dir)
+        if not version:
+            abort(404)
+        teams = request.args.getlist('team') or None
+        start_year, end_year = request.args.get('start_year', type=int), request.args.get('end_year', type=int)
+        playoffs = request.args.get('playoffs', default=0, type=int) == 1
+        seasons = range(start_year, end_year + 1) if start_year is not None and end_year is not None else None
+
+        tag = http_cache.etag(version, 'games', teams, start_year, end_year, playoffs)
+        if http_cache.matches(request.headers.get('If-None-Match'), tag):
+            response = Response(status=304)
+        else:
+            aggregated = aggregate_games(seasons, teams, playoffs, games_dir).reset_index()
+            response = Response(json.dumps({'games': json.loads(aggregated.to_json(orient='records'))}, separators=(',', ':')),
+                                mimetype='application/json')
+        response.headers['ETag'] = tag
+        response.headers['Cache-Control'] = http_cache.REVALIDATE
+        return response
@@ -0,0 +1,15 @@
+# gunicorn settings, read from the working directory when the app is started with: gunicorn nba_dash:server
+import os
+
+# In shared mode the master imports the app once, mapping the Arrow snapshot (building it if the csv changed),
+# and forked workers inherit that mapping rather than loading the data themselves
+preload_app = os.environ.get('NBA_DASH_SHARED') == '1'
+
+# Log each worker's memory once it has the app loaded, to confirm the data is shared rather than copied,
+# start the worker's check for a new scrape (NBA_DASH_RELOAD_SECONDS) and let it make its simulation pool
+def post_worker_init(worker):
+    import nba_dash
+    nba_dash.master_pid = worker.ppid
+    nba_dash.memory_report()
+    nba_dash.data.start()
+    nba_dash.simulator.start()
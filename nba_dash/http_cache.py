@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+
+from derived import DERIVED_KEY
+
+# Long-lived caching for responses whose URL names the data version they were built from
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Responses that depend on the data version but not on their URL: kept, but revalidated before each use
+REVALIDATE = 'private, no-cache'
+
+# Callback properties left out of the ETag. Every callback here draws from its inputs' values and the data,
+# never from how many times a button was clicked, so Submit on an unchanged selection is the same response
+IGNORED_PROPS = {'n_clicks', 'n_clicks_timestamp'}
+
+# Outputs that do change with the click count (a line chart's uirevision, so Submit resets its zoom) keep it
+# in their tags. Filled in by the app, as output ids like 'line-graph-1.figure'
+COUNTED_OUTPUTS = set()
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Version of the app's code, so a deploy that changes the layout or a callback changes every tag even when the
+# data hasn't: a hash of the build id set at deploy (NBA_DASH_BUILD), or else of the dashboard's python files and
+# assets as they are on disk
+def code_version(app_dir=APP_DIR):
+    digest = hashlib.sha256()
+    if os.environ.get('NBA_DASH_BUILD'):
+        digest.update(os.environ['NBA_DASH_BUILD'].encode('utf-8'))
+        return digest.hexdigest()[:16]
+    paths = [os.path.join(app_dir, name) for name in os.listdir(app_dir) if name.endswith('.py')]
+    assets = os.path.join(app_dir, 'assets')
+    if os.path.isdir(assets):
+        paths += [os.path.join(assets, name) for name in os.listdir(assets)]
+    for path in sorted(p for p in paths if os.path.isfile(p)):
+        digest.update(os.path.relpath(path, app_dir).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+BUILD = code_version()
+
+# Every tag includes the code version and the rolling window (the rating picker's options), then whatever the
+# response depends on
+def etag(*parts):
+    digest = hashlib.sha256(json.dumps((BUILD, DERIVED_KEY) + parts, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    return 'W/"{}"'.format(digest.hexdigest()[:32])
+
+# ETag of a _dash-update-component request: the data version, the output and the values of the inputs and
+# state (minus click counts, except for COUNTED_OUTPUTS), plus which input fired, since a chart can draw
+# differently for a zoom and a Submit
+def callback_etag(version, body):
+    ignored = set() if body.get('output') in COUNTED_OUTPUTS else IGNORED_PROPS
+    values = [(item.get('id'), item.get('property'), item.get('value'))
+              for group in ('inputs', 'state') for item in flatten(body.get(group) or [])
+              if item.get('property') not in ignored]
+    return etag(version, body.get('output'), values, sorted(body.get('changedPropIds') or []))
+
+# Inputs of pattern-matching callbacks arrive as nested lists
+def flatten(items):
+    for item in items:
+        if isinstance(item, list):
+            yield from flatten(item)
+        else:
+            yield item
+
+# Entity tags in an If-None-Match header, compared weakly (W/ prefix ignored) as RFC 7232 allows for 304s
+def none_match(header):
+    return {tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip() for tag in (header or '').split(',') if tag.strip()}
+
+def matches(header, tag):
+    tags = none_match(header)
+    return '*' in tags or tag[2:] in tags
+
+# Conditional requests for callbacks and the page layout. Each gets an ETag computed before any work is
+# done, and a request whose If-None-Match already holds it is answered 304 before the callback (or layout) runs.
+# Callback responses are POSTs, which browsers don't revalidate on their own: assets/etag_cache.js keeps recent
+# responses and sends their tags. version returns the current data version
+def init_app(server, version):
+    from flask import Response, g, request
+
+    @server.before_request
+    def not_modified():
+        if request.method == 'POST' and request.path.endswith('/_dash-update-component'):
+            body = request.get_json(silent=True)
+            if body is None:
+                return None
+            g.etag = callback_etag(version(), body)
+        elif request.method == 'GET' and request.path.endswith('/_dash-layout'):
+            g.etag = etag(version(), 'layout')
+        else:
+            return None
+
+        if matches(request.headers.get('If-None-Match'), g.etag):
+            response = Response(status=304)
+            response.headers['ETag'] = g.etag
+            response.headers['Cache-Control'] = REVALIDATE
+            return response
+        return None
+
+    @server.after_request
+    def tag_response(response):
+        tag = g.get('etag')
+        if tag is not None and response.status_code == 200:
+            response.headers['ETag'] = tag
+            response.headers['Cache-Control'] = REVALIDATE
+        return response
+
+# Path segment naming everything a versioned resource is built from: the data version, the code version and the
+# rolling window, as for the prerendered artifacts
+def resource_version(version):
+    return '{}-{}-{}'.format(version, BUILD, DERIVED_KEY)
+
+def versioned_url(name, version, root=''):
+    return '{}/data/{}/{}.json'.format(root, resource_version(version), name)
+
+# GET /data/<version>-<build>-roll<window>/<name>.json serving read(state) as JSON with immutable caching, since
+# the URL changes with whatever the JSON is built from. A request for another version is redirected to the
+# current one. state returns the current data state
+def versioned_json(server, name, read, state):
+    from flask import Response, redirect, request
+
+    def serve(version):
+        current = state()
+        if version != resource_version(current.version):
+            return redirect(versioned_url(name, current.version, request.script_root))
+        tag = etag(current.version, name)
+        if matches(request.headers.get('If-None-Match'), tag):
+            response = Response(status=304)
+        else:
+            response = Response(json.dumps(read(current), separators=(',', ':')), mimetype='application/json')
+        response.headers['ETag'] = tag
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    server.add_url_rule('/data/<version>/{}.json'.format(name), 'data_' + name.replace('-', '_'), serve)
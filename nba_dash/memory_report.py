@@ -0,0 +1,81 @@
+import os
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Memory fields (Rss, Pss, Shared_Clean, Private_Dirty, ...) in bytes from an smaps-style block of lines.
+# Empty where /proc isn't available (non-Linux)
+def read_smaps(path='/proc/self/smaps_rollup', mapping=None):
+    fields = {}
+    try:
+        with open(path) as f:
+            current = None
+            for line in f:
+                parts = line.split()
+                if not line[0].isupper():
+                    # Mapping header: address range, perms, offset, device, inode, path
+                    current = parts[5] if len(parts) > 5 else None
+                elif len(parts) == 3 and parts[2] == 'kB' and (mapping is None or current == mapping):
+                    fields[parts[0].rstrip(':')] = fields.get(parts[0].rstrip(':'), 0) + int(parts[1]) * 1024
+    except OSError:
+        pass
+    return fields
+
+def process_memory():
+    return read_smaps('/proc/self/smaps_rollup')
+
+# Memory of this process's mappings of one file, e.g. the shared snapshot
+def mapped_file_memory(path):
+    return read_smaps('/proc/self/smaps', mapping=os.path.realpath(path))
+
+# One line per process: resident and proportional (shared pages split between the processes mapping them)
+# set sizes, how much of the snapshot file is mapped in and how much of the store is private to this process
+def log_memory_report(store, snapshot_file=None):
+    memory = process_memory()
+    store_memory = store.memory_usage()
+    line = 'Memory pid {}: Rss {:.1f} MB, Pss {:.1f} MB, private {:.1f} MB; store {:.2f} MB mapped, {:.2f} MB private'.format(
+        os.getpid(), memory.get('Rss', 0) / MB, memory.get('Pss', 0) / MB,
+        (memory.get('Private_Clean', 0) + memory.get('Private_Dirty', 0)) / MB,
+        store_memory['mapped'] / MB, store_memory['private'] / MB)
+    if snapshot_file:
+        mapped = mapped_file_memory(snapshot_file)
+        line += '; snapshot file Rss {:.2f} MB, Pss {:.2f} MB'.format(mapped.get('Rss', 0) / MB, mapped.get('Pss', 0) / MB)
+    logger.info(line)
+
+# Bytes per column of a DataFrame, the index included and strings counted in full
+def frame_memory(df):
+    return {str(name): int(size) for name, size in df.memory_usage(index=True, deep=True).items()}
+
+# What frame_memory would be with the dtypes a plain read_csv gives (object strings, float64, int64), to show
+# what the compact dtypes save
+def wide_frame_memory(df):
+    flat = df.reset_index()
+    for col in flat.columns:
+        kind = flat[col].dtype.kind
+        if str(flat[col].dtype) == 'category':
+            flat[col] = flat[col].astype(str).astype(object)
+        elif kind == 'f':
+            flat[col] = flat[col].astype(np.float64)
+        elif kind in 'iu':
+            flat[col] = flat[col].astype(np.int64)
+    return frame_memory(flat.set_index(list(df.index.names)) if df.index.names[0] is not None else flat)
+
+# Bytes per column of an Arrow table (the memory-mapped snapshot in shared mode)
+def arrow_memory(table):
+    return {name: table.column(name).nbytes for name in table.column_names}
+
+# One line per table: its total size, the size it would have with plain read_csv dtypes where given (wide, table
+# name -> bytes) and its largest columns
+def log_table_report(tables, wide=None, largest=3):
+    for name, columns in tables.items():
+        total = sum(columns.values())
+        line = 'Table {}: {:.3f} MB in {} columns'.format(name, total / MB, len(columns))
+        if wide and name in wide:
+            line += ' ({:.3f} MB as object/float64/int64)'.format(wide[name] / MB)
+        top = sorted(columns.items(), key=lambda item: -item[1])[:largest]
+        line += '; largest {}'.format(', '.join('{} {:.1f} KB'.format(col, size / 1024) for col, size in top))
+        logger.info(line)
@@ -0,0 +1,143 @@
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this many milliseconds are logged with their inputs. Unset (the default) turns the log off
+SLOW_MS = float(os.environ['NBA_DASH_SLOW_MS']) if os.environ.get('NBA_DASH_SLOW_MS') else None
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Prometheus histogram with labels, cumulative buckets rendered in the text exposition format
+class Histogram:
+    def __init__(self, name, help, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, (counts, total) in series:
+            label_text = ','.join('{}="{}"'.format(name, value) for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, label_text, bound, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, label_text, total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, label_text, cumulative))
+        return '\n'.join(lines)
+
+phase_seconds = Histogram('nba_dash_callback_phase_seconds',
+                          'Time spent in each phase of a Dash callback (filter, figure, payload, figure_json, total, encode)',
+                          ('callback', 'phase'), SECONDS_BUCKETS)
+response_bytes = Histogram('nba_dash_callback_response_bytes',
+                           'Size of _dash-update-component responses as sent, by content encoding',
+                           ('callback', 'encoding'), BYTES_BUCKETS)
+
+# Single values read when /metrics is scraped: name -> (type, help, function returning the value)
+values = {}
+
+# Phase timings of the callback running on this thread
+_current = threading.local()
+
+# Time a block as one phase of the current callback. Outside an instrumented callback it does nothing
+@contextmanager
+def phase(name):
+    timings = getattr(_current, 'timings', None)
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+# Record a callback's phases and total time under callback_id, and log it with its inputs if it was slow
+def instrument(callback_id):
+    def decorate(func):
+        @wraps(func)
+        def timed(*args):
+            _current.timings = timings = {}
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                _current.timings = None
+                timings['total'] = time.perf_counter() - start
+                _current.callback = (callback_id, timings['total'])
+                for name, seconds in timings.items():
+                    phase_seconds.observe(seconds, callback_id, name)
+                if SLOW_MS is not None and timings['total'] * 1000 >= SLOW_MS:
+                    logger.warning('Slow callback %s: %.1f ms (%s) inputs=%r', callback_id, timings['total'] * 1000,
+                                   ', '.join('{} {:.1f} ms'.format(name, seconds * 1000) for name, seconds in timings.items()),
+                                   args)
+        return timed
+    return decorate
+
+# Dash reads a callback request, runs the callback and encodes what it returned as JSON all in one view. Its time
+# less the callback's total is recorded as the callback's encode phase: mostly the JSON encoding of the response,
+# which every request pays, cache hits included. Compression comes after the view, so it isn't in it
+def time_encoding(view):
+    @wraps(view)
+    def timed(*args, **kwargs):
+        _current.callback = None
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            callback = _current.callback
+            _current.callback = None
+            if callback is not None:
+                callback_id, total = callback
+                phase_seconds.observe(max(time.perf_counter() - start - total, 0.0), callback_id, 'encode')
+    return timed
+
+# Response sizes and encoding time for callback requests, by output id, and the /metrics route. Call once the Dash
+# app exists, so its routes are there to time, and register before any compression so the sizes recorded are the
+# compressed ones (Flask runs after_request hooks last-registered first)
+def init_app(server):
+    from flask import Response, request
+
+    for rule in list(server.url_map.iter_rules()):
+        if rule.rule.endswith('/_dash-update-component'):
+            server.view_functions[rule.endpoint] = time_encoding(server.view_functions[rule.endpoint])
+
+    @server.after_request
+    def record_response_bytes(response):
+        if request.path.endswith('/_dash-update-component') and response.status_code == 200:
+            body = request.get_json(silent=True) or {}
+            response_bytes.observe(response.calculate_content_length() or 0, body.get('output', 'unknown'),
+                                   response.headers.get('Content-Encoding', 'identity'))
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+def render():
+    lines = [phase_seconds.render(), response_bytes.render()]
+    for name, (kind, help, read) in sorted(values.items()):
+        lines.append('# HELP {} {}\n# TYPE {} {}\n{} {}'.format(name, help, name, kind, name, read()))
+    return '\n'.join(lines) + '\n'
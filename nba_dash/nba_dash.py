@@ -1,3 +1,6 @@
+import os
+import logging
+
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -5,25 +8,145 @@ from datetime import datetime
 import plotly.express as px
 import plotly.offline as pyo
 import plotly.graph_objs as go
+import plotly.io as pio
 
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
+from flask_compress import Compress
 
 from urllib.request import urlopen
 import json # library to handle JSON files
 from pandas.io.json import json_normalize # tranform JSON file into a pandas dataframe
-
-# Read in data that we scraped and created
-NBA_long = pd.read_csv('https://raw.githubusercontent.com/hrishipoola/NBA_dashboard/main/data/NBA_long.csv', index_col=['team', 'year'])
+from collections import namedtuple
+
+from data_snapshot import SHARED, load_snapshot, load_shared_snapshot, snapshot_path, shared_snapshot_path, remove_stale_snapshots
+from figure_cache import FigureCache, figure_key
+from payload import budget_figure, render_mode, line_shape
+from downsample import downsample, zoom_range, zoom_changed
+from derived import rating_options, is_z_score
+from team_season_store import TeamSeasonStore
+from cube import GroupCube
+from similar import SimilarSeasons
+import similar
+import game_store
+import player_store
+from simulate import Simulator, season_teams
+from data_reload import DataReloader
+import metrics
+import http_cache
+from metrics import instrument, phase
+from memory_report import log_memory_report, process_memory, log_table_report, frame_memory, wide_frame_memory, arrow_memory
+import prerender
+
+logging.basicConfig(level=logging.INFO)
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=False)
 
 server = app.server
 
+# Built figures for repeat views, keyed on normalized callback inputs and data version
+figure_cache = FigureCache()
+
+# Callback phase timings and response sizes, plus figure cache counters, at /metrics
+metrics.init_app(server)
+for stat, kind, help in [('hits', 'counter', 'Figure cache hits'),
+                         ('misses', 'counter', 'Figure cache misses'),
+                         ('evictions', 'counter', 'Figures evicted from the cache'),
+                         ('entries', 'gauge', 'Figures in the cache'),
+                         ('bytes', 'gauge', 'Bytes the cached figures take in memory')]:
+    metrics.values['nba_dash_figure_cache_' + stat] = (kind, help, lambda stat=stat: figure_cache.stats()[stat])
+for field, help in [('Rss', 'Resident memory of this worker'),
+                    ('Pss', 'Proportional set size of this worker (shared pages split between processes)')]:
+    metrics.values['nba_dash_process_{}_bytes'.format(field.lower())] = ('gauge', help, lambda field=field: process_memory().get(field, 0))
+
+# Compress responses with brotli (at a fast level) or gzip, whichever the browser accepts. Dash's own compress
+# option only offers gzip. Set up after metrics so its response sizes are the compressed ones
+server.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+server.config['COMPRESS_BR_LEVEL'] = 4
+Compress(server)
+
+# ETags on callback responses and the layout, so an unchanged view is answered 304 before any work is done
+http_cache.init_app(server, lambda: current().version)
+
+# Optional mode: ship the team-season arrays to the browser once per session and filter and draw the
+# charts there (assets/clientside.js), so Submit never reaches the server
+clientside = os.environ.get('NBA_DASH_CLIENTSIDE') == '1'
+
+# Store contents for clientside mode: the compact arrays plus the plotly template and color sequences
+# plotly express would use, so browser-drawn figures look the same as server-built ones
+def clientside_payload(store):
+    payload = store.to_payload()
+    payload['template'] = pio.templates[pio.templates.default].to_plotly_json()
+    payload['colors'] = {'plotly': px.colors.qualitative.Plotly,
+                         'vivid_r': px.colors.qualitative.Vivid_r,
+                         'bold_r': px.colors.qualitative.Bold_r}
+    return payload
+
+# Register a chart callback on the server, or in clientside mode register the named function from
+# assets/clientside.js instead (with the data store as an extra State) and leave the python function unregistered.
+# server_inputs are extra Inputs, after inputs, that only the server callback takes. Neither runs when a tab is
+# first shown: its graph already holds the prerendered default view, so only a change to a control calls back
+def chart_callback(output, inputs, state, clientside_function, server_inputs=()):
+    def register(func):
+        if clientside:
+            app.clientside_callback(ClientsideFunction(namespace='nba', function_name=clientside_function),
+                                    output, inputs, state + [State('team-season-data', 'data')],
+                                    prevent_initial_call=True)
+            return func
+        return app.callback(output, inputs + list(server_inputs), state, prevent_initial_call=True)(func)
+    return register
+
+# The input that fired the running callback, or None outside a Dash request (e.g. when benchmarked directly)
+def triggered_prop():
+    try:
+        triggered = dash.callback_context.triggered
+    except Exception:
+        return None
+    return triggered[0]['prop_id'] if triggered else None
+
+# Line charts draw at most this many points per team (one per pixel across the plot); longer series are
+# downsampled, and zooming in re-queries the zoomed range at full resolution
+line_graph_width = 1250
+
+# Zooms reach the server only when a line chart's figure is missing points of the selection (downsampled, or
+# already a zoomed range, see layout.meta.partial); otherwise plotly zooms what it has. The graph's relayoutData
+# is passed on to its zoom store, the server callback's input, just in that case (zoomIfPartial in
+# assets/clientside.js)
+def forward_zoom(graph_id):
+    app.clientside_callback(ClientsideFunction(namespace='nba', function_name='zoomIfPartial'),
+                            Output(graph_id + '-zoom', 'data'),
+                            [Input(graph_id, 'relayoutData')],
+                            [State(graph_id, 'figure')],
+                            prevent_initial_call=True)
+
+# Keeps the user's zoom while the zoomed range is redrawn; a new selection or another Submit resets it. Figures
+# are built (and cached and prerendered) with n_clicks 0 and the callback sets the click count of the request
+# on a shallow copy, so the cached figure is shared. Click counts stay in these charts' ETags
+def line_uirevision(teams, start_year, end_year, n_clicks, *extra):
+    return str((sorted(teams or []),) + extra + (start_year, end_year, n_clicks or 0))
+
+def with_uirevision(fig, uirevision):
+    return dict(fig, layout=dict(fig['layout'], uirevision=uirevision))
+
+http_cache.COUNTED_OUTPUTS.update(['line-graph-1.figure', 'line-graph-2.figure'])
+
+# Seasons a line chart should show: the zoomed range (from relayoutData) clipped to the selected seasons,
+# or None for the full selection. A Submit click always starts again from the full selection. Relayouts that
+# don't move the x axis leave the figure as it is
+def line_graph_range(relayout_data, submit_prop, start_year, end_year):
+    if triggered_prop() not in (None, submit_prop) and not zoom_changed(relayout_data):
+        raise PreventUpdate
+    zoomed = zoom_range(relayout_data)
+    if zoomed is None or triggered_prop() == submit_prop:
+        return None
+    start, end = max(zoomed[0], int(start_year)), min(zoomed[1], int(end_year))
+    return (start, end) if start <= end else None
+
 markdown_text_1 = '''
 ## NBA Team Dashboard
 
@@ -174,25 +297,43 @@ fig.update_xaxes(tickangle=320)
 
 
 
-app.layout = html.Div([
-    dcc.Tabs(id='dash-tabs', value='tab-1', children=[
-        dcc.Tab(label='NBA Dashboard', value='tab-1'),
-        dcc.Tab(label='Franchise Changes', value='tab-2'),
-        dcc.Tab(label='W-L %', value='tab-3'),
-        dcc.Tab(label='Ratings', value='tab-4'),
-        dcc.Tab(label='Off. vs. Def. (Division)', value='tab-5'),
-        dcc.Tab(label='Off. vs. Def. (Team)', value='tab-6')
-       ], colors={'border': 'white',
-               'primary': 'darkturquoise',
-               'background': 'whitesmoke'}, style={'fontFamily':'Helvetica'}),
-    html.Div(id='dash-tabs-content')
-])
-
-@app.callback(Output('dash-tabs-content', 'children'),
-              Input('dash-tabs', 'value'))
-
-
-def render_content(tab):
+# Team and season lists and the franchise figure, at URLs naming the data version they were built from
+# (/data/<version>-<build>-roll3/teams.json), so browsers and the CDN keep them for good. The layout holds just the
+# URLs; assets/versioned_data.js fetches them and puts the JSON in the store before the renderer sees the layout
+def versioned_stores(state):
+    root = app.config.requests_pathname_prefix.rstrip('/')
+    return [dcc.Store(id='versioned-{}'.format(name), data={'versioned': http_cache.versioned_url(name, state.version, root)})
+            for name in versioned_resources]
+
+# Served per page load, so a new page gets the current data version's clientside store and resource URLs
+def serve_layout():
+    return html.Div([
+        dcc.Tabs(id='dash-tabs', value='tab-1', children=[
+            dcc.Tab(label='NBA Dashboard', value='tab-1'),
+            dcc.Tab(label='Franchise Changes', value='tab-2'),
+            dcc.Tab(label='W-L %', value='tab-3'),
+            dcc.Tab(label='Ratings', value='tab-4'),
+            dcc.Tab(label='Off. vs. Def. (Division)', value='tab-5'),
+            dcc.Tab(label='Off. vs. Def. (Team)', value='tab-6'),
+            dcc.Tab(label='Projections', value='tab-7')
+           ], colors={'border': 'white',
+                   'primary': 'darkturquoise',
+                   'background': 'whitesmoke'}, style={'fontFamily':'Helvetica'}),
+        html.Div(id='dash-tabs-content')
+    ] + versioned_stores(current()) + ([dcc.Store(id='team-season-data', data=current().clientside_data)] if clientside else []))
+
+# Dropdown options for the team and season pickers, built once per data version from the store. The options
+# reach the browser as /data/<version>/teams.json (versioned_stores); the tab layouts only take the default seasons
+def picker_options(store):
+    seasons = np.unique(store.year).tolist()
+    return {'teams': [{'label': i, 'value': i} for i in store.team_names.tolist()],
+            'seasons': [{'label': str(i), 'value': i} for i in seasons],
+            'first_season': seasons[0],
+            'last_season': seasons[-1]}
+
+# Component tree for one tab. Graphs start out showing their default view's prerendered figure, except the
+# franchise figure, and the pickers get their options, from the versioned stores (fill_from_versioned)
+def build_tab_layout(tab, options, figures):
     if tab == 'tab-1':
         return html.Div([dcc.Markdown(children=markdown_text_1)
                               ], style={'fontFamily':'Helvetica'})
@@ -200,7 +341,7 @@ def render_content(tab):
     if tab == 'tab-2':
         return html.Div([
                     html.Div([
-                              dcc.Graph(figure=fig)
+                              dcc.Graph(id='franchise-graph')
                     ]),
                     html.Div([
                               dcc.Markdown(children=markdown_text_2)
@@ -213,21 +354,18 @@ def render_content(tab):
                      html.Div([
                                html.Div('Teams', style={'paddingRight':'20px'}),
                                dcc.Dropdown(id='team-picker-1',
-                                            options=[{'label': i, 'value': i} for i in NBA_long.index.get_level_values(0).unique()],
                                             value=default_teams,
                                             multi=True)
                               ],style={'display':'inline-block', 'verticalAlign':'top','width':'45%'}),
                       html.Div([
                                 html.Div('Start Year', style={'paddingRight':'30px'}),
                                 dcc.Dropdown(id='start-year-picker-1',
-                                             options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                             value=NBA_long.index.get_level_values(1).min())
+                                             value=options['first_season'])
                                ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                       html.Div([
                                 html.Div('End Year', style={'paddingRight':'30px'}),
                                 dcc.Dropdown(id='end-year-picker-1',
-                                             options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                             value=NBA_long.index.get_level_values(1).max())
+                                             value=options['last_season'])
                                ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                      html.Div([
                               html.Button(id='submit-button-1',
@@ -237,7 +375,8 @@ def render_content(tab):
                               ],style={'display':'inline-block',
                                        'verticalAlign':'middle'}),
                      html.Div([
-                              dcc.Graph(id='line-graph-1')
+                              dcc.Graph(id='line-graph-1', figure=figures['line-graph-1']),
+                              dcc.Store(id='line-graph-1-zoom')
                               ])
         ], style={'fontFamily':'Helvetica'})
 
@@ -247,31 +386,26 @@ def render_content(tab):
                     html.Div([
                               html.Div('Teams', style={'paddingRight':'20px'}),
                               dcc.Dropdown(id='team-picker-2',
-                                        options=[{'label': i, 'value': i} for i in NBA_long.index.get_level_values(0).unique()],
                                         value=default_teams,
                                         multi=True)
                               ],style={'display':'inline-block', 'verticalAlign':'top','width':'45%'}),
                     html.Div([
                               html.Div('Rating', style={'paddingRight':'20px'}),
                               dcc.Dropdown(id='rating-picker',
-                                         options=[
-                                                  {'label': 'Offensive', 'value': 'ortg_a'},
-                                                  {'label': 'Defensive', 'value': 'drtg_a'},
-                                                  {'label': 'Net', 'value': 'nrtg_a'}
-                                                  ],
+                                         options=rating_options([('Offensive', 'ortg_a'),
+                                                                 ('Defensive', 'drtg_a'),
+                                                                 ('Net', 'nrtg_a')]),
                                          value='nrtg_a')
                            ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                     html.Div([
                               html.Div('Start Year', style={'paddingRight':'30px'}),
                               dcc.Dropdown(id='start-year-picker-2',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).min())
+                                         value=options['first_season'])
                            ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                     html.Div([
                               html.Div('End Year', style={'paddingRight':'30px'}),
                               dcc.Dropdown(id='end-year-picker-2',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).max())
+                                         value=options['last_season'])
                            ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                     html.Div([
                               html.Button(id='submit-button-2',
@@ -281,7 +415,8 @@ def render_content(tab):
                           ],style={'display':'inline-block',
                                    'verticalAlign':'top'}),
                     html.Div([
-                              dcc.Graph(id='line-graph-2')
+                              dcc.Graph(id='line-graph-2', figure=figures['line-graph-2']),
+                              dcc.Store(id='line-graph-2-zoom')
                           ])
     ], style={'fontFamily':'Helvetica'})
 
@@ -291,21 +426,18 @@ def render_content(tab):
                     html.Div([
                               html.Div('Teams', style={'paddingRight':'20px'}),
                               dcc.Dropdown(id='team-picker-3',
-                                        options=[{'label': i, 'value': i} for i in NBA_long.index.get_level_values(0).unique()],
                                         value=default_teams,
                                         multi=True)
                              ],style={'display':'inline-block', 'verticalAlign':'top','width':'45%'}),
                     html.Div([
                               html.Div('Start Year', style={'paddingRight':'30px'}),
                               dcc.Dropdown(id='start-year-picker-3',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).min())
+                                         value=options['first_season'])
                              ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                     html.Div([
                               html.Div('End Year', style={'paddingRight':'30px'}),
                               dcc.Dropdown(id='end-year-picker-3',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).max())
+                                         value=options['last_season'])
                              ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                     html.Div([
                               html.Button(id='submit-button-3',
@@ -315,7 +447,28 @@ def render_content(tab):
                              ],style={'display':'inline-block',
                                    'verticalAlign':'top'}),
                     html.Div([
-                              dcc.Graph(id='scatter-graph-1')
+                              dcc.Graph(id='scatter-graph-1', figure=figures['scatter-graph-1'])
+                             ]),
+                    html.Div(id='similar-seasons-1', children=similar_prompt, style={'paddingBottom':'20px'}),
+                    html.H4('Division and Conference Averages (all teams)'),
+                    html.Div([
+                              html.Div('Group By', style={'paddingRight':'20px'}),
+                              dcc.RadioItems(id='group-level-picker',
+                                         options=[{'label': label, 'value': level} for level, label in group_levels.items()],
+                                         value='div',
+                                         labelStyle={'display':'inline-block', 'paddingRight':'10px'})
+                             ],style={'display':'inline-block', 'verticalAlign':'top','width':'20%'}),
+                    html.Div([
+                              html.Div('Metric', style={'paddingRight':'20px'}),
+                              dcc.Dropdown(id='group-metric-picker',
+                                         options=[{'label': label, 'value': metric} for metric, label in group_metrics.items()],
+                                         value='nrtg_a')
+                             ],style={'display':'inline-block', 'verticalAlign':'top','width':'20%'}),
+                    html.Div([
+                              dcc.Graph(id='group-line-graph', figure=figures['group-line-graph'])
+                             ]),
+                    html.Div([
+                              dcc.Graph(id='group-scatter-graph', figure=figures['group-scatter-graph'])
                              ])
     ], style={'fontFamily':'Helvetica'})
 
@@ -325,21 +478,18 @@ def render_content(tab):
                          html.Div([
                                    html.Div('Teams', style={'paddingRight':'20px'}),
                                    dcc.Dropdown(id='team-picker-4',
-                                        options=[{'label': i, 'value': i} for i in NBA_long.index.get_level_values(0).unique()],
                                         value=default_teams,
                                         multi=True)
                                   ],style={'display':'inline-block', 'verticalAlign':'top','width':'45%'}),
                         html.Div([
                                    html.Div('Start Year', style={'paddingRight':'30px'}),
                                    dcc.Dropdown(id='start-year-picker-4',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).min())
+                                         value=options['first_season'])
                                  ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                         html.Div([
                                   html.Div('End Year', style={'paddingRight':'30px'}),
                                   dcc.Dropdown(id='end-year-picker-4',
-                                         options=[{'label': str(i), 'value': i} for i in NBA_long.index.get_level_values(1).unique()],
-                                         value=NBA_long.index.get_level_values(1).max())
+                                         value=options['last_season'])
                                   ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
                         html.Div([
                                   html.Button(id='submit-button-4',
@@ -349,160 +499,649 @@ def render_content(tab):
                                  ],style={'display':'inline-block',
                                    'verticalAlign':'top'}),
                          html.Div([
-                                   dcc.Graph(id='scatter-graph-2')
+                                   dcc.Graph(id='scatter-graph-2', figure=figures['scatter-graph-2'])
+                          ]),
+                         html.Div(id='similar-seasons-2', children=similar_prompt, style={'paddingBottom':'20px'})
+    ], style={'fontFamily':'Helvetica'})
+
+    if tab == 'tab-7':
+        return html.Div([
+                         html.H4('Season Projections'),
+                         html.Div([
+                                   html.Div('Ratings From', style={'paddingRight':'30px'}),
+                                   dcc.Dropdown(id='projection-season-picker',
+                                         value=options['last_season'])
+                                  ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
+                         html.Div([
+                                   html.Div('Simulations', style={'paddingRight':'30px'}),
+                                   dcc.Dropdown(id='projection-sims-picker',
+                                         options=[{'label': '{:,}'.format(i), 'value': i} for i in projection_sims],
+                                         value=projection_sims[1])
+                                  ],style={'display':'inline-block', 'verticalAlign':'top','width':'10%'}),
+                         html.Div([
+                                   html.Button(id='submit-button-5',
+                                      n_clicks=0,
+                                      children='Submit',
+                                      style={'fontSize':14})
+                                  ],style={'display':'inline-block',
+                                   'verticalAlign':'top'}),
+                         html.Div(id='projection-summary',
+                                  children='{:,} seasons simulated from {} ratings'.format(projection_sims[1], options['last_season']),
+                                  style={'color':'grey', 'paddingTop':'10px'}),
+                         html.Div([
+                                   dcc.Graph(id='projection-playoffs-graph', figure=figures['projection-playoffs-graph'])
+                          ]),
+                         html.Div([
+                                   dcc.Graph(id='projection-wins-graph', figure=figures['projection-wins-graph'])
+                          ]),
+                         html.Div([
+                                   dcc.Markdown(children=markdown_text_3)
                           ])
     ], style={'fontFamily':'Helvetica'})
 
+tabs = ['tab-1', 'tab-2', 'tab-3', 'tab-4', 'tab-5', 'tab-6', 'tab-7']
+
+# Every tab's layout, built once per data version so switching tabs is a dictionary lookup
+def build_tab_layouts(store, figures):
+    options = picker_options(store)
+    return {tab: build_tab_layout(tab, options, figures) for tab in tabs}
+
+# Fill a tab's pickers and the franchise graph from the versioned stores as the tab is shown, in the browser
+# (assets/versioned_data.js)
+def fill_from_versioned():
+    for n in range(1, 5):
+        app.clientside_callback(ClientsideFunction(namespace='nba_data', function_name='pickerOptions'),
+                                [Output('team-picker-{}'.format(n), 'options'),
+                                 Output('start-year-picker-{}'.format(n), 'options'),
+                                 Output('end-year-picker-{}'.format(n), 'options')],
+                                [Input('versioned-teams', 'data')])
+    app.clientside_callback(ClientsideFunction(namespace='nba_data', function_name='seasonOptions'),
+                            Output('projection-season-picker', 'options'),
+                            [Input('versioned-teams', 'data')])
+    app.clientside_callback(ClientsideFunction(namespace='nba_data', function_name='figure'),
+                            Output('franchise-graph', 'figure'),
+                            [Input('versioned-franchise-figure', 'data')])
+
+fill_from_versioned()
+
+@app.callback(Output('dash-tabs-content', 'children'),
+              Input('dash-tabs', 'value'))
+
+
+@instrument('dash-tabs-content')
+def render_content(tab):
+    return current().tab_layouts.get(tab)
+
 
 # Tab 2 callback
 
-@app.callback(Output('line-graph-1', 'figure'),
+def build_line_graph_1(store, teams, start_year, end_year, x_range=None):
+    with phase('filter'):
+        filtered = store.select(teams, *(x_range or (start_year, end_year)), ['conf', 'div', 'w_l_percent'])
+        selected = len(filtered['year'])
+        filtered = downsample(filtered, 'w_l_percent', line_graph_width)
+
+    with phase('figure'):
+        mode = render_mode(len(filtered['year']))
+        fig1 = px.line(filtered,
+                     x='year',
+                     y='w_l_percent',
+                     color='team',
+                     line_shape=line_shape(mode),
+                     render_mode=mode,
+                     title='Win-Loss %',
+                     hover_name='team',
+                     hover_data={'team':False,
+                                 'year':True,
+                                 'conf':True,
+                                 'div':True,
+                                 'w_l_percent':':.2%'},
+                     width=line_graph_width,
+                     height=600)
+
+        fig1.update_xaxes(title='Season')
+        fig1.update_yaxes(title='')
+        fig1.update_layout(yaxis_tickformat = '%', legend_title='Team', hovermode='closest')
+        fig1.update_layout(uirevision=line_uirevision(teams, start_year, end_year, 0),
+                           meta={'partial': x_range is not None or len(filtered['year']) < selected})
+
+    return fig1
+
+@chart_callback(Output('line-graph-1', 'figure'),
              [Input('submit-button-1','n_clicks')],
              [State('team-picker-1','value'),
               State('start-year-picker-1','value'),
-              State('end-year-picker-1','value')])
-
-def update_line_graph_1(n_clicks, teams, start_year, end_year):
-    years = list(range(start_year,end_year+1))
+              State('end-year-picker-1','value')],
+             'lineGraph1',
+             server_inputs=[Input('line-graph-1-zoom','data')])
 
-    filtered_df = NBA_long.loc[(teams, years), :]
+@instrument('line-graph-1')
+def update_line_graph_1(n_clicks, relayout_data, teams, start_year, end_year):
+    x_range = line_graph_range(relayout_data, 'submit-button-1.n_clicks', start_year, end_year)
+    state = current()
+    key = figure_key('line-graph-1', state.version, teams, start_year, end_year, x_range)
+    fig = figure_cache.get_or_build(key, lambda: budget_figure(build_line_graph_1(state.store, teams, start_year, end_year, x_range)))
+    return with_uirevision(fig, line_uirevision(teams, start_year, end_year, n_clicks))
 
-    fig1 = px.line(filtered_df.reset_index(),
-                 x='year',
-                 y='w_l_percent',
-                 color='team',
-                 line_shape='spline',
-                 title='Win-Loss %',
-                 hover_name='team',
-                 hover_data={'team':False,
-                             'year':True,
-                             'conf':True,
-                             'div':True,
-                             'w_l_percent':':.2%'},
-                 width=1250,
-                 height=600)
+forward_zoom('line-graph-1')
 
-    fig1.update_xaxes(title='Season')
-    fig1.update_yaxes(title='')
-    fig1.update_layout(yaxis_tickformat = '%', legend_title='Team', hovermode='closest')
+# Tab 3 callback
 
-    return fig1
+def build_line_graph_2(store, teams, rating, start_year, end_year, x_range=None):
+    with phase('filter'):
+        filtered = store.select(teams, *(x_range or (start_year, end_year)), [rating])
+        selected = len(filtered['year'])
+        filtered = downsample(filtered, rating, line_graph_width)
+
+    with phase('figure'):
+        mode = render_mode(len(filtered['year']))
+        fig2 = px.line(filtered,
+                     x='year',
+                     y=rating,
+                     color='team',
+                     line_shape=line_shape(mode),
+                     render_mode=mode,
+                     title='Rating',
+                     hover_name='team',
+                     hover_data={'team':False,
+                                 'year':True,
+                                 rating:':.2f'},
+                     width=line_graph_width,
+                     height=600)
+
+        fig2.update_xaxes(title='Season')
+        fig2.update_yaxes(title='Std. dev. from league mean' if is_z_score(rating) else 'Points')
+        fig2.update_layout(legend_title='Team', hovermode='closest')
+        fig2.update_layout(uirevision=line_uirevision(teams, start_year, end_year, 0, rating),
+                           meta={'partial': x_range is not None or len(filtered['year']) < selected})
 
-# Tab 3 callback
+    return fig2
 
-@app.callback(Output('line-graph-2', 'figure'),
+@chart_callback(Output('line-graph-2', 'figure'),
              [Input('submit-button-2','n_clicks')],
              [State('team-picker-2','value'),
               State('rating-picker','value'),
               State('start-year-picker-2','value'),
-              State('end-year-picker-2','value')])
+              State('end-year-picker-2','value')],
+             'lineGraph2',
+             server_inputs=[Input('line-graph-2-zoom','data')])
 
-def update_line_graph_2(n_clicks, teams, rating, start_year, end_year):
-    years = list(range(start_year,end_year+1))
+@instrument('line-graph-2')
+def update_line_graph_2(n_clicks, relayout_data, teams, rating, start_year, end_year):
+    x_range = line_graph_range(relayout_data, 'submit-button-2.n_clicks', start_year, end_year)
+    state = current()
+    key = figure_key('line-graph-2', state.version, teams, start_year, end_year, rating, x_range)
+    fig = figure_cache.get_or_build(key, lambda: budget_figure(build_line_graph_2(state.store, teams, rating, start_year, end_year, x_range)))
+    return with_uirevision(fig, line_uirevision(teams, start_year, end_year, n_clicks, rating))
 
-    filtered_df = NBA_long.loc[(teams, years), rating]
+forward_zoom('line-graph-2')
 
-    fig2 = px.line(filtered_df.reset_index(),
-                 x='year',
-                 y=rating,
-                 color='team',
-                 line_shape='spline',
-                 title='Rating',
-                 hover_name='team',
-                 hover_data={'team':False,
-                             'year':True,
-                             rating:':.2f'},
-                 width=1250,
-                 height=600)
-
-    fig2.update_xaxes(title='Season')
-    fig2.update_yaxes(title='Points')
-    fig2.update_layout(legend_title='Team', hovermode='closest')
+# Tab 4 callback
 
-    return fig2
+# Columns of a rating scatter point read back from clickData by the similar seasons panel, first in customdata
+click_columns = ['team', 'year']
+
+# Columns the rating scatters draw or show on hover (team and year come with every selection), leaving the derived ones out
+SCATTER_COLUMNS = ['conf', 'div', 'w_l_percent', 'ortg_a', 'drtg_a', 'nrtg_a']
+
+def build_scatter_graph_1(store, teams, start_year, end_year):
+    with phase('filter'):
+        filtered = store.select(teams, start_year, end_year, SCATTER_COLUMNS, fill_value=0) #first five years of Charlotte Hornets is 0 as they're an expansion team
+
+    with phase('figure'):
+        mode = render_mode(len(filtered['year']))
+        fig3 = px.scatter(filtered,
+                 x='drtg_a',
+                 y='ortg_a',
+                 color='div',
+                 custom_data=click_columns,
+                 size='w_l_percent',
+                 title='Offensive vs. Defensive Rating (Adjusted)',
+                 color_discrete_sequence=px.colors.qualitative.Vivid_r,
+                 opacity=0.7,
+                 render_mode=mode,
+                 hover_name='div',
+                 hover_data={'team':True,
+                             'year':True,
+                             'conf':True,
+                             'div':False,
+                             'w_l_percent':':.2%',
+                             'ortg_a':':.2f',
+                             'drtg_a':':.2f',
+                             'nrtg_a':':.2f'},
+                 width=1000,
+                 height=800)
+
+        fig3.update_xaxes(title='Defensive Rating (Adj)')
+        fig3.update_yaxes(title='Offensive Rating (Adj)')
+        fig3.update_layout(legend_title='Division')
+        fig3.update_layout(yaxis_range=[90,122])
+        fig3.update_layout(xaxis_range=[90,120])
 
-# Tab 4 callback
+    return fig3
 
-@app.callback(Output('scatter-graph-1', 'figure'),
+@chart_callback(Output('scatter-graph-1', 'figure'),
              [Input('submit-button-3','n_clicks')],
              [State('team-picker-3','value'),
               State('start-year-picker-3','value'),
-              State('end-year-picker-3','value')])
+              State('end-year-picker-3','value')],
+             'scatterGraph1')
 
+@instrument('scatter-graph-1')
 def update_scatter_graph_1(n_clicks, teams, start_year, end_year):
-    years = list(range(start_year,end_year+1))
-
-    filtered_df = NBA_long.loc[(teams, years), :]
-
-    fig3 = px.scatter(filtered_df.fillna(0).reset_index(), #first five years of Charlotte Hornets is 0 as they're an expansion team
-             x='drtg_a',
-             y='ortg_a',
-             color='div',
-             size='w_l_percent',
-             title='Offensive vs. Defensive Rating (Adjusted)',
-             color_discrete_sequence=px.colors.qualitative.Vivid_r,
-             opacity=0.7,
-             hover_name='div',
-             hover_data={'team':True,
-                         'year':True,
-                         'conf':True,
-                         'div':False,
-                         'w_l_percent':':.2%',
-                         'ortg_a':':.2f',
-                         'drtg_a':':.2f',
-                         'nrtg_a':':.2f'},
-             width=1000,
-             height=800)
-
-    fig3.update_xaxes(title='Defensive Rating (Adj)')
-    fig3.update_yaxes(title='Offensive Rating (Adj)')
-    fig3.update_layout(legend_title='Division')
-    fig3.update_layout(yaxis_range=[90,122])
-    fig3.update_layout(xaxis_range=[90,120])
-
-    return fig3
+    state = current()
+    key = figure_key('scatter-graph-1', state.version, teams, start_year, end_year)
+    return figure_cache.get_or_build(key, lambda: budget_figure(build_scatter_graph_1(state.store, teams, start_year, end_year), len(click_columns)))
+
+# Tab 4 division and conference views, read from the aggregate cube (cube.py) rather than grouping team rows
+
+group_levels = {'div': 'Division', 'conf': 'Conference'}
+
+group_metrics = {'w_l_percent': 'Win-Loss %',
+                 'mov_a': 'Margin of Victory (Adj)',
+                 'ortg_a': 'Offensive Rating (Adj)',
+                 'drtg_a': 'Defensive Rating (Adj)',
+                 'nrtg_a': 'Net Rating (Adj)'}
+
+def metric_format(metric):
+    return ':.2%' if metric.startswith('w_l_percent') else ':.2f'
+
+def build_group_line_graph(cube, level, metric, start_year, end_year):
+    with phase('filter'):
+        selected = cube.select(level, start_year, end_year, [metric], ('mean', 'min', 'max'))
+
+    with phase('figure'):
+        fig5 = px.line(selected,
+                     x='year',
+                     y=metric + '_mean',
+                     color=level,
+                     title='{} Average by {}'.format(group_metrics.get(metric, metric), group_levels[level]),
+                     color_discrete_sequence=px.colors.qualitative.Vivid_r,
+                     hover_name=level,
+                     hover_data={level:False,
+                                 'year':True,
+                                 'teams':True,
+                                 metric + '_mean':metric_format(metric),
+                                 metric + '_min':metric_format(metric),
+                                 metric + '_max':metric_format(metric)},
+                     width=line_graph_width,
+                     height=600)
+
+        fig5.update_xaxes(title='Season')
+        fig5.update_yaxes(title='')
+        if metric == 'w_l_percent':
+            fig5.update_layout(yaxis_tickformat='%')
+        fig5.update_layout(legend_title=group_levels[level], hovermode='closest')
+
+    return fig5
+
+def build_group_scatter_graph(cube, level, start_year, end_year):
+    with phase('filter'):
+        selected = cube.select(level, start_year, end_year, ['drtg_a', 'ortg_a', 'nrtg_a', 'w_l_percent'])
+
+    with phase('figure'):
+        fig6 = px.scatter(selected,
+                 x='drtg_a_mean',
+                 y='ortg_a_mean',
+                 color=level,
+                 size='w_l_percent_mean',
+                 title='Average Offensive vs. Defensive Rating (Adjusted) by {}'.format(group_levels[level]),
+                 color_discrete_sequence=px.colors.qualitative.Vivid_r,
+                 opacity=0.7,
+                 hover_name=level,
+                 hover_data={level:False,
+                             'year':True,
+                             'teams':True,
+                             'w_l_percent_mean':':.2%',
+                             'ortg_a_mean':':.2f',
+                             'drtg_a_mean':':.2f',
+                             'nrtg_a_mean':':.2f'},
+                 width=1000,
+                 height=800)
+
+        fig6.update_xaxes(title='Defensive Rating (Adj)')
+        fig6.update_yaxes(title='Offensive Rating (Adj)')
+        fig6.update_layout(legend_title=group_levels[level])
+        fig6.update_layout(yaxis_range=[90,122])
+        fig6.update_layout(xaxis_range=[90,120])
+
+    return fig6
+
+# Server callbacks in clientside mode too: the cube is small and stays on the server
+@app.callback(Output('group-line-graph', 'figure'),
+              [Input('submit-button-3','n_clicks'),
+               Input('group-level-picker','value'),
+               Input('group-metric-picker','value')],
+              [State('start-year-picker-3','value'),
+               State('end-year-picker-3','value')],
+              prevent_initial_call=True)
+
+@instrument('group-line-graph')
+def update_group_line_graph(n_clicks, level, metric, start_year, end_year):
+    state = current()
+    key = figure_key('group-line-graph', state.version, None, start_year, end_year, level, metric)
+    return figure_cache.get_or_build(key, lambda: budget_figure(build_group_line_graph(state.cube, level, metric, start_year, end_year)))
+
+@app.callback(Output('group-scatter-graph', 'figure'),
+              [Input('submit-button-3','n_clicks'),
+               Input('group-level-picker','value')],
+              [State('start-year-picker-3','value'),
+               State('end-year-picker-3','value')],
+              prevent_initial_call=True)
+
+@instrument('group-scatter-graph')
+def update_group_scatter_graph(n_clicks, level, start_year, end_year):
+    state = current()
+    key = figure_key('group-scatter-graph', state.version, None, start_year, end_year, level)
+    return figure_cache.get_or_build(key, lambda: budget_figure(build_group_scatter_graph(state.cube, level, start_year, end_year)))
 
 # Tab 5 callback
 
-@app.callback(Output('scatter-graph-2', 'figure'),
+def build_scatter_graph_2(store, teams, start_year, end_year):
+    with phase('filter'):
+        filtered = store.select(teams, start_year, end_year, SCATTER_COLUMNS, fill_value=0) #first five years of Charlotte Hornets is 0 as they're an expansion team
+
+    with phase('figure'):
+        mode = render_mode(len(filtered['year']))
+        fig4= px.scatter(filtered,
+                 x='drtg_a',
+                 y='ortg_a',
+                 color='team',
+                 custom_data=click_columns,
+                 size='w_l_percent',
+                 title='Offensive vs. Defensive Rating (Adjusted)',
+                 color_discrete_sequence=px.colors.qualitative.Bold_r,
+                 opacity=0.7,
+                 render_mode=mode,
+                 hover_name='team',
+                 hover_data={'team':False,
+                             'year':True,
+                             'conf':True,
+                             'div':True,
+                             'w_l_percent':':.2%',
+                             'ortg_a':':.2f',
+                             'drtg_a':':.2f',
+                             'nrtg_a':':.2f'},
+                 width=1000,
+                 height=800)
+
+        fig4.update_xaxes(title='Defensive Rating (Adj)')
+        fig4.update_yaxes(title='Offensive Rating (Adj)')
+        fig4.update_layout(legend_title='Team')
+        fig4.update_layout(yaxis_range=[90,122])
+        fig4.update_layout(xaxis_range=[90,120])
+
+    return fig4
+
+@chart_callback(Output('scatter-graph-2', 'figure'),
              [Input('submit-button-4','n_clicks')],
              [State('team-picker-4','value'),
               State('start-year-picker-4','value'),
-              State('end-year-picker-4','value')])
+              State('end-year-picker-4','value')],
+             'scatterGraph2')
 
+@instrument('scatter-graph-2')
 def update_scatter_graph_2(n_clicks, teams, start_year, end_year):
-    years = list(range(start_year,end_year+1))
-
-    filtered_df = NBA_long.loc[(teams, years), :]
-
-    fig4= px.scatter(filtered_df.fillna(0).reset_index(), #first five years of Charlotte Hornets is 0 as they're an expansion team
-             x='drtg_a',
-             y='ortg_a',
-             color='team',
-             size='w_l_percent',
-             title='Offensive vs. Defensive Rating (Adjusted)',
-             color_discrete_sequence=px.colors.qualitative.Bold_r,
-             opacity=0.7,
-             hover_name='team',
-             hover_data={'team':False,
-                         'year':True,
-                         'conf':True,
-                         'div':True,
-                         'w_l_percent':':.2%',
-                         'ortg_a':':.2f',
-                         'drtg_a':':.2f',
-                         'nrtg_a':':.2f'},
-             width=1000,
-             height=800)
-
-    fig4.update_xaxes(title='Defensive Rating (Adj)')
-    fig4.update_yaxes(title='Offensive Rating (Adj)')
-    fig4.update_layout(legend_title='Team')
-    fig4.update_layout(yaxis_range=[90,122])
-    fig4.update_layout(xaxis_range=[90,120])
+    state = current()
+    key = figure_key('scatter-graph-2', state.version, teams, start_year, end_year)
+    return figure_cache.get_or_build(key, lambda: budget_figure(build_scatter_graph_2(state.store, teams, start_year, end_year), len(click_columns)))
+
+
+# Most similar seasons panel under each scatter, filled in for the team-season clicked (similar.py)
+
+similar_count = 10
+
+similar_prompt = html.P('Click a team-season in the chart to see the most similar seasons on record.', style={'color':'grey'})
+
+similar_columns = [('team', 'Team', '{}'),
+                   ('year', 'Season', '{}'),
+                   ('distance', 'Distance', '{:.2f}'),
+                   ('w_l_percent', 'W-L %', '{:.1%}'),
+                   ('ortg_a', 'ORtg (Adj)', '{:.2f}'),
+                   ('drtg_a', 'DRtg (Adj)', '{:.2f}'),
+                   ('nrtg_a', 'NRtg (Adj)', '{:.2f}')]
+
+def build_similar_table(index, team, year):
+    seasons = index.query(team, year, similar_count)
+    if not len(seasons['year']):
+        return html.P('No ratings for the {} {} to compare.'.format(year, team))
+    header = html.Tr([html.Th(label, style={'textAlign':'left', 'paddingRight':'20px'}) for _, label, _ in similar_columns])
+    rows = [html.Tr([html.Td(fmt.format(seasons[col][i]), style={'paddingRight':'20px'}) for col, _, fmt in similar_columns])
+            for i in range(len(seasons['year']))]
+    return html.Div([html.H5('Seasons most similar to the {} {}'.format(year, team)),
+                     html.Table([header] + rows)])
+
+# Team and season of a clicked scatter point, from its custom_data (click_columns, which budget_figure leaves
+# first; the clientside figures put them first too)
+def clicked_season(click_data):
+    try:
+        team, year = click_data['points'][0]['customdata'][:2]
+    except (TypeError, KeyError, IndexError, ValueError):
+        raise PreventUpdate
+    return team, int(year)
+
+def register_similar_panel(graph_id, panel_id):
+    @app.callback(Output(panel_id, 'children'),
+                  Input(graph_id, 'clickData'),
+                  prevent_initial_call=True)
+
+    @instrument(panel_id)
+    def update_similar_seasons(click_data):
+        team, year = clicked_season(click_data)
+        return build_similar_table(current().similar, team, year)
+
+    return update_similar_seasons
+
+update_similar_seasons_1 = register_similar_panel('scatter-graph-1', 'similar-seasons-1')
+update_similar_seasons_2 = register_similar_panel('scatter-graph-2', 'similar-seasons-2')
+
+# Tab 7 callback: Monte Carlo projections of a season from each team's adjusted net rating (simulate.py)
+
+simulator = Simulator()
+
+projection_sims = [1000, 10000, 50000, 100000]
+
+markdown_text_3 = '''
+Each simulated season plays an 82-game schedule (4 games against division rivals, 3 or 4 against the rest of the
+conference and 2 against the other conference). A game's margin is drawn around the difference in the two teams'
+adjusted net ratings, so a team 12 points per 100 possessions better wins about 84% of the time. The top 8 teams
+of each conference by wins make the playoffs.
+'''
 
-    return fig4
+def build_projection_playoffs_graph(projection):
+    order = np.lexsort((-projection['mean_wins'], -projection['playoffs']))
+    ranked = {key: projection[key][order] for key in ['team', 'conf', 'playoffs', 'top_seed', 'mean_wins', 'p10_wins', 'p90_wins']}
+
+    fig7 = px.bar(ranked,
+                  x='playoffs',
+                  y='team',
+                  color='conf',
+                  orientation='h',
+                  title='Playoff Probability',
+                  color_discrete_sequence=px.colors.qualitative.Vivid_r,
+                  category_orders={'team': ranked['team'].tolist()},
+                  hover_name='team',
+                  hover_data={'team':False,
+                              'conf':False,
+                              'playoffs':':.1%',
+                              'top_seed':':.1%',
+                              'mean_wins':':.1f',
+                              'p10_wins':True,
+                              'p90_wins':True},
+                  width=1000,
+                  height=800)
+
+    fig7.update_xaxes(title='', tickformat='%', range=[0, 1])
+    fig7.update_yaxes(title='')
+    fig7.update_layout(legend_title='Conference')
+
+    return fig7
+
+def build_projection_wins_graph(projection):
+    order = np.argsort(projection['mean_wins'], kind='stable')
+    fig8 = go.Figure(go.Heatmap(z=projection['histogram'][order] / projection['sims'],
+                                x=np.arange(projection['histogram'].shape[1]),
+                                y=projection['team'][order],
+                                colorscale='Teal',
+                                hovertemplate='%{y}<br>%{x} wins: %{z:.1%}<extra></extra>',
+                                colorbar={'title': 'Share', 'tickformat': '%'}))
+
+    fig8.update_layout(title='Win Total Distribution', width=1250, height=800)
+    fig8.update_xaxes(title='Wins')
+
+    return fig8
+
+@app.callback([Output('projection-playoffs-graph', 'figure'),
+               Output('projection-wins-graph', 'figure'),
+               Output('projection-summary', 'children')],
+              [Input('submit-button-5','n_clicks')],
+              [State('projection-season-picker','value'),
+               State('projection-sims-picker','value')],
+              prevent_initial_call=True)
+
+@instrument('projection-graphs')
+def update_projection_graphs(n_clicks, year, n_sims):
+    if year is None or n_sims is None:
+        raise PreventUpdate
+    state = current()
+    n_sims = min(int(n_sims), projection_sims[-1])
+    projection = simulator.project(state.version, state.store, year, n_sims)
+    playoffs = figure_cache.get_or_build(figure_key('projection-playoffs-graph', state.version, None, year, year, n_sims),
+                                         lambda: build_projection_playoffs_graph(projection))
+    wins = figure_cache.get_or_build(figure_key('projection-wins-graph', state.version, None, year, year, n_sims),
+                                     lambda: build_projection_wins_graph(projection))
+    summary = '{:,} seasons simulated from {} ratings in {:.2f} s ({:,.0f} simulations/sec)'.format(
+        projection['sims'], year, projection['seconds'], projection['sims_per_second'])
+    return playoffs, wins, summary
+
+# The view each graph shows before any control is touched, by artifact name: default teams over every season,
+# and the projections of the last season at the default number of simulations. Both projection views come from
+# one run, made only if either has to be rendered
+def default_views(store, cube):
+    first_season, last_season = int(store.year.min()), int(store.year.max())
+    projection = {}
+    def default_projection():
+        if not projection:
+            projection.update(simulator.run(season_teams(store, last_season), projection_sims[1]))
+        return projection
+
+    return {'franchise-changes': lambda: fig,
+            'line-graph-1': lambda: budget_figure(build_line_graph_1(store, default_teams, first_season, last_season)),
+            'line-graph-2': lambda: budget_figure(build_line_graph_2(store, default_teams, 'nrtg_a', first_season, last_season)),
+            'scatter-graph-1': lambda: budget_figure(build_scatter_graph_1(store, default_teams, first_season, last_season), len(click_columns)),
+            'scatter-graph-2': lambda: budget_figure(build_scatter_graph_2(store, default_teams, first_season, last_season), len(click_columns)),
+            'group-line-graph': lambda: budget_figure(build_group_line_graph(cube, 'div', 'nrtg_a', first_season, last_season)),
+            'group-scatter-graph': lambda: budget_figure(build_group_scatter_graph(cube, 'div', first_season, last_season)),
+            'projection-playoffs-graph': lambda: build_projection_playoffs_graph(default_projection()),
+            'projection-wins-graph': lambda: build_projection_wins_graph(default_projection())}
+
+# Default figures as plain JSON, from the prerendered artifacts of this data version (prerender.py), rendering
+# any that are missing. After a deploy's build step nothing here touches pandas or plotly
+def default_figures(store, cube, version, force=False):
+    return {name: prerender.load_or_build(version, name, build, force)
+            for name, build in default_views(store, cube).items()}
+
+# Everything built from one data version: the snapshot, the store the callbacks read, the conference/division
+# aggregate cube, the similar seasons index, the default figures, the tab layouts and the clientside store contents. Callbacks read current()
+# once and use that state throughout
+DataState = namedtuple('DataState', ['version', 'snapshot', 'NBA_long', 'store', 'cube', 'similar', 'figures', 'tab_layouts', 'clientside_data'])
+
+# Cube of the last version built: the next version's cube starts from it and recomputes only the seasons that changed
+last_cube = None
+
+# Read in data that we scraped and created, from a local memory-mapped snapshot of data/NBA_long.csv.
+# In shared mode (NBA_DASH_SHARED=1) the store's columns are read-only views of a memory-mapped Arrow file
+# instead, shared by every gunicorn worker, and NBA_long isn't materialized as a DataFrame
+def build_state(snapshot):
+    if SHARED:
+        NBA_long = None
+        store = TeamSeasonStore.from_arrow(snapshot.data)
+    else:
+        NBA_long = snapshot.data
+        store = TeamSeasonStore.from_frame(NBA_long)
+    global last_cube
+    cube = last_cube = GroupCube.build(store, last_cube)
+    figures = default_figures(store, cube, snapshot.version)
+    prerender.hold(snapshot.version)
+    return DataState(snapshot.version, snapshot, NBA_long, store, cube, SimilarSeasons(store), figures, build_tab_layouts(store, figures),
+                     clientside_payload(store) if clientside else None)
+
+# Once a new version is in, figures of the old one can't be asked for again
+def on_data_swap(old, new):
+    figure_cache.retain_version(new.version)
+    simulator.retain_version(new.version)
+    prerender.release(old.version)
+    memory_report()
+
+# Pid of the gunicorn master, set in each worker (gunicorn.conf.py). It keeps the mapping and the artifact
+# directory of the version it preloaded, which its workers have left behind, so it doesn't hold those on disk
+master_pid = None
+
+# Snapshots and prerendered artifacts of versions no longer served, removed on a reload check once no worker maps
+# or holds them
+def remove_old_versions():
+    state = current()
+    ignore = [master_pid] if master_pid else []
+    remove_stale_snapshots([snapshot_path(state.version), shared_snapshot_path(state.version)], ignore=ignore)
+    prerender.remove_stale_artifacts(state.version, ignore=ignore)
+
+# Loads the data now; start() (gunicorn.conf.py, or __main__ below) checks for a new scrape in the background
+data = DataReloader(load_shared_snapshot if SHARED else load_snapshot, build_state, on_swap=on_data_swap,
+                    cleanup=remove_old_versions)
+current = data.current
+
+# JSON behind each versioned store (versioned_stores), served at /data/<version>-<build>-roll3/<name>.json
+versioned_resources = {'teams': lambda state: picker_options(state.store),
+                       'franchise-figure': lambda state: state.figures['franchise-changes']}
+for name, read in versioned_resources.items():
+    http_cache.versioned_json(server, name, read, current)
+
+app.layout = serve_layout
+
+# The prerendered default views as JSON and standalone HTML (/prerendered/<version>-<build>-roll3/line-graph-1.html)
+prerender.init_app(server)
+
+# Similar seasons as JSON (/api/similar?team=Boston%20Celtics&year=2008&k=10)
+similar.init_app(server, current)
+
+# Team records aggregated from the scraped games (/api/games?team=Boston%20Celtics&start_year=2008&end_year=2010)
+game_store.init_app(server)
+
+# Player tables with season, team and column filters pushed down to the files (/api/players?table=per_game&season=2020)
+player_store.init_app(server)
+
+# Memory of each table built from the data version, column by column, plus what NBA_long would take with plain
+# read_csv dtypes. The game and player tables (game_store, player_store) aren't in it: they stay in their parquet
+# files, and each /api/games or /api/players request reads only the partitions and columns it asks for, so no copy
+# of them is held between requests
+def table_memory(state):
+    tables, wide = {}, {}
+    if state.NBA_long is not None:
+        tables['NBA_long'] = frame_memory(state.NBA_long)
+        wide['NBA_long'] = sum(wide_frame_memory(state.NBA_long).values())
+    else:
+        tables['NBA_long (mapped)'] = arrow_memory(state.snapshot.data)
+    tables['team-season store'] = state.store.column_memory()
+    tables['aggregate cube'] = state.cube.column_memory()
+    tables['similar seasons index'] = state.similar.column_memory()
+    return tables, wide
+
+# Logged at startup, by each gunicorn worker after it boots (gunicorn.conf.py) and after a reload
+def memory_report():
+    state = current()
+    log_memory_report(state.store, shared_snapshot_path(state.version) if SHARED else None)
+    log_table_report(*table_memory(state))
+
+memory_report()
+
+metrics.values['nba_dash_data_reloads'] = ('counter', 'New data versions swapped in', lambda: data.reloads)
+metrics.values['nba_dash_data_reload_failures'] = ('counter', 'Failed data reloads', lambda: data.failures)
+metrics.values['nba_dash_simulated_seasons'] = ('counter', 'Seasons simulated for projections', lambda: simulator.simulations)
+metrics.values['nba_dash_simulation_seconds'] = ('counter', 'Time spent simulating seasons', lambda: simulator.seconds)
+metrics.values['nba_dash_simulations_per_second'] = ('gauge', 'Simulation rate of the last projection run', lambda: simulator.last_rate)
 
 
 if __name__ == '__main__':
+    data.start()
+    simulator.start()
     app.run_server()
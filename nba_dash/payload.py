@@ -0,0 +1,110 @@
+import os
+import re
+
+import numpy as np
+
+from metrics import phase
+
+# Above this many points a figure is drawn with WebGL (Scattergl) instead of SVG
+WEBGL_POINTS = int(os.environ.get('NBA_DASH_WEBGL_POINTS', 1000))
+
+# Decimal places kept in numeric arrays. Hover formats show at most 2 (ratings, :.2f) or 2 of a percentage (:.2%)
+DIGITS = int(os.environ.get('NBA_DASH_FLOAT_DIGITS', 4))
+
+CUSTOMDATA_REF = re.compile(r'%\{customdata\[(\d+)\]')
+
+# Round float arrays to digits decimals. Object arrays (customdata columns) are first narrowed to the
+# type of their values, so whole numbers stay integers and strings are left alone
+def round_floats(values, digits=DIGITS):
+    array = np.asarray(values)
+    if array.dtype == object and array.ndim == 1:
+        array = np.array(array.tolist())
+    if array.dtype.kind == 'f':
+        # float32 columns (compact snapshots) are widened first, so the rounded values are exact decimals
+        return np.round(array.astype(np.float64), digits)
+    return array
+
+def same_values(a, b):
+    try:
+        return len(a) == len(b) and np.array_equal(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+    except (TypeError, ValueError):
+        return False
+
+# Constant string columns are written into the hovertemplate once instead of being sent for every point
+def constant_text(values):
+    values = np.asarray(values, dtype=object)
+    first = values[0]
+    if isinstance(first, str) and (values == first).all():
+        return first
+    return None
+
+# plotly express render_mode for a figure of this many points: WebGL (Scattergl) above webgl_points, else SVG
+def render_mode(points, webgl_points=WEBGL_POINTS):
+    return 'webgl' if points > webgl_points else 'svg'
+
+# Scattergl can't draw splines, so WebGL line charts use straight segments
+def line_shape(mode):
+    return 'linear' if mode == 'webgl' else 'spline'
+
+# Drop customdata columns the hovertemplate doesn't show, point references to columns that repeat
+# x, y or marker.size at those instead, and inline columns (and hovertext) that are constant across the trace.
+# The first keep_columns columns (a figure's custom_data, read back from clickData) stay as they are, in place
+def trim_hover(trace, keep_columns=0):
+    template = trace.hovertemplate
+    if not template:
+        return
+
+    if trace.hovertext is not None and len(trace.hovertext) and '%{hovertext}' in template:
+        text = constant_text(trace.hovertext)
+        if text is not None:
+            template = template.replace('%{hovertext}', text)
+            trace.hovertext = None
+
+    if trace.customdata is not None and len(trace.customdata):
+        customdata = np.asarray(trace.customdata, dtype=object)
+        twins = [('x', trace.x), ('y', trace.y)]
+        if trace.marker is not None and trace.marker.size is not None and not np.isscalar(trace.marker.size):
+            twins.append(('marker.size', trace.marker.size))
+
+        keep = list(range(min(keep_columns, customdata.shape[1])))
+        for i in range(len(keep), customdata.shape[1]):
+            column = customdata[:, i]
+            ref = '%{{customdata[{}]'.format(i)
+            if ref not in template:
+                continue
+            twin = next((name for name, values in twins if values is not None and same_values(column, values)), None)
+            text = constant_text(column)
+            if twin is not None:
+                template = template.replace(ref, '%{' + twin)
+            elif text is not None and ref + '}' in template:
+                template = template.replace(ref + '}', text)
+            else:
+                keep.append(i)
+
+        new_index = {old: new for new, old in enumerate(keep)}
+        template = CUSTOMDATA_REF.sub(lambda m: '%{{customdata[{}]'.format(new_index[int(m.group(1))]), template)
+        if keep:
+            # Object columns, so a string column doesn't turn the numbers into strings or years into floats
+            trimmed = np.empty((len(customdata), len(keep)), dtype=object)
+            for new, old in enumerate(keep):
+                trimmed[:, new] = round_floats(customdata[:, old])
+            trace.customdata = trimmed
+        else:
+            trace.customdata = None
+
+    trace.hovertemplate = template
+
+# Shrink a plotly express figure before it's serialized: numeric arrays rounded to DIGITS decimals and
+# hover data deduplicated (trim_hover). What the user sees is unchanged. keep_columns leading customdata columns
+# are left untouched for clickData
+def budget_figure(fig, keep_columns=0):
+    with phase('payload'):
+        for trace in fig.data:
+            if trace.type not in ('scatter', 'scattergl'):
+                continue
+            trim_hover(trace, keep_columns)
+            trace.x = round_floats(trace.x)
+            trace.y = round_floats(trace.y)
+            if trace.marker is not None and trace.marker.size is not None and not np.isscalar(trace.marker.size):
+                trace.marker.size = round_floats(trace.marker.size)
+    return fig
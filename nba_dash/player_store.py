@@ -0,0 +1,110 @@
+import os
+import json
+from functools import lru_cache
+
+import pyarrow.dataset as ds
+
+import http_cache
+from data_snapshot import DATA_DIR
+
+# Today's abbreviation for each of the 30 franchises, the team partitions the scraper writes (a franchise's older
+# names, e.g. Seattle SuperSonics, are under its current code), so the dashboard's team names translate to
+# partitions directly. Kept in step with FRANCHISE_CODES in nba_team_scrape/lineage.py, which wrote the partitions,
+# rather than imported from it, so the app deploys without the scraper
+FRANCHISE_CODES = {
+    'Atlanta Hawks': 'ATL', 'Boston Celtics': 'BOS', 'Brooklyn Nets': 'BRK', 'Charlotte Hornets': 'CHO',
+    'Chicago Bulls': 'CHI', 'Cleveland Cavaliers': 'CLE', 'Dallas Mavericks': 'DAL', 'Denver Nuggets': 'DEN',
+    'Detroit Pistons': 'DET', 'Golden State Warriors': 'GSW', 'Houston Rockets': 'HOU', 'Indiana Pacers': 'IND',
+    'Los Angeles Clippers': 'LAC', 'Los Angeles Lakers': 'LAL', 'Memphis Grizzlies': 'MEM', 'Miami Heat': 'MIA',
+    'Milwaukee Bucks': 'MIL', 'Minnesota Timberwolves': 'MIN', 'New Orleans Pelicans': 'NOP', 'New York Knicks': 'NYK',
+    'Oklahoma City Thunder': 'OKC', 'Orlando Magic': 'ORL', 'Philadelphia 76ers': 'PHI', 'Phoenix Suns': 'PHO',
+    'Portland Trail Blazers': 'POR', 'Sacramento Kings': 'SAC', 'San Antonio Spurs': 'SAS', 'Toronto Raptors': 'TOR',
+    'Utah Jazz': 'UTA', 'Washington Wizards': 'WAS',
+}
+
+# Player tables written by the scraper (nba_team_scrape/players.py): <table>/season=YYYY/team=XXX/part-0.parquet
+PLAYERS_DIR = os.environ.get('NBA_PLAYERS_DIR', os.path.join(DATA_DIR, 'players'))
+
+PLAYER_TABLES = ('per_game', 'per_minute', 'per_poss', 'advanced')
+
+# Columns every query returns alongside the ones asked for
+KEY_COLUMNS = ['player', 'season', 'team', 'franchise']
+
+# Partition of the season total rows of traded players (TOT, 2TM, 3TM... on the site, see players.py). Those
+# players also have a row per team, so the totals are only read when asked for
+COMBINED_CODE = 'TOT'
+
+def table_dir(table, players_dir=PLAYERS_DIR):
+    if table not in PLAYER_TABLES:
+        raise ValueError('Unknown player table {!r}, expected one of {}'.format(table, ', '.join(PLAYER_TABLES)))
+    return os.path.join(players_dir, table)
+
+# Discovering a table's files is done once per table until a season directory is rewritten
+def table_version(path):
+    if not os.path.isdir(path):
+        return ()
+    return tuple(sorted((name, os.stat(os.path.join(path, name)).st_mtime_ns) for name in os.listdir(path)))
+
+@lru_cache(maxsize=len(PLAYER_TABLES) * 2)
+def _dataset(path, version):
+    return ds.dataset(path, format='parquet', partitioning='hive')
+
+def player_dataset(table, players_dir=PLAYERS_DIR):
+    path = table_dir(table, players_dir)
+    return _dataset(path, table_version(path))
+
+# Rows of one player table for the given seasons and teams (franchise names or codes), with only the given
+# columns. Season and team filters prune whole partitions before anything is read, and only the requested
+# columns are read from the files that remain, so a view reads just what it shows. None means no filter / all columns.
+# Traded players' season totals are left out unless combined, so each game a player played is in one row
+def query_players(table, seasons=None, teams=None, columns=None, combined=False, players_dir=PLAYERS_DIR):
+    dataset = player_dataset(table, players_dir)
+
+    condition = None
+    if seasons is not None:
+        condition = ds.field('season').isin([int(season) for season in seasons])
+    if teams is not None:
+        codes = [FRANCHISE_CODES.get(team, team) for team in teams]
+        team_condition = ds.field('team').isin(codes + [COMBINED_CODE] if combined else codes)
+        condition = team_condition if condition is None else condition & team_condition
+    elif not combined:
+        team_condition = ds.field('team') != COMBINED_CODE
+        condition = team_condition if condition is None else condition & team_condition
+
+    if columns is not None:
+        columns = KEY_COLUMNS + [col for col in columns if col not in KEY_COLUMNS]
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+# GET /api/players?table=per_game&season=2020&team=Boston%20Celtics&column=pts_per_g as JSON records. season, team
+# and column can repeat and narrow what's read; combined=1 adds traded players' season totals. Revalidated against
+# the table's files, so a rescrape is picked up without a restart. 404 for a table the scraper hasn't written
+def init_app(server, players_dir=PLAYERS_DIR):
+    from flask import Response, abort, request
+
+    @server.route('/api/players')
+    def players():
+        table = request.args.get('table', 'per_game')
+        if table not in PLAYER_TABLES:
+            abort(400)
+        path = table_dir(table, players_dir)
+        version = table_version(path)
+        if not version:
+            abort(404)
+        seasons = request.args.getlist('season', type=int) or None
+        teams = request.args.getlist('team') or None
+        columns = request.args.getlist('column') or None
+        combined = request.args.get('combined', default=0, type=int) == 1
+
+        tag = http_cache.etag(version, 'players', table, seasons, teams, columns, combined)
+        if http_cache.matches(request.headers.get('If-None-Match'), tag):
+            response = Response(status=304)
+        else:
+            try:
+                players = query_players(table, seasons, teams, columns, combined, players_dir)
+            except (KeyError, ValueError):
+                abort(400)
+            response = Response(json.dumps({'players': json.loads(players.to_json(orient='records'))}, separators=(',', ':')),
+                                mimetype='application/json')
+        response.headers['ETag'] = tag
+        response.headers['Cache-Control'] = http_cache.REVALIDATE
+        return response
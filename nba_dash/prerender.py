@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import shutil
+import logging
+import argparse
+
+from data_snapshot import DATA_DIR, mapped_by
+from derived import DERIVED_KEY
+from http_cache import BUILD, IMMUTABLE
+
+logger = logging.getLogger(__name__)
+
+# Default views rendered ahead of time, one directory per data and code version and rolling window:
+# prerendered/<data version>-<build>-roll<window>/<name>.json / .html
+PRERENDER_DIR = os.environ.get('NBA_PRERENDER_DIR', os.path.join(DATA_DIR, 'prerendered'))
+
+# What an artifact directory name looks like: the two 16 hex digit hashes and the window. Anything else in a URL
+# is refused
+ARTIFACT_VERSION = re.compile(r'^[0-9a-f]{16}-[0-9a-f]{16}-roll[0-9]+$')
+ARTIFACT_NAME = re.compile(r'^[a-z0-9-]+$')
+
+# Artifact directories as every format so far has named them (<data version>, then -<build>, then -roll<window>),
+# for cleaning up. Not the temp directories of one being written
+ARTIFACT_DIR = re.compile(r'^[0-9a-f]{16}(-[0-9a-f]{16})?(-roll[0-9]+)?$')
+
+# A chart changed by a deploy is a new build, and a new window new derived columns, so neither reuses the
+# artifacts of the same data
+def artifact_version(version, build=BUILD, derived_key=DERIVED_KEY):
+    return '{}-{}-{}'.format(version, build, derived_key)
+
+def artifact_path(version, name, ext, prerender_dir=PRERENDER_DIR):
+    return os.path.join(prerender_dir, artifact_version(version), '{}.{}'.format(name, ext))
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+# Write a figure as JSON (what the app embeds) and as a standalone HTML page. Temp files and renames, since
+# several workers may render the same version at once
+def write_artifacts(version, name, fig, prerender_dir=PRERENDER_DIR):
+    import plotly.io as pio
+
+    write_file(artifact_path(version, name, 'html', prerender_dir),
+               pio.to_html(fig, include_plotlyjs='cdn', full_html=True))
+    write_file(artifact_path(version, name, 'json', prerender_dir), fig.to_json())
+
+# The figure for a default view as plain JSON, read from its artifact when it has been rendered for this version,
+# so serving it needs neither pandas nor plotly. Otherwise (or with force) it's built and the artifacts written
+def load_or_build(version, name, build, force=False, prerender_dir=PRERENDER_DIR):
+    path = artifact_path(version, name, 'json', prerender_dir)
+    if not force and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    fig = build()
+    write_artifacts(version, name, fig, prerender_dir)
+    logger.info('Prerendered %s for data version %s, build %s', name, version, BUILD)
+    return json.loads(fig.to_json())
+
+# Open descriptors on the artifact directories of the versions this process serves, by data version. Holding one
+# marks the directory in use for remove_stale_artifacts, as a mapping does a snapshot
+_held = {}
+
+def hold(version, prerender_dir=PRERENDER_DIR):
+    if version not in _held:
+        _held[version] = os.open(os.path.join(prerender_dir, artifact_version(version)), os.O_RDONLY)
+
+def release(version):
+    fd = _held.pop(version, None)
+    if fd is not None:
+        os.close(fd)
+
+# Delete the artifact directories other than keep's (the data version being served) that no process holds, leaving
+# out the pids in ignore (the gunicorn master, whose hold on the version it preloaded workers no longer use). As for
+# snapshots (data_snapshot.remove_stale_snapshots), every worker calls this after it has moved to a new version, so
+# the last to let go of an old directory removes it. Nothing is removed where descriptors can't be read
+def remove_stale_artifacts(keep, prerender_dir=PRERENDER_DIR, ignore=()):
+    if not os.path.isdir(prerender_dir):
+        return []
+    stale = [os.path.join(prerender_dir, name) for name in os.listdir(prerender_dir)
+             if ARTIFACT_DIR.match(name) and name != artifact_version(keep)]
+    if not stale:
+        return []
+    held = mapped_by(stale)
+    if held is None:
+        return []
+
+    removed = []
+    for path in stale:
+        if held[os.path.realpath(path)] - set(ignore):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+        logger.info('Removed prerendered %s, no longer held', path)
+    return removed
+
+# Serve the artifacts at /prerendered/<data version>-<build>-roll<window>/<name>.(json|html). The URL names
+# everything they're built from, so they're cached for good. Only names of the expected form get near the filesystem
+def init_app(server, prerender_dir=PRERENDER_DIR):
+    from flask import abort, send_from_directory
+
+    @server.route('/prerendered/<version>/<name>.<ext>')
+    def prerendered(version, name, ext):
+        if ext not in ('json', 'html') or not ARTIFACT_VERSION.match(version) or not ARTIFACT_NAME.match(name):
+            abort(404)
+        directory = os.path.join(prerender_dir, version)
+        if not os.path.exists(os.path.join(directory, '{}.{}'.format(name, ext))):
+            abort(404)
+        response = send_from_directory(directory, '{}.{}'.format(name, ext))
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+# Build step, run at deploy time: python prerender.py [--force]. Loading the app renders any default view missing
+# for the current data version; --force renders them all again (e.g. after a change to a chart)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prerender the default views for the current data version')
+    parser.add_argument('--force', action='store_true', help='render views that already have artifacts too')
+    args = parser.parse_args()
+
+    import nba_dash
+    state = nba_dash.current()
+    if args.force:
+        nba_dash.default_figures(state.store, state.cube, state.version, force=True)
+    for name in nba_dash.default_views(state.store, state.cube):
+        print(artifact_path(state.version, name, 'html'))
@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+import http_cache
+from team_season_store import widen
+
+# What makes two team-seasons alike: adjusted ratings and record
+FEATURES = ['ortg_a', 'drtg_a', 'nrtg_a', 'w_l_percent']
+
+MAX_K = 100
+
+# Nearest-neighbor index over every team-season of a TeamSeasonStore, built once per data version. Each feature is
+# z-normalized over all seasons so ratings (points per 100 possessions) and win-loss % weigh the same, and seasons
+# missing any feature are left out. A query is one k-d tree lookup, a few microseconds whatever the number of rows
+class SimilarSeasons:
+    def __init__(self, store, features=FEATURES):
+        self.store = store
+        self.features = features
+
+        values = np.column_stack([store.columns[feature].astype(np.float64) for feature in features])
+        complete = ~np.isnan(values).any(axis=1)
+        self.rows = np.flatnonzero(complete)
+        # position[row] is the row's index in matrix, -1 for seasons not indexed
+        self.position = np.full(len(store), -1, dtype=np.int64)
+        self.position[self.rows] = np.arange(len(self.rows))
+
+        values = values[complete]
+        self.mean = values.mean(axis=0) if len(values) else np.zeros(len(features))
+        std = values.std(axis=0) if len(values) else np.ones(len(features))
+        self.scale = np.where(std > 0, std, 1.0)
+        self.matrix = (values - self.mean) / self.scale
+        self.tree = cKDTree(self.matrix)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column_memory(self):
+        return {'matrix': self.matrix.nbytes, 'rows': self.rows.nbytes, 'position': self.position.nbytes,
+                'tree': self.tree.data.nbytes + self.tree.indices.nbytes}
+
+    # Store row of a team-season, or None if there isn't one with every feature
+    def row(self, team, year):
+        code = self.store.team_lookup.get(team)
+        offset = int(year) - self.store.year_min
+        if code is None or not 0 <= offset < self.store.offsets.shape[1]:
+            return None
+        row = self.store.offsets[code, offset]
+        return int(row) if row >= 0 and self.position[row] >= 0 else None
+
+    # The k team-seasons closest to a team-season, nearest first and not including itself: team, year, distance
+    # (in standard deviations) and the features, as a dict of arrays. Empty if the season isn't indexed
+    def query(self, team, year, k=10):
+        row = self.row(team, year)
+        k = min(max(int(k), 0), MAX_K, len(self) - 1)
+        if row is None or k <= 0:
+            return self.rows_to_dict(np.empty(0, dtype=np.int64), np.empty(0))
+
+        distances, positions = self.tree.query(self.matrix[self.position[row]], k=k + 1)
+        distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+        rows = self.rows[positions]
+        # The season itself, wherever ties put it
+        keep = rows != row
+        return self.rows_to_dict(rows[keep][:k], distances[keep][:k])
+
+    def rows_to_dict(self, rows, distances):
+        similar = {'team': self.store.team_names[self.store.team_code[rows]],
+                   'year': self.store.year[rows],
+                   'distance': distances}
+        for feature in self.features:
+            similar[feature] = widen(self.store.columns[feature][rows])
+        return similar
+
+# GET /api/similar?team=Boston%20Celtics&year=2008&k=10 as JSON records. Revalidated per data version like the
+# callbacks. state returns the current data state, whose similar attribute is the index
+def init_app(server, state):
+    from flask import Response, abort, request
+
+    @server.route('/api/similar')
+    def similar_seasons():
+        team, year = request.args.get('team'), request.args.get('year', type=int)
+        k = request.args.get('k', default=10, type=int)
+        if not team or year is None:
+            abort(400)
+
+        current = state()
+        tag = http_cache.etag(current.version, 'similar', team, year, k)
+        if http_cache.matches(request.headers.get('If-None-Match'), tag):
+            response = Response(status=304)
+        else:
+            similar = current.similar.query(team, year, k)
+            columns = {key: values.tolist() for key, values in similar.items()}
+            records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            response = Response(json.dumps({'team': team, 'year': year, 'similar': records}, separators=(',', ':')),
+                                mimetype='application/json')
+        response.headers['ETag'] = tag
+        response.headers['Cache-Control'] = http_cache.REVALIDATE
+        return response
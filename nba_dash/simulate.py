@@ -0,0 +1,237 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+from scipy.special import ndtr
+
+logger = logging.getLogger(__name__)
+
+# Standard deviation of a game's final margin around the difference in net ratings, in points
+SIGMA = float(os.environ.get('NBA_SIM_SIGMA', 12))
+
+GAMES = 82
+
+PLAYOFF_TEAMS = 8
+
+# Processes simulating chunks in parallel, and seasons per chunk. A run of one chunk stays in the calling process.
+# Every gunicorn worker has its own pool, so there are gunicorn workers x this many in all: the default is kept small
+WORKERS = int(os.environ.get('NBA_SIM_WORKERS', min(2, os.cpu_count() or 1)))
+CHUNK_SIMS = int(os.environ.get('NBA_SIM_CHUNK', 5000))
+
+CACHE_ENTRIES = 32
+
+# Teams of one season in store order with their conference, division and adjusted net rating.
+# A missing rating counts as league average
+def season_teams(store, year):
+    rows = store.offsets[:, int(year) - store.year_min]
+    rows = rows[rows >= 0]
+    return {'team': store.team_names[store.team_code[rows]],
+            'conf': store.columns['conf'][rows].astype(str),
+            'div': store.columns['div'][rows].astype(str),
+            'nrtg_a': np.nan_to_num(store.columns['nrtg_a'][rows].astype(np.float64))}
+
+# Games between each pair of teams, after the NBA's formula: 4 against division rivals, 2 against the other
+# conference and 3 or 4 against the rest of the conference. At 4 games apiece every team of a conference is the
+# same number of games over 82, and that many of its conference pairs are cut to 3 by a fixed rotation: with the
+# teams in division order, team i plays 3 against teams i + k and i - k for offsets k no smaller than the largest
+# division, so a cut pair is never two division rivals. With three divisions of five that's offsets 5 and 6, each
+# team playing 3 against two teams of each other division
+def build_schedule(conf, div, games=GAMES):
+    same_conf = conf[:, None] == conf[None, :]
+    schedule = np.where(same_conf, 4, 2)
+    np.fill_diagonal(schedule, 0)
+
+    for name in np.unique(conf):
+        members = np.flatnonzero(conf == name)
+        members = members[np.argsort(div[members], kind='stable')]
+        n = len(members)
+        excess = int(schedule[members[0]].sum()) - games
+        largest = np.unique(div[members], return_counts=True)[1].max()
+        for k in range(largest, n // 2 + 1):
+            # An offset of half the conference pairs each team once, any other twice
+            cuts = 1 if 2 * k == n else 2
+            if cuts > excess:
+                continue
+            opponents = members[(np.arange(n) + k) % n]
+            schedule[members, opponents] = schedule[opponents, members] = 3
+            excess -= cuts
+        if excess:
+            raise ValueError('No rotation gives the {} conference {} games a team'.format(name, games))
+
+    assert (schedule.sum(axis=1) == games).all()
+    return schedule
+
+# Everything a chunk needs, as plain arrays so it pickles cheaply to the pool: every game of the schedule as the
+# probability its first team wins (the chance a normal margin around the rating difference is positive), and the
+# games as a games x teams matrix of +1 for the first team and -1 for the second
+def season_inputs(teams, sigma=SIGMA):
+    schedule = build_schedule(teams['conf'], teams['div'])
+    first, second = np.nonzero(np.triu(schedule, 1))
+    first, second = np.repeat(first, schedule[first, second]), np.repeat(second, schedule[first, second])
+    n_teams = len(teams['team'])
+
+    sides = np.zeros((len(first), n_teams), dtype=np.float32)
+    sides[np.arange(len(first)), first] = 1
+    sides[np.arange(len(first)), second] = -1
+    conferences, conf_code = np.unique(teams['conf'], return_inverse=True)
+    return {'p': ndtr((teams['nrtg_a'][first] - teams['nrtg_a'][second]) / sigma).astype(np.float32),
+            'sides': sides,
+            'second_games': np.bincount(second, minlength=n_teams),
+            'conf_code': conf_code,
+            'n_conf': len(conferences),
+            'n_teams': n_teams,
+            'max_games': int(schedule.sum(axis=1).max()) if n_teams else 0}
+
+# Simulate n_sims seasons at once: one uniform draw per game and season (an n_sims x games array) decides every
+# game, and a single matrix product with the game sides turns the results into each team's wins (wins as the
+# first team, plus games as the second team, minus those lost as the second). Playoff teams are each conference's
+# top PLAYOFF_TEAMS by wins, ties broken at random. Returns sums, not seasons: a histogram of win totals per team,
+# playoff and top-seed counts, so a chunk's result is small whatever its size
+def simulate_chunk(inputs, n_sims, seed):
+    rng = np.random.default_rng(seed)
+    n_teams = inputs['n_teams']
+    first_wins = (rng.random((n_sims, len(inputs['p'])), dtype=np.float32) < inputs['p']).astype(np.float32)
+    wins = np.rint(first_wins @ inputs['sides']).astype(np.int64) + inputs['second_games']
+
+    score = wins + rng.random(wins.shape) * 0.5
+    playoffs = np.zeros(n_teams, dtype=np.int64)
+    top_seed = np.zeros(n_teams, dtype=np.int64)
+    for conf in range(inputs['n_conf']):
+        members = np.flatnonzero(inputs['conf_code'] == conf)
+        order = members[np.argsort(-score[:, members], axis=1)]
+        playoffs += np.bincount(order[:, :PLAYOFF_TEAMS].ravel(), minlength=n_teams)
+        top_seed += np.bincount(order[:, 0], minlength=n_teams)
+
+    bins = inputs['max_games'] + 1
+    histogram = np.bincount((wins + np.arange(n_teams) * bins).ravel(), minlength=n_teams * bins).reshape(n_teams, bins)
+    return {'histogram': histogram, 'playoffs': playoffs, 'top_seed': top_seed}
+
+def chunk_sizes(n_sims, chunk_sims=CHUNK_SIMS):
+    sizes = [chunk_sims] * (n_sims // chunk_sims)
+    if n_sims % chunk_sims:
+        sizes.append(n_sims % chunk_sims)
+    return sizes
+
+# Win total at quantile q of each team's histogram
+def histogram_quantile(histogram, q):
+    cumulative = np.cumsum(histogram, axis=1)
+    return np.argmax(cumulative >= q * cumulative[:, -1:], axis=1)
+
+# Monte Carlo projections of a season from its teams' adjusted net ratings, cached per (data version, parameters).
+# Seasons run in chunks spread over a process pool, each chunk with its own stream spawned from one SeedSequence,
+# so a run's result depends on its seed and chunk size but not on the number of processes
+class Simulator:
+    def __init__(self, workers=WORKERS, chunk_sims=CHUNK_SIMS, cache_entries=CACHE_ENTRIES):
+        self.workers = workers
+        self.chunk_sims = chunk_sims
+        self.cache_entries = cache_entries
+        self.simulations = 0
+        self.seconds = 0.0
+        self.last_rate = 0.0
+        self._cache = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._started_pid = None
+
+    # Let this process use a pool, made on its first run of more than one chunk. Called in each gunicorn worker once
+    # it has booted (gunicorn.conf.py), never at import, so the preloading master renders the default projections
+    # in process and never makes a pool for its workers to inherit
+    def start(self):
+        self._started_pid = os.getpid()
+
+    # The pool's processes come from a fork server rather than a fork of this threaded process, so they inherit
+    # neither its threads' locks nor its mapped snapshot and held artifacts. None until start() in this process
+    def pool(self):
+        if self._started_pid != os.getpid():
+            return None
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def run(self, teams, n_sims, seed=0, sigma=SIGMA):
+        start = time.perf_counter()
+        inputs = season_inputs(teams, sigma)
+        sizes = chunk_sizes(n_sims, self.chunk_sims)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        pool = self.pool() if self.workers > 1 and len(sizes) > 1 else None
+        if pool is not None:
+            chunks = list(pool.map(simulate_chunk, [inputs] * len(sizes), sizes, seeds))
+        else:
+            chunks = [simulate_chunk(inputs, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+        seconds = time.perf_counter() - start
+
+        histogram = sum(chunk['histogram'] for chunk in chunks)
+        wins = np.arange(histogram.shape[1])
+        mean = histogram @ wins / n_sims
+        projection = dict(teams,
+                          mean_wins=mean,
+                          std_wins=np.sqrt(np.maximum(histogram @ wins ** 2 / n_sims - mean ** 2, 0)),
+                          p10_wins=histogram_quantile(histogram, 0.1),
+                          p50_wins=histogram_quantile(histogram, 0.5),
+                          p90_wins=histogram_quantile(histogram, 0.9),
+                          playoffs=sum(chunk['playoffs'] for chunk in chunks) / n_sims,
+                          top_seed=sum(chunk['top_seed'] for chunk in chunks) / n_sims,
+                          histogram=histogram,
+                          games=len(inputs['p']) * 2 // max(inputs['n_teams'], 1),
+                          sims=n_sims,
+                          seconds=seconds,
+                          sims_per_second=n_sims / seconds if seconds > 0 else float('inf'))
+
+        with self._lock:
+            self.simulations += n_sims
+            self.seconds += seconds
+            self.last_rate = projection['sims_per_second']
+        logger.info('Simulated %d seasons in %.2f s (%.0f sims/sec, %d chunks on %d processes)', n_sims, seconds,
+                    projection['sims_per_second'], len(sizes), self.workers if pool is not None else 1)
+        return projection
+
+    # Projection of a season of the store, computed at most once per data version and parameters. A request for a
+    # projection already being run waits for that run's result instead of starting its own
+    def project(self, version, store, year, n_sims, seed=0, sigma=SIGMA):
+        key = (version, int(year), int(n_sims), int(seed), float(sigma))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            running = self._running.get(key)
+            if running is None:
+                running = self._running[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return running.result()
+
+        try:
+            projection = self.run(season_teams(store, year), int(n_sims), seed, sigma)
+        except BaseException as e:
+            with self._lock:
+                del self._running[key]
+            running.set_exception(e)
+            raise
+        with self._lock:
+            self._cache[key] = projection
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+            del self._running[key]
+        running.set_result(projection)
+        return projection
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    # Drop projections of other data versions once a new one is in
+    def retain_version(self, version):
+        with self._lock:
+            for key in [key for key in self._cache if key[0] != version]:
+                del self._cache[key]
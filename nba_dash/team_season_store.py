@@ -0,0 +1,132 @@
+import sys
+
+import numpy as np
+import pyarrow as pa
+
+# float32 values as the float64 with the same shortest decimal form (112.34 rather than 112.33999633789062), so
+# they serialize as they read in the csv. Other arrays are returned as they are
+def widen(values):
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values
+
+# Integer array in the smallest signed type that holds its values (team codes in int8, years in int16).
+# Pandas indexes hold integers as int64 whatever the snapshot stored
+def small_int(values):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if not len(values) or (info.min <= values.min() and values.max() <= info.max):
+            return values.astype(dtype)
+    return values
+
+# Team-season rows as contiguous numpy columns plus a (team, year) -> row offset grid, built once at load.
+# Callbacks gather the rows they need with one fancy index per column instead of MultiIndex .loc lookups
+class TeamSeasonStore:
+    def __init__(self, team_names, team_code, year, columns):
+        self.team_names = team_names
+        self.team_code = team_code
+        self.year = year
+        self.columns = columns
+
+        self.team_lookup = {name: code for code, name in enumerate(team_names)}
+        self.year_min = int(year.min()) if len(year) else 0
+        self.year_max = int(year.max()) if len(year) else -1
+
+        # offsets[team, year - year_min] is the row of that team-season, -1 where there isn't one
+        self.offsets = np.full((len(team_names), self.year_max - self.year_min + 1), -1, dtype=np.int32 if len(year) < 2 ** 31 else np.int64)
+        self.offsets[team_code, year - self.year_min] = np.arange(len(year))
+
+    # Build from NBA_long as loaded (indexed by team and year)
+    @classmethod
+    def from_frame(cls, df):
+        teams = df.index.get_level_values('team')
+        team_names, team_code = np.unique(np.asarray(teams, dtype=object), return_inverse=True)
+        year = np.asarray(df.index.get_level_values('year'))
+        columns = {col: np.ascontiguousarray(df[col].to_numpy()) for col in df.columns}
+        return cls(team_names, small_int(team_code), small_int(year), columns)
+
+    # Build from the memory-mapped table of load_shared_snapshot. Numeric columns and the team codes are
+    # read-only views of the mapped file (nothing is copied); the few-valued string columns are decoded
+    # into small per-process arrays
+    @classmethod
+    def from_arrow(cls, table):
+        arrays = {}
+        for name in table.column_names:
+            column = table.column(name)
+            arrays[name] = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
+        team = arrays.pop('team')
+        team_names = np.asarray(team.dictionary.to_pylist(), dtype=object)
+        team_code = team.indices.to_numpy(zero_copy_only=True)
+        year = arrays.pop('year').to_numpy(zero_copy_only=True)
+
+        columns = {}
+        for name, array in arrays.items():
+            if isinstance(array, pa.DictionaryArray):
+                labels = np.asarray(array.dictionary.to_pylist(), dtype=object)
+                columns[name] = labels[array.indices.to_numpy(zero_copy_only=True)]
+            else:
+                columns[name] = array.to_numpy(zero_copy_only=True)
+        return cls(team_names, team_code, year, columns)
+
+    # Bytes held by the columns, split into those backed by a memory-mapped file and those private to this process
+    def memory_usage(self):
+        arrays = [self.team_code, self.year, self.offsets] + list(self.columns.values())
+        mapped = sum(a.nbytes for a in arrays if not a.flags.owndata and not a.flags.writeable)
+        return {'mapped': mapped, 'private': sum(a.nbytes for a in arrays) - mapped}
+
+    # Bytes per array (the string labels of object columns counted once each), for the table report at startup
+    def column_memory(self):
+        arrays = dict(team_code=self.team_code, year=self.year, offsets=self.offsets, **self.columns)
+        memory = {}
+        for name, values in arrays.items():
+            memory[name] = values.nbytes
+            if values.dtype == object:
+                memory[name] += sum(sys.getsizeof(label) for label in {id(v): v for v in values}.values())
+        return memory
+
+    def __len__(self):
+        return len(self.year)
+
+    @property
+    def years(self):
+        return np.arange(self.year_min, self.year_max + 1)
+
+    # Row offsets for the selected teams and seasons, season by season with teams alphabetical (the csv order)
+    def rows(self, teams, start_year, end_year):
+        codes = np.sort([self.team_lookup[team] for team in teams or [] if team in self.team_lookup]).astype(np.int64)
+        lo = max(int(start_year) - self.year_min, 0)
+        hi = min(int(end_year) - self.year_min + 1, self.offsets.shape[1])
+        if hi <= lo or not len(codes):
+            return np.empty(0, dtype=np.int64)
+        rows = self.offsets[codes, lo:hi].T.ravel()
+        return rows[rows >= 0]
+
+    # Columns for the selected team-seasons as a dict of arrays, ready to hand to plotly express.
+    # fill_value replaces missing numeric values (e.g. seasons before an expansion team existed)
+    def select(self, teams, start_year, end_year, columns=None, fill_value=None):
+        rows = self.rows(teams, start_year, end_year)
+        selected = {'team': self.team_names[self.team_code[rows]],
+                    'year': self.year[rows]}
+        for col in columns if columns is not None else self.columns:
+            values = self.columns[col][rows]
+            if fill_value is not None and values.dtype.kind == 'f':
+                values[np.isnan(values)] = fill_value
+            selected[col] = values
+        return selected
+
+    # Compact, json-ready copy of the store for the browser: numeric columns rounded to digits with NaN as null,
+    # string columns as labels plus integer codes, rows in store order
+    def to_payload(self, columns=None, digits=6):
+        payload = {'teams': self.team_names.tolist(),
+                   'team': self.team_code.tolist(),
+                   'year': self.year.tolist(),
+                   'columns': {}}
+        for col in columns if columns is not None else self.columns:
+            values = self.columns[col]
+            if values.dtype.kind == 'f':
+                payload['columns'][col] = [None if v != v else v for v in np.round(widen(values), digits).tolist()]
+            else:
+                labels, codes = np.unique(values.astype(str), return_inverse=True)
+                payload['columns'][col] = {'labels': labels.tolist(), 'codes': codes.tolist()}
+        return payload
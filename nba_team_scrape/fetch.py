@@ -0,0 +1,163 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from functools import partial
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://www.basketball-reference.com'
+RATINGS_PATH = '/leagues/NBA_{}_ratings.html'
+
+# Basketball Reference asks scrapers to stay under 20 requests a minute
+RATE = 20 / 60
+BURST = 3
+MAX_WORKERS = 4
+RETRIES = 4
+BACKOFF = 2.0
+TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Token bucket: refills at rate tokens per second up to capacity, acquire() blocks until a token is free
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# One token bucket per host, so a stand-in server and the real site are limited separately
+class RateLimiter:
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+        bucket.acquire()
+
+# Shared keep-alive session with a connection pool sized for the worker threads
+def make_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'nba-team-scrape (+https://github.com/hrishipoola/NBA_dashboard)'
+    return session
+
+# GET a url through the rate limiter, retrying connection errors and 429/5xx with exponential backoff and jitter
+def fetch(session, limiter, url, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, **kwargs):
+    for attempt in range(retries + 1):
+        limiter.acquire(url)
+        try:
+            response = session.get(url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            retry_after = None
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get('Retry-After')
+
+        if retry_after is not None and retry_after.isdigit():
+            delay = int(retry_after)
+        else:
+            delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+        print('Retrying {} in {:.1f}s (attempt {} of {})'.format(url, delay, attempt + 1, retries))
+        time.sleep(delay)
+
+def ratings_url(year, base_url=BASE_URL):
+    return base_url + RATINGS_PATH.format(year)
+
+def ratings_page_name(year):
+    return os.path.basename(RATINGS_PATH.format(year))
+
+# Fetch the page for each key (url_for(key)) on a bounded thread pool, returning {key: html} in key order.
+# With a manifest, requests are conditional and pages that are not modified (304) or whose table hashes
+# the same as last time are left out, so only changed pages get parsed and written. With missing_ok, keys
+# whose page doesn't exist (404) are left out too. Pass a limiter to share one rate limit across several calls
+def fetch_pages(keys, url_for, max_workers=MAX_WORKERS, rate=RATE, burst=BURST, manifest=None, missing_ok=False,
+                limiter=None):
+    keys = list(keys)
+    limiter = limiter or RateLimiter(rate, burst)
+    with make_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def get(key):
+            headers = manifest.conditional_headers(key) if manifest is not None else {}
+            try:
+                return fetch(session, limiter, url_for(key), headers=headers)
+            except requests.HTTPError as e:
+                if missing_ok and e.response is not None and e.response.status_code == 404:
+                    return e.response
+                raise
+        responses = list(pool.map(get, keys))
+
+    pages = {}
+    for key, response in zip(keys, responses):
+        if response.status_code == 404:
+            print('{} not found.'.format(key))
+            continue
+        if response.status_code == 304:
+            print('{} not modified.'.format(key))
+            continue
+        if manifest is not None and not manifest.update(key, response):
+            print('{} unchanged.'.format(key))
+            continue
+        pages[key] = response.text
+    return pages
+
+# Fetch the ratings page for each season, returning {year: html} for the seasons that changed (see fetch_pages)
+def fetch_seasons(years, base_url=BASE_URL, max_workers=MAX_WORKERS, rate=RATE, burst=BURST, manifest=None):
+    return fetch_pages(years, lambda year: ratings_url(year, base_url), max_workers, rate, burst, manifest)
+
+# Save fetched pages so later runs (and the stand-in server) can re-use them without the network
+def save_pages(pages, pages_dir, page_name=ratings_page_name):
+    os.makedirs(pages_dir, exist_ok=True)
+    for key, html in pages.items():
+        with open(os.path.join(pages_dir, page_name(key)), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+# Serves saved pages from one flat directory under any path, e.g. /leagues/NBA_2020_ratings.html -> NBA_2020_ratings.html
+class SavedPageHandler(SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        return os.path.join(self.directory, os.path.basename(urlsplit(path).path))
+
+    def log_message(self, format, *args):
+        pass
+
+# Local stand-in for basketball-reference serving saved pages (NBA_{year}_ratings.html, schedule pages), for
+# offline runs. Yields the base url to pass to fetch_seasons or ingest_games
+@contextmanager
+def serve_pages(pages_dir, port=0):
+    handler = partial(SavedPageHandler, directory=os.path.abspath(pages_dir))
+    httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
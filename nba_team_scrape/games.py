@@ -0,0 +1,186 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fetch import BASE_URL, RateLimiter, fetch_pages, save_pages
+from manifest import Manifest
+from parse import parse_table, table_frame
+from lineage import franchise_names
+
+# Each season's results are split over one schedule page per month (the 2020 bubble season has two Octobers),
+# linked from the season's index page
+GAMES_PATH = '/leagues/NBA_{}_games.html'
+MONTH_PATH = '/leagues/NBA_{}_games-{}.html'
+MONTH_LINK = 'href="/leagues/NBA_{}_games-([a-z0-9-]+)\\.html"'
+
+SCHEDULE_TEXT = ('date_game', 'game_start_time', 'visitor_team_name', 'home_team_name', 'box_score_text',
+                 'overtimes', 'arena_name', 'game_remarks')
+
+# One row per game. Points are empty for games not played yet. Teams are the names of the day, with
+# today's franchise alongside (lineage.py), so games line up with the team-season data
+GAMES_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('start_time', pa.string()),
+    ('visitor', pa.string()),
+    ('visitor_franchise', pa.string()),
+    ('visitor_pts', pa.int16()),
+    ('home', pa.string()),
+    ('home_franchise', pa.string()),
+    ('home_pts', pa.int16()),
+    ('overtimes', pa.string()),
+    ('attendance', pa.int32()),
+    ('playoffs', pa.bool_()),
+])
+
+def games_url(year, base_url=BASE_URL):
+    return base_url + GAMES_PATH.format(year)
+
+def month_key(year, month):
+    return '{}-{}'.format(year, month)
+
+def month_url(key, base_url=BASE_URL):
+    return base_url + MONTH_PATH.format(*key.split('-', 1))
+
+def games_page_name(year):
+    return os.path.basename(GAMES_PATH.format(year))
+
+def month_page_name(key):
+    return os.path.basename(MONTH_PATH.format(*key.split('-', 1)))
+
+# Months of a season in schedule order, from the links on its index page
+def season_months(html, year):
+    months = []
+    for month in re.findall(MONTH_LINK.format(year), html):
+        if month not in months:
+            months.append(month)
+    return months
+
+# Index pages are tracked in the games manifest under the bare year (months are year-month). The rest of an
+# index page changes on every request and its schedule table is just the first month, so what's hashed is the
+# list of month links: an unchanged index is read back from its saved page
+class IndexManifest(Manifest):
+    def update(self, year, response):
+        entry = self.seasons.setdefault(str(year), {})
+        entry['url'] = response.url
+        entry['etag'] = response.headers.get('ETag')
+        entry['last_modified'] = response.headers.get('Last-Modified')
+        months = season_months(response.text, year)
+        changed = months != entry.get('months')
+        entry['months'] = months
+        return changed
+
+# Season partition in hive layout (season=2020/games.parquet), so pyarrow.dataset reads the season back as a column
+def season_path(games_dir, year):
+    return os.path.join(games_dir, 'season={}'.format(year), 'games.parquet')
+
+def int_array(values, type):
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    return pa.array(np.where(missing, 0, values).astype(type.to_pandas_dtype()), type=type, mask=missing)
+
+def text_array(values):
+    return pa.array([value if value else None for value in values], type=pa.string())
+
+# Games on one month's schedule page as an arrow table. in_playoffs says whether the season's playoffs started
+# on an earlier page; within a page they start at the "Playoffs" divider row. Returns the table and whether
+# the playoffs have started by the end of the page
+def parse_games(html, year, in_playoffs=False):
+    target = parse_table(html, 'schedule', text_columns=SCHEDULE_TEXT)
+    games = table_frame(target, names=lambda text, stat: stat)
+    n = len(games)
+    column = lambda stat: games[stat] if stat in games else pd.Series([np.nan] * n)
+
+    playoffs = np.full(n, in_playoffs)
+    if target.breaks:
+        playoffs[target.breaks[0]:] = True
+
+    visitor = np.asarray(column('visitor_team_name'), dtype=object)
+    home = np.asarray(column('home_team_name'), dtype=object)
+    franchises = franchise_names(np.concatenate([visitor, home]), np.full(2 * n, year))
+
+    date = pd.to_datetime(games['date_game'], format='%a, %b %d, %Y') if n else pd.Series([], dtype='datetime64[ns]')
+    table = pa.Table.from_arrays([
+        pa.array(date.dt.date.to_numpy(), type=pa.date32()),
+        text_array(column('game_start_time').fillna('')),
+        text_array(visitor),
+        text_array(franchises[:n]),
+        int_array(column('visitor_pts'), pa.int16()),
+        text_array(home),
+        text_array(franchises[n:]),
+        int_array(column('home_pts'), pa.int16()),
+        text_array(column('overtimes').fillna('')),
+        int_array(column('attendance'), pa.int32()),
+        pa.array(playoffs, type=pa.bool_()),
+    ], schema=GAMES_SCHEMA)
+    return table, bool(playoffs[-1]) if n else in_playoffs
+
+# Stream a season's month pages, in order, into its partition: each page is parsed and written as its own
+# row group, so only one month of games is ever held in memory. Written to a temp file and renamed
+def write_season(year, months, pages_dir, games_dir):
+    path = season_path(games_dir, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    rows = 0
+    in_playoffs = False
+    with pq.ParquetWriter(tmp_path, GAMES_SCHEMA, compression='snappy') as writer:
+        for month in months:
+            with open(os.path.join(pages_dir, month_page_name(month_key(year, month))), encoding='utf-8') as f:
+                table, in_playoffs = parse_games(f.read(), year, in_playoffs)
+            writer.write_table(table)
+            rows += table.num_rows
+    os.replace(tmp_path, path)
+    return rows
+
+# Months of a season from its index page, fetched only when it changed since the saved copy (conditional on the
+# manifest, see IndexManifest). Without a manifest, or when the saved copy is gone, it's fetched outright
+def index_months(year, pages_dir, base_url=BASE_URL, manifest=None, offline=False, limiter=None):
+    saved = os.path.join(pages_dir, games_page_name(year))
+    index_manifest = IndexManifest(manifest.path, manifest.seasons, manifest.table_id) if manifest is not None else None
+    if index_manifest is not None and not offline:
+        index_manifest.drop_missing([year], lambda year: saved)
+    index = fetch_pages([year], lambda year: games_url(year, base_url), manifest=index_manifest, limiter=limiter)
+    if year in index:
+        if not offline:
+            save_pages(index, pages_dir, games_page_name)
+        return season_months(index[year], year)
+    with open(saved, encoding='utf-8') as f:
+        return season_months(f.read(), year)
+
+# Fetch, save and write the games of each season, one season at a time. Index and month pages are conditional on
+# the manifest (keyed year and year-month), and a season's partition is rewritten from its saved pages only when
+# one of its months changed. Seasons before the last one are final, so they're only checked with full (or when
+# their partition is missing). Offline, pages are already in pages_dir
+def ingest_games(years, games_dir, pages_dir, base_url=BASE_URL, manifest=None, offline=False, full=False):
+    limiter = RateLimiter()
+    years = list(years)
+    for year in years:
+        if not full and year != years[-1] and os.path.exists(season_path(games_dir, year)):
+            continue
+        keys = [month_key(year, month) for month in index_months(year, pages_dir, base_url, manifest, offline, limiter)]
+
+        # A month whose saved page is gone is fetched outright, so the season is written from every month
+        if manifest is not None:
+            manifest.drop_missing(keys, lambda key: season_path(games_dir, year))
+            if not offline:
+                manifest.drop_missing(keys, lambda key: os.path.join(pages_dir, month_page_name(key)))
+        pages = fetch_pages(keys, lambda key: month_url(key, base_url), manifest=manifest, missing_ok=True, limiter=limiter)
+        if not pages:
+            print('{} games up to date.'.format(year))
+            continue
+
+        if not offline:
+            save_pages(pages, pages_dir, month_page_name)
+        missing = [key for key in keys if not os.path.exists(os.path.join(pages_dir, month_page_name(key)))]
+        if missing:
+            raise RuntimeError('{} games: no page for {}'.format(year, ', '.join(missing)))
+        rows = write_season(year, [key.split('-', 1)[1] for key in keys], pages_dir, games_dir)
+        print('{} games completed ({} games).'.format(year, rows))
+
+        if manifest is not None:
+            for key in pages:
+                manifest.mark_parsed(key)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Franchise lineage: which of today's 30 franchises each team name's seasons belong to.
+# (team name, first season, last season, franchise, conf, div). Seasons are inclusive and None is
+# open-ended. Teams not listed map to themselves. Seasons of a listed team that no row covers are dropped.
+# Extending the history back (e.g. Buffalo Braves -> Clippers) is a matter of adding rows here
+LINEAGE = [
+    # Seattle SuperSonics became the Oklahoma City Thunder from 2009 onward
+    ('Seattle SuperSonics', None, None, 'Oklahoma City Thunder', 'W', 'NW'),
+    ('Oklahoma City Thunder', None, None, 'Oklahoma City Thunder', 'W', 'NW'),
+
+    # Vancouver Grizzlies became the Memphis Grizzlies from 2002 onward
+    ('Vancouver Grizzlies', None, None, 'Memphis Grizzlies', 'W', 'M'),
+    ('Memphis Grizzlies', None, None, 'Memphis Grizzlies', 'W', 'M'),
+
+    # New Jersey Nets became the Brooklyn Nets from 2013 onward
+    ('New Jersey Nets', None, None, 'Brooklyn Nets', 'E', 'A'),
+    ('Brooklyn Nets', None, None, 'Brooklyn Nets', 'E', 'A'),
+
+    # The original Charlotte Hornets (through 2002) became the New Orleans Hornets, played as the
+    # New Orleans/Oklahoma City Hornets 2006-2007 (Hurricane Katrina) and became the Pelicans from 2014
+    ('Charlotte Hornets', None, 2002, 'New Orleans Pelicans', 'W', 'SW'),
+    ('New Orleans Hornets', None, None, 'New Orleans Pelicans', 'W', 'SW'),
+    ('New Orleans/Oklahoma City Hornets', None, None, 'New Orleans Pelicans', 'W', 'SW'),
+    ('New Orleans Pelicans', None, None, 'New Orleans Pelicans', 'W', 'SW'),
+
+    # Today's Charlotte Hornets are the Charlotte Bobcats expansion team (2005 onward), renamed in 2015
+    ('Charlotte Bobcats', None, None, 'Charlotte Hornets', 'E', 'C'),
+    ('Charlotte Hornets', 2003, None, 'Charlotte Hornets', 'E', 'C'),
+]
+
+LINEAGE_COLUMNS = ['team', 'first_season', 'last_season', 'franchise', 'conf', 'div']
+
+# Basketball Reference team abbreviations (player tables) -> team name of the day. CHH and CHO are both the
+# Charlotte Hornets; the season decides the franchise, as in LINEAGE
+TEAM_CODES = {
+    'ATL': 'Atlanta Hawks', 'BOS': 'Boston Celtics', 'BRK': 'Brooklyn Nets', 'NJN': 'New Jersey Nets',
+    'CHA': 'Charlotte Bobcats', 'CHO': 'Charlotte Hornets', 'CHH': 'Charlotte Hornets', 'CHI': 'Chicago Bulls',
+    'CLE': 'Cleveland Cavaliers', 'DAL': 'Dallas Mavericks', 'DEN': 'Denver Nuggets', 'DET': 'Detroit Pistons',
+    'GSW': 'Golden State Warriors', 'HOU': 'Houston Rockets', 'IND': 'Indiana Pacers', 'LAC': 'Los Angeles Clippers',
+    'LAL': 'Los Angeles Lakers', 'MEM': 'Memphis Grizzlies', 'VAN': 'Vancouver Grizzlies', 'MIA': 'Miami Heat',
+    'MIL': 'Milwaukee Bucks', 'MIN': 'Minnesota Timberwolves', 'NOH': 'New Orleans Hornets',
+    'NOK': 'New Orleans/Oklahoma City Hornets', 'NOP': 'New Orleans Pelicans', 'NYK': 'New York Knicks',
+    'OKC': 'Oklahoma City Thunder', 'SEA': 'Seattle SuperSonics', 'ORL': 'Orlando Magic', 'PHI': 'Philadelphia 76ers',
+    'PHO': 'Phoenix Suns', 'POR': 'Portland Trail Blazers', 'SAC': 'Sacramento Kings', 'SAS': 'San Antonio Spurs',
+    'TOR': 'Toronto Raptors', 'UTA': 'Utah Jazz', 'WAS': 'Washington Wizards',
+}
+
+# Today's abbreviation for each of the 30 franchises, the team partitions of the player tables. The dashboard
+# keeps a copy (nba_dash/player_store.py) to read them with, so a change here goes there too
+FRANCHISE_CODES = {
+    'Atlanta Hawks': 'ATL', 'Boston Celtics': 'BOS', 'Brooklyn Nets': 'BRK', 'Charlotte Hornets': 'CHO',
+    'Chicago Bulls': 'CHI', 'Cleveland Cavaliers': 'CLE', 'Dallas Mavericks': 'DAL', 'Denver Nuggets': 'DEN',
+    'Detroit Pistons': 'DET', 'Golden State Warriors': 'GSW', 'Houston Rockets': 'HOU', 'Indiana Pacers': 'IND',
+    'Los Angeles Clippers': 'LAC', 'Los Angeles Lakers': 'LAL', 'Memphis Grizzlies': 'MEM', 'Miami Heat': 'MIA',
+    'Milwaukee Bucks': 'MIL', 'Minnesota Timberwolves': 'MIN', 'New Orleans Pelicans': 'NOP', 'New York Knicks': 'NYK',
+    'Oklahoma City Thunder': 'OKC', 'Orlando Magic': 'ORL', 'Philadelphia 76ers': 'PHI', 'Phoenix Suns': 'PHO',
+    'Portland Trail Blazers': 'POR', 'Sacramento Kings': 'SAC', 'San Antonio Spurs': 'SAS', 'Toronto Raptors': 'TOR',
+    'Utah Jazz': 'UTA', 'Washington Wizards': 'WAS',
+}
+
+def lineage_table(lineage=LINEAGE):
+    return pd.DataFrame(lineage, columns=LINEAGE_COLUMNS)
+
+# Join each row of a frame with team and year columns to its lineage row (franchise, and conf/div with a
+# _franchise suffix where the frame has its own). Seasons of a listed team that no lineage row covers are dropped
+def match_lineage(frame, lineage=LINEAGE):
+    frame = frame.merge(lineage_table(lineage), on='team', how='left', suffixes=('', '_franchise'))
+
+    year = frame['year']
+    covered = frame['franchise'].isna() | ((year >= frame['first_season'].fillna(year)) &
+                                           (year <= frame['last_season'].fillna(year)))
+    return frame[covered]
+
+# Today's franchise for each (team name, season) pair, e.g. for the two teams of every game
+def franchise_names(teams, years, lineage=LINEAGE):
+    frame = pd.DataFrame({'team': np.asarray(teams, dtype=object), 'year': np.asarray(years), 'row': np.arange(len(teams))})
+    frame = match_lineage(frame[['team', 'year', 'row']], lineage)
+    franchise = frame['franchise'].fillna(frame['team'])
+    return pd.Series(franchise.to_numpy(), index=frame['row'].to_numpy()).reindex(np.arange(len(teams))).to_numpy()
+
+# Remap a long (team, year) frame onto franchises in one join and one groupby over the whole frame.
+# Seasons combined into a franchise are summed (team names never overlap within a season), and every
+# franchise gets a row for every season, empty before it existed (e.g. Charlotte Hornets before 2005)
+def apply_lineage(long, lineage=LINEAGE):
+    frame = match_lineage(long.reset_index(), lineage)
+    year = frame['year']
+
+    franchise = frame['franchise'].fillna(frame['team'])
+    conf = frame['conf_franchise'].fillna(frame['conf'])
+    div = frame['div_franchise'].fillna(frame['div'])
+
+    stats = [col for col in long.columns if col not in ('conf', 'div')]
+    remapped = frame[stats].groupby([franchise.rename('team'), year]).sum(min_count=1)
+    labels = pd.DataFrame({'conf': conf, 'div': div}).groupby(franchise.rename('team')).last()
+
+    full_index = pd.MultiIndex.from_product([labels.index, sorted(year.unique())], names=['team', 'year'])
+    remapped = remapped.reindex(full_index)
+
+    teams = full_index.get_level_values('team')
+    remapped.insert(0, 'conf', labels['conf'].reindex(teams).to_numpy())
+    remapped.insert(1, 'div', labels['div'].reindex(teams).to_numpy())
+
+    return remapped
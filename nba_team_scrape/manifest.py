@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+# Hash just the ratings table when we can find it. The rest of the page (ads, timestamps) changes on
+# every request and would make every season look modified
+def content_hash(html, table_id='ratings'):
+    start = html.find('id="{}"'.format(table_id))
+    end = html.find('</table>', start)
+    if start != -1 and end != -1:
+        html = html[start:end]
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+# Per-season record of what we last fetched and parsed: validators for conditional requests
+# (ETag / Last-Modified), a content hash of the table_id table and when the season was last parsed.
+# Keys are usually years, but any page key works (e.g. '2020-january' for schedule months)
+class Manifest:
+    def __init__(self, path, seasons=None, table_id='ratings'):
+        self.path = path
+        self.seasons = seasons or {}
+        self.table_id = table_id
+
+    @classmethod
+    def load(cls, path, table_id='ratings'):
+        if not os.path.exists(path):
+            return cls(path, table_id=table_id)
+        with open(path) as f:
+            return cls(path, json.load(f), table_id)
+
+    def save(self):
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(self.seasons, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, year):
+        return self.seasons.get(str(year), {})
+
+    # Forget seasons whose output is gone so they're fetched and parsed again
+    def drop_missing(self, years, path_for):
+        for year in years:
+            if not os.path.exists(path_for(year)):
+                self.seasons.pop(str(year), None)
+
+    # Headers for a conditional GET, empty if we've never seen the season
+    def conditional_headers(self, year):
+        entry = self.get(year)
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # Record a 200 response. Returns True if the season's content changed since it was last parsed
+    def update(self, year, response):
+        entry = self.seasons.setdefault(str(year), {})
+        entry['url'] = response.url
+        entry['etag'] = response.headers.get('ETag')
+        entry['last_modified'] = response.headers.get('Last-Modified')
+        sha256 = content_hash(response.text, self.table_id)
+        changed = sha256 != entry.get('sha256')
+        entry['sha256'] = sha256
+        return changed
+
+    def mark_parsed(self, year):
+        self.seasons.setdefault(str(year), {})['parsed_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
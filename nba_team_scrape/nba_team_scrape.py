@@ -17,19 +17,34 @@ import pandas as pd
 import numpy as np
 import io
 import os
+import sys
 
-# Web scraping using BeautifulSoup and converting to pandas dataframe
+# Web scraping and converting to pandas dataframe
 import requests
 import urllib.request
 from urllib.request import urlopen
-from bs4 import BeautifulSoup
 
-from time import sleep
 from warnings import warn
-from random import randint
+from contextlib import nullcontext
 
-# Merging dataframes in dictionary of dataframes
-from functools import partial, reduce
+# Concurrent, rate-limited fetching of the season pages
+from fetch import BASE_URL, fetch_seasons, save_pages, serve_pages
+from manifest import Manifest
+
+# Parsing just the ratings table out of each page
+from parse import parse_ratings
+
+# Stacking the per-season dataframes into long format
+from reshape import stack_seasons, update_stacked, relabel_long
+
+# Mapping historical teams onto today's franchises
+from lineage import apply_lineage
+
+# Game results streamed into season-partitioned parquet
+from games import ingest_games
+
+# Player tables stored partitioned by season and team
+from players import PLAYER_TABLES, ingest_players
 
 from pandas import MultiIndex
 
@@ -48,28 +63,28 @@ directory = '/users/hpoola/Desktop/nba_team_scrape/'
 start_year = 2000
 end_year = 2020
 
-# Get website and create BeautifulSoup object
-def get_html(year):
-    url = ('https://www.basketball-reference.com/leagues/NBA_{}_ratings.html'.format(year))
-    html = urlopen(url)
-    soup = BeautifulSoup(html, 'lxml')
-    return soup
-
-# Get variable headers for the statistics from the page
-def get_header(soup):
-    header = [th.get_text() for th in soup.find_all('tr')[1].find_all('th')]
-    header = header[1:] # Don't need rank column
-    header = [item.replace('%', '_percent').replace('/', '_').lower() for item in header] # replace special characters and convert to lower case
-    return header
-
-# Get the team statistics
-def get_stats(soup, headers):
-    stats = []
-    rows = soup.find_all('tr', class_=None)
-    for i in range(len(rows)):
-        stats.append([j.text for j in rows[i].find_all('td')]) # list comprehension: get the text of the table data (td) for each row
-    stats = pd.DataFrame(stats, columns=headers)
-    return stats
+# Saved pages are kept here. Set NBA_SCRAPE_OFFLINE=1 to scrape them through a local stand-in server instead of the site
+pages_dir = os.path.join(directory, 'pages')
+offline = os.environ.get('NBA_SCRAPE_OFFLINE') == '1'
+
+# What we last fetched and parsed for each season, so unchanged seasons are skipped
+manifest_path = os.path.join(directory, 'manifest.json')
+season_csv = os.path.join(directory, 'nba_team_stats_{}.csv')
+
+# Every season's rows stacked as parsed, before the long format and franchise changes, so a run updates just the
+# seasons that changed in it rather than reading every season's csv again
+stacked_csv = os.path.join(directory, 'nba_team_stats_stacked.csv')
+
+# Game results, one parquet partition per season (games/season=2020/games.parquet), and their own manifest.
+# Past seasons' games and player tables are final, so only the last season is checked unless the script is run
+# with --full
+games_dir = os.path.join(directory, 'games')
+games_manifest_path = os.path.join(directory, 'games_manifest.json')
+full = '--full' in sys.argv[1:]
+
+# Player tables, each partitioned by season and franchise (players/per_game/season=2020/team=LAL/part-0.parquet)
+players_dir = os.path.join(directory, 'players')
+players_manifest_path = os.path.join(directory, 'players_{}_manifest.json')
 
 # Format dataframe
 def format_dataframe(team_stats):
@@ -82,11 +97,6 @@ def format_dataframe(team_stats):
             drop_cols.append(col)
     team_stats = team_stats.drop(columns=drop_cols)
 
-    # Convert numerical columns to numeric
-    cols = [i for i in team_stats.columns if i not in ['team', 'conf', 'div']] # list comprehension: columns that aren't non-numer columns player, pos, team
-    for col in cols:
-        team_stats[col] = pd.to_numeric(team_stats[col])
-
     # Fill blanks
     team_stats = team_stats.fillna(0)
 
@@ -95,30 +105,62 @@ def format_dataframe(team_stats):
 
 # Main loop to get team statistics for years of interest
 
-# Loop through the years
-for year in range(start_year, end_year + 1):
-    team_stats = pd.DataFrame() # team_stats dataframe for each year (make sure that it's inside the for loop!)
-
-    # Slow down the web scrape to avoid server getting overloaded
-    sleep(randint(1, 4))
+manifest = Manifest.load(manifest_path)
+manifest.drop_missing(range(start_year, end_year + 1), season_csv.format)
 
-    # Get website
-    html_soup = get_html(year)
+# Fetch every season's page up front on a small thread pool. Requests share one keep-alive session and
+# a per-host token bucket keeps us under the site's rate limit, so there's no need to sleep between pages.
+# Requests are conditional on the manifest, so only seasons that changed come back (in-season, just the current one)
+with serve_pages(pages_dir) if offline else nullcontext(BASE_URL) as base_url:
+    pages = fetch_seasons(range(start_year, end_year + 1), base_url=base_url, manifest=manifest)
 
-    # Get header
-    if year == start_year:
-        headers = get_header(html_soup)
+if not offline:
+    save_pages(pages, pages_dir)
 
-    # Get team stats
-    team_stats = team_stats.append(get_stats(html_soup, headers), ignore_index=True)
-
-    team_stats = team_stats.drop([0]) # drop the first row with blank data
+# Loop through the seasons that changed
+for year in sorted(pages):
+    # Get team stats: only the ratings table is parsed, already typed (no BeautifulSoup tree, no per-column to_numeric)
+    team_stats = parse_ratings(pages[year])
 
     print('{} table completed.'.format(year))
 
     # Format the datatframe
     format_dataframe(team_stats)
 
+    manifest.mark_parsed(year)
+
+manifest.save()
+
+
+# ## Scrape Games
+
+# Every game's result from the monthly schedule pages, one season at a time: each month page is parsed and
+# appended to its season's parquet file as it's read, so memory stays at one month of games however many
+# seasons are scraped. Only seasons with a changed month are rewritten
+games_manifest = Manifest.load(games_manifest_path, table_id='schedule')
+with serve_pages(pages_dir) if offline else nullcontext(BASE_URL) as base_url:
+    ingest_games(range(start_year, end_year + 1), games_dir, pages_dir, base_url=base_url,
+                 manifest=games_manifest, offline=offline, full=full)
+games_manifest.save()
+
+
+# ## Scrape Players
+
+# Per game, per 36 minute, per 100 possession and advanced player stats for each season. Each table has its own
+# manifest, so only seasons whose table changed are rewritten. Without --full only the last season (and any
+# season not written yet) is fetched
+with serve_pages(pages_dir) if offline else nullcontext(BASE_URL) as base_url:
+    for table, table_id in PLAYER_TABLES.items():
+        players_manifest = Manifest.load(players_manifest_path.format(table), table_id=table_id)
+        ingest_players(table, range(start_year, end_year + 1), players_dir, pages_dir, base_url=base_url,
+                       manifest=players_manifest, offline=offline, full=full)
+        players_manifest.save()
+
+# Nothing downstream to rebuild if no season changed
+if not pages:
+    print('All seasons up to date.')
+    raise SystemExit
+
 
 # Create multiple dataframes using dict comprehension - https://stackoverflow.com/questions/28143573/generate-multiple-pandas-data-frames
 
@@ -129,64 +171,43 @@ for year in range(start_year, end_year + 1):
 a = range(start_year,end_year+1)
 years = list(map(str,a))
 
-# Create suffix for each year for column names (e.g., '_2020')
-suffix = list(map('_'.__add__, str(years)))
-
-# Dict comprehension to create dictionary of dataframes (by year) from each csv
-filepath = '/users/hpoola/Desktop/nba_team_scrape/nba_team_stats_{}.csv'
-dfs = {year: pd.read_csv(filepath.format(year)) for year in years}
-
-# Add suffix for the column headings we need for each year's dataframe in dictionary of dataframes
-for year in years:
-    dfs[year].columns = dfs[year].columns.map(lambda x: x + '_'+str(year) if x != 'team' and x != 'conf' and x != 'div' else x)
+# Dict comprehension to create dictionary of dataframes (by year) from the csv of each season that changed (or
+# isn't stacked yet), and swap their rows into the stacked seasons. Without a stacked file every season is read
+if os.path.exists(stacked_csv):
+    stacked = pd.read_csv(stacked_csv)
+    read_years = [year for year in years if int(year) in pages or int(year) not in set(stacked['year'])]
+    dfs = {year: pd.read_csv(season_csv.format(year)) for year in read_years}
+    stacked = update_stacked(stacked, dfs, years)
+else:
+    dfs = {year: pd.read_csv(season_csv.format(year)) for year in years}
+    stacked = stack_seasons(dfs)
+stacked.to_csv(stacked_csv, index=False)
+print('Read {} of {} seasons.'.format(len(dfs), len(years)))
 
 
 # In[4]:
 
 
-def merged_df(dfs):
-    merged = reduce(lambda left, right: pd.merge(left,
-                                                 right,
-                                                 on = ['team', 'conf', 'div'],
-                                                 how='outer'),
-                                                 dfs)
-    return merged
-
-NBA = merged_df(dfs.values()).groupby('team').first().reset_index()
+# Stack the seasons straight into long (team, year) format. Names of divisions have changed for select
+# teams in the time period, so each team takes its most current conf and div in the same pass. This pass (and
+# the franchise changes below) covers every season, since a team's latest season relabels all of its rows
+NBA_long = relabel_long(stacked)
 
 
 # In[5]:
 
 
-NBA
-
-# Names of divisions have changed for select teams in the time period, let's update with most current
-NBA.iloc[0,2] = 'SE'
-NBA.iloc[4,2] = 'SE'
-NBA.iloc[7,2] = 'SW'
-NBA.iloc[8,2] = 'NW'
-NBA.iloc[11,2] = 'SW'
-NBA.iloc[15,2] = 'SW'
-NBA.iloc[16,2] = 'SE'
-NBA.iloc[18,2] = 'NW'
-NBA.iloc[25,2] = 'SE'
-NBA.iloc[28,2] = 'NW'
-NBA.iloc[30,2] = 'SW'
-NBA.iloc[32,2] = 'A'
-NBA.iloc[33,2] = 'NW'
-NBA.iloc[35,2] = 'SE'
-
 # Let's look at the current 30 teams
-dfs['2020'].team.to_frame()
+stacked[stacked['year'] == end_year].team.to_frame()
 
 
 # All teams from 2000 to 2020 - 36 teams
-NBA.team.to_frame()
+NBA_long.index.get_level_values('team').unique().to_frame()
 
 # Create dataframe with rows that include null values
-null_mask = NBA.isnull()
+null_mask = NBA_long.isnull()
 row_has_null = null_mask.any(axis=1)
-null_df = NBA[row_has_null]
+null_df = NBA_long[row_has_null]
 null_df
 
 
@@ -255,162 +276,21 @@ null_df
 # To keep track of this, we will do something that you should never do lightly. We are going to override our team data table to make sure the ‘CHH’ games are grouped with the current Pelicans franchise. We are effectively going to undo the Charlotte/New Orleans deal to transfer the Hornets history.
 
 
-NBA.shape
-
-
-# ## Convert from Wide to Long format
-
+NBA_long.shape
 
-NBA_long = pd.wide_to_long(NBA, stubnames=['w_l_percent','mov','ortg','drtg','nrtg','mov_a','ortg_a','drtg_a','nrtg_a'], i='team', j='year', sep='_', suffix='\d+')
 NBA_long.head(40)
 
 
-# ## Oklahoma City Thunder
-
-
-thunder = NBA_long.loc[['Oklahoma City Thunder', 'Seattle SuperSonics'],:]
-
-# Change Seattle SuperSonics to Oklahoma City Thunder in index
-teams = thunder.index.get_level_values('team').to_list()
-teams = ['Oklahoma City Thunder' if x=='Seattle SuperSonics' else x for x in teams]
-new_index = zip(teams, thunder.index.get_level_values('year'))
-thunder.index = pd.MultiIndex.from_tuples(new_index, names = thunder.index.names)
-
-thunder = thunder.groupby(['team','year']).sum().assign(conf='W', div='NW')
-
-cols = list(thunder.columns.values) #Make a list of all of the columns in the df
-cols.pop(cols.index('conf')) #Remove conf from list
-cols.pop(cols.index('div')) #
-
-thunder = thunder[['conf','div'] + cols]
-thunder
-
-
-# ## Memphis Grizzlies
-
-
-grizzlies = NBA_long.loc[['Memphis Grizzlies', 'Vancouver Grizzlies'],:]
-
-# Change Vancouver Grizzlies to Memphis Grizzlies in index
-teams = grizzlies.index.get_level_values('team').to_list()
-teams = ['Memphis Grizzlies' if x=='Vancouver Grizzlies' else x for x in teams]
-new_index = zip(teams, grizzlies.index.get_level_values('year'))
-grizzlies.index = pd.MultiIndex.from_tuples(new_index, names = grizzlies.index.names)
-
-grizzlies = grizzlies.groupby(['team','year']).sum().assign(conf='W', div='M')
-
-cols = list(grizzlies.columns.values) #Make a list of all of the columns in the df
-cols.pop(cols.index('conf')) #Remove conf from list
-cols.pop(cols.index('div')) #
-
-grizzlies = grizzlies[['conf','div'] + cols]
-grizzlies
-
+# ## Franchise changes
 
-# ## Brooklyn Nets
-
-
-nets = NBA_long.loc[['Brooklyn Nets', 'New Jersey Nets'],:]
-
-# Change New Jersey Nets to Brooklyn Nets in index
-teams = nets.index.get_level_values('team').to_list()
-teams = ['Brooklyn Nets' if x=='New Jersey Nets' else x for x in teams]
-new_index = zip(teams, nets.index.get_level_values('year'))
-nets.index = pd.MultiIndex.from_tuples(new_index, names = nets.index.names)
-
-nets = nets.groupby(['team','year']).sum().assign(conf='E', div='A')
-
-cols = list(nets.columns.values) #Make a list of all of the columns in the df
-cols.pop(cols.index('conf')) #Remove conf from list
-cols.pop(cols.index('div')) #
-
-nets = nets[['conf','div'] + cols]
-nets
-
-
-# ## Charlotte Hornets
-
-# - Charlotte Hornets became New Orleans Hornets from 2003 onward
-# - Charlotte Bobcats joined as expansion team from 2005 onward
-# - New Orleans Hornets became New Orleans/Oklahoma City Hornets from 2006 through 2007
-# - New Orleans Hornets became New Orleans Pelicans from 2014 onward
-# - Charlotte Bobcats became Charlotte Hornets from 2015 onward
-#
-# Charlotte Hornets:
-# - Combine Charlotte Bobcats with only 2003-onward Charlotte Hornets (original Charlotte Hornets from 2000 through 2002 are actually today's New Orleans Pelicans)
-#
-
-
-hornets = NBA_long.loc[['Charlotte Hornets', 'Charlotte Bobcats'],:]
-
-# Replace Charlotte Hornets 2000,2001,2002 numeric values with NaN (this cohort of players actually maps to today's New Orleans Pelicans)
-hornets.loc[('Charlotte Hornets', [2000,2001,2002]), :] = hornets.loc[('Charlotte Hornets', [2000,2001,2002]), :]                                                                 .astype('str')                                                                 .replace({'\d+': np.nan}, regex=True)
-
-# Change Charlotte Bobcats to Charlotte Hornets in index
-teams = hornets.index.get_level_values('team').to_list()
-teams = ['Charlotte Hornets' if x=='Charlotte Bobcats' else x for x in teams]
-new_index = zip(teams, hornets.index.get_level_values('year'))
-hornets.index = pd.MultiIndex.from_tuples(new_index, names = hornets.index.names)
-
-hornets = hornets.groupby(['team','year']).sum().assign(conf='E', div='C')
-
-cols = list(hornets.columns.values) #Make a list of all of the columns in the df
-cols.pop(cols.index('conf')) #Remove conf from list
-cols.pop(cols.index('div')) #
-
-hornets = hornets[['conf','div'] + cols]
-hornets
-
-
-# ## New Orleans Pelicans
-
-#
-# New Orleans Pelicans:
-# - Combine New Orleans Hornets, New Orleans/Oklahoma City Hornets, New Orleans Pelicans
-# - Combine Charlotte Hornets 2000 through 2002 with above
-
-
-pelicans = NBA_long.loc[['Charlotte Hornets', 'New Orleans Hornets', 'New Orleans/Oklahoma City Hornets', 'New Orleans Pelicans'],:]
-
-# Replace Charlotte Hornets 2003-2020 numeric values with NaN (this cohort of players actually map to today's Charlotte Hornets, not thePelicans)
-non_hornets_years = list(range(2003,2021))
-pelicans.loc[('Charlotte Hornets', non_hornets_years), :] = hornets.loc[('Charlotte Hornets', non_hornets_years), :]                                                                   .astype('str')                                                                   .replace({'\d+': np.nan}, regex=True)
-
-# Change New Orleans Hornets, Charlotte Hornets, New Orleans/Oklahoma City Hornets to New Orleans Pelicans
-teams = pelicans.index.get_level_values('team').to_list()
-teams = ['New Orleans Pelicans' if x=='New Orleans Hornets' or x=='Charlotte Hornets' or x=='New Orleans/Oklahoma City Hornets' else x for x in teams]
-new_index = zip(teams, pelicans.index.get_level_values('year'))
-pelicans.index = pd.MultiIndex.from_tuples(new_index, names = pelicans.index.names)
-
-pelicans = pelicans.groupby(['team','year']).sum().assign(conf='W', div='SW')
-
-cols = list(pelicans.columns.values) #Make a list of all of the columns in the df
-cols.pop(cols.index('conf')) #Remove conf from list
-cols.pop(cols.index('div')) #
-
-pelicans = pelicans[['conf','div'] + cols]
-pelicans
-
-
-# # NBA Dataframe with updated teams
-
-NBA_long.drop(['Oklahoma City Thunder', 'Seattle SuperSonics', 'Memphis Grizzlies', 'Vancouver Grizzlies','Brooklyn Nets', 'New Jersey Nets',
-               'Charlotte Hornets', 'Charlotte Bobcats', 'New Orleans Hornets', 'New Orleans/Oklahoma City Hornets', 'New Orleans Pelicans'],
-               level=0, inplace=True)
-
-
-
-# Concat NBA long with updated team dataframes, sort rows by year (level 1 index, axis 0)
-NBA_long = pd.concat([NBA_long, thunder, grizzlies, nets, hornets, pelicans], axis=0).sort_index(level=1, axis=0)
+# Map every team's seasons onto today's 30 franchises (Thunder, Grizzlies, Nets, Hornets, Pelicans) using the
+# lineage table in lineage.py, in one join and groupby over the whole frame. Today's Charlotte Hornets map back to
+# the expansion Charlotte Bobcats, so their seasons before 2005 come out empty. Sort rows by year (level 1 index, axis 0)
+NBA_long = apply_lineage(NBA_long).sort_index(level=1, axis=0)
 NBA_long
 
 
 
-#Since today's Charlotte Hornets maps back to the expansion team Chatlotte Bobcats, which joined from 2005 onward, we'll replace values before with NaN
-NBA_long.loc[('Charlotte Hornets', [2000,2001,2002, 2003, 2004]), :] = NBA_long.loc[('Charlotte Hornets', [2000,2001,2002,2003,2004]), :]                                                                               .astype('str')                                                                               .replace({'\d+': np.nan}, regex=True)
-
-
-
 
 # We see that each year has exactly 30 teams, which is what we want. They also map to today's franchises
 NBA_long.groupby(level='year').size()
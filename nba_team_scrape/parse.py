@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+CHUNK_SIZE = 1 << 16
+
+# Rows Basketball Reference uses for decoration rather than data (over-headers, repeated headers, spacers)
+SKIP_ROW_CLASSES = {'over_header', 'thead', 'spacer'}
+
+def to_number(text):
+    try:
+        return float(text.replace(',', ''))
+    except ValueError:
+        return np.nan
+
+# lxml parser target that keeps only the cells of one table (found by id) and ignores the rest of the page,
+# so no document tree is ever built. Body cells are typed as they're read: text_columns (matched on data-stat)
+# stay strings and everything else becomes a float. Tables hidden inside html comments, as Basketball Reference
+# does for secondary tables, are parsed too
+class TableTarget:
+    def __init__(self, table_id, text_columns=()):
+        self.table_id = table_id
+        self.text_columns = set(text_columns)
+        self.depth = 0
+        self.section = None
+        self.row = None
+        self.cell = None
+        self.header = []
+        self.stats = []
+        self.rows = []
+        # Positions in rows where a repeated header row sat in the body (e.g. the "Playoffs" divider in schedules)
+        self.breaks = []
+        self.done = False
+
+    def start(self, tag, attrib):
+        if self.done:
+            return
+        if self.depth == 0:
+            if tag == 'table' and attrib.get('id') == self.table_id:
+                self.depth = 1
+            return
+        if tag == 'table':
+            self.depth += 1
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.section = tag
+        elif tag == 'tr':
+            classes = attrib.get('class', '').split()
+            self.row = None if SKIP_ROW_CLASSES.intersection(classes) else []
+            if self.section == 'tbody' and 'thead' in classes:
+                self.breaks.append(len(self.rows))
+        elif tag in ('th', 'td') and self.row is not None:
+            self.cell = []
+            self.row.append(attrib.get('data-stat'))
+
+    def data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+    def end(self, tag):
+        if self.done or self.depth == 0:
+            return
+        if tag == 'table':
+            self.depth -= 1
+            self.done = self.depth == 0
+        elif tag in ('th', 'td') and self.cell is not None:
+            stat = self.row.pop()
+            text = ''.join(self.cell).strip()
+            if self.section == 'thead':
+                self.row.append((text, stat))
+            elif stat in self.text_columns:
+                self.row.append(text)
+            else:
+                self.row.append(to_number(text))
+            self.cell = None
+        elif tag == 'tr' and self.row is not None:
+            if self.section == 'thead':
+                self.header = [text for text, _ in self.row]
+                self.stats = [stat for _, stat in self.row]
+            elif self.section == 'tbody' and self.row:
+                self.rows.append(self.row)
+            self.row = None
+
+    def comment(self, text):
+        if not self.done and self.depth == 0 and 'id="{}"'.format(self.table_id) in text:
+            nested = parse_table(text, self.table_id, self.text_columns)
+            self.header, self.stats, self.rows, self.breaks = nested.header, nested.stats, nested.rows, nested.breaks
+            self.done = True
+
+    def close(self):
+        return self
+
+# Stream a page through the table target, stopping as soon as the table has been read
+def parse_table(html, table_id, text_columns=()):
+    target = TableTarget(table_id, text_columns)
+    parser = etree.HTMLParser(target=target)
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        if target.done:
+            break
+    parser.close()
+    return target
+
+# Table as a dataframe with one column per header cell, named by the header text (names=None) or
+# by a function of (text, data-stat). Columns whose data-stat is in drop are left out
+def table_frame(target, names=None, drop=()):
+    keep = [i for i, stat in enumerate(target.stats) if stat not in drop]
+    columns = [names(target.header[i], target.stats[i]) if names else target.header[i] for i in keep]
+    data = {}
+    for col, i in zip(columns, keep):
+        values = [row[i] if i < len(row) else np.nan for row in target.rows]
+        data[col] = values if target.stats[i] in target.text_columns else np.array(values, dtype=float)
+    return pd.DataFrame(data, columns=columns)
+
+# Ratings table column names: replace special characters and convert to lower case
+def ratings_name(text, stat):
+    return text.replace('%', '_percent').replace('/', '_').lower()
+
+# Team ratings from an NBA_{year}_ratings.html page, typed in one pass (Rk column dropped)
+def parse_ratings(html):
+    target = parse_table(html, 'ratings', text_columns=('team_name', 'conf_id', 'division_id'))
+    return table_frame(target, names=ratings_name, drop=('ranker',))
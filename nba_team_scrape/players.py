@@ -0,0 +1,103 @@
+import os
+import re
+import shutil
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fetch import BASE_URL, RateLimiter, fetch_pages, save_pages
+from parse import parse_table, table_frame
+from lineage import TEAM_CODES, FRANCHISE_CODES, franchise_names
+
+# Player tables: page suffix -> id of the table on the page
+PLAYER_TABLES = {
+    'per_game': 'per_game_stats',
+    'per_minute': 'per_minute_stats',
+    'per_poss': 'per_poss_stats',
+    'advanced': 'advanced_stats',
+}
+PLAYERS_PATH = '/leagues/NBA_{}_{}.html'
+
+# Newer pages renamed a few data-stat attributes; columns are stored under the older names
+RENAMED_STATS = {'name_display': 'player', 'team_name_abbr': 'team_id'}
+PLAYER_TEXT = ('player', 'name_display', 'pos', 'team_id', 'team_name_abbr')
+
+# Season total row of a player who was traded: TOT on older pages, 2TM, 3TM... (number of teams) on newer ones.
+# All are stored under the TOT team partition, so readers find them in one place and can leave them out
+COMBINED_TEAM = re.compile(r'^(TOT|\dTM)$')
+COMBINED_CODE = 'TOT'
+
+def players_url(year, table, base_url=BASE_URL):
+    return base_url + PLAYERS_PATH.format(year, table)
+
+def players_page_name(table):
+    return lambda year: os.path.basename(PLAYERS_PATH.format(year, table))
+
+# Season directory of a player table in hive layout: per_game/season=2020/team=LAL/part-0.parquet
+def season_dir(players_dir, table, year):
+    return os.path.join(players_dir, table, 'season={}'.format(year))
+
+# One player table from a season's page, one row per player and team (plus the season total row of players who
+# were traded, see COMBINED_TEAM). Columns are named by data-stat, the blank spacer columns dropped, and every stat
+# is a float64 so seasons share one schema. The franchise (lineage.py) and its code, used as the team partition, are added
+def parse_players(html, table, year):
+    target = parse_table(html, PLAYER_TABLES[table], text_columns=PLAYER_TEXT)
+    drop = {stat for text, stat in zip(target.header, target.stats) if not text} | {'ranker'}
+    players = table_frame(target, names=lambda text, stat: RENAMED_STATS.get(stat, stat), drop=drop)
+
+    players['player'] = players['player'].str.rstrip('*')
+    names = players['team_id'].map(TEAM_CODES)
+    franchise = franchise_names(names.fillna('').to_numpy(), np.full(len(players), year))
+    players['franchise'] = np.where(names.notna(), franchise, None)
+    players['team'] = [COMBINED_CODE if COMBINED_TEAM.match(str(code)) else FRANCHISE_CODES.get(name, code)
+                       for name, code in zip(players['franchise'], players['team_id'])]
+    return players
+
+# Write a season of a player table, one file per team partition, all with the same schema. The season is written
+# to a temp directory and swapped in, so readers never see half a season
+def write_players(players, players_dir, table, year):
+    path = season_dir(players_dir, table, year)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    columns = [col for col in players.columns if col != 'team']
+    schema = pa.schema([(col, pa.string() if col in PLAYER_TEXT or col == 'franchise' else pa.float64()) for col in columns])
+    for team, rows in players.groupby('team', sort=True):
+        team_dir = os.path.join(tmp_path, 'team={}'.format(team))
+        os.makedirs(team_dir)
+        data = pa.Table.from_pandas(rows[columns], schema=schema, preserve_index=False)
+        pq.write_table(data, os.path.join(team_dir, 'part-0.parquet'), compression='snappy')
+
+    old_path = '{}.{}.old'.format(path, os.getpid())
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+# Fetch, save and write one player table for each season, one season at a time so only one page is held in
+# memory. Requests are conditional on the table's manifest and unchanged seasons are skipped. Seasons before the
+# last one are final, so as with games they're only fetched with full (or when their season directory is missing)
+def ingest_players(table, years, players_dir, pages_dir, base_url=BASE_URL, manifest=None, offline=False, limiter=None,
+                   full=False):
+    limiter = limiter or RateLimiter()
+    years = list(years)
+    if manifest is not None:
+        manifest.drop_missing(years, lambda year: season_dir(players_dir, table, year))
+
+    for year in years:
+        if not full and year != years[-1] and os.path.exists(season_dir(players_dir, table, year)):
+            continue
+        pages = fetch_pages([year], lambda year: players_url(year, table, base_url), manifest=manifest,
+                            missing_ok=True, limiter=limiter)
+        if not pages:
+            continue
+        if not offline:
+            save_pages(pages, pages_dir, players_page_name(table))
+
+        players = parse_players(pages[year], table, year)
+        write_players(players, players_dir, table, year)
+        print('{} {} completed ({} rows).'.format(year, table, len(players)))
+
+        if manifest is not None:
+            manifest.mark_parsed(year)
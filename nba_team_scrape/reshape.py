@@ -0,0 +1,35 @@
+import pandas as pd
+
+# Stack the per-season frames ({year: frame}) into one frame of every season's rows, with a year column
+def stack_seasons(dfs):
+    return pd.concat([df.assign(year=int(year)) for year, df in dfs.items()], ignore_index=True)
+
+# Replace the rows of the seasons in dfs ({year: frame}) in a stacked frame, leaving every other season's rows as
+# they were, and drop seasons outside years. Rows stay in season order
+def update_stacked(stacked, dfs, years):
+    keep = stacked[stacked['year'].isin([int(year) for year in years]) & ~stacked['year'].isin([int(year) for year in dfs])]
+    return pd.concat([keep, stack_seasons(dfs)], ignore_index=True).sort_values('year', kind='mergesort', ignore_index=True)
+
+# Stacked season rows into long (team, year) format. Every team gets a row for every season, empty where it
+# didn't play, which is the shape the franchise changes below expect
+def relabel_long(stacked):
+    long = stacked.sort_values('year', kind='mergesort')
+
+    # Names of divisions (and conferences) have changed for select teams in the time period.
+    # One pass: every row gets its team's most recent conf and div
+    latest = long.groupby('team')[['conf', 'div']].last()
+
+    long = long.drop(columns=['conf', 'div']).set_index(['team', 'year'])
+    full_index = pd.MultiIndex.from_product([latest.index, sorted(long.index.get_level_values('year').unique())],
+                                            names=['team', 'year'])
+    long = long.reindex(full_index)
+
+    teams = full_index.get_level_values('team')
+    long.insert(0, 'conf', latest['conf'].reindex(teams).to_numpy())
+    long.insert(1, 'div', latest['div'].reindex(teams).to_numpy())
+
+    return long
+
+# Stack the per-season frames ({year: frame}) straight into long (team, year) format
+def build_long(dfs):
+    return relabel_long(stack_seasons(dfs))
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import tempfile
+
+# Snapshots and prerendered figures for the test go to a scratch directory, not data/
+scratch = tempfile.mkdtemp()
+os.environ.setdefault('NBA_SNAPSHOT_DIR', os.path.join(scratch, 'snapshots'))
+os.environ.setdefault('NBA_PRERENDER_DIR', os.path.join(scratch, 'prerendered'))
+os.environ.setdefault('NBA_DASH_RELOAD_SECONDS', '0')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'nba_dash'))
+
+import nba_dash
+from payload import budget_figure
+
+# clickData for the first point of a figure as the browser sends it: the point's customdata from the figure's JSON
+def click_first_point(fig):
+    trace = json.loads(fig.to_json())['data'][0]
+    return {'points': [{'curveNumber': 0, 'pointNumber': 0, 'customdata': trace['customdata'][0]}]}
+
+def similar_panel(client, graph_id, panel_id, click_data):
+    body = {'output': '{}.children'.format(panel_id),
+            'outputs': {'id': panel_id, 'property': 'children'},
+            'inputs': [{'id': graph_id, 'property': 'clickData', 'value': click_data}],
+            'changedPropIds': ['{}.clickData'.format(graph_id)]}
+    response = client.post('/_dash-update-component', json=body)
+    assert response.status_code == 200
+    return json.dumps(json.loads(response.data)['response'][panel_id]['children'])
+
+def test_click_on_team_scatter_finds_the_season():
+    store = nba_dash.current().store
+    # One team: the team column is constant in the trace and hidden from the hover, which trim_hover would inline
+    fig = budget_figure(nba_dash.build_scatter_graph_2(store, ['Boston Celtics'], 2003, 2005), len(nba_dash.click_columns))
+    click_data = click_first_point(fig)
+
+    assert nba_dash.clicked_season(click_data) == ('Boston Celtics', 2003)
+    panel = similar_panel(nba_dash.server.test_client(), 'scatter-graph-2', 'similar-seasons-2', click_data)
+    assert 'Seasons most similar to the 2003 Boston Celtics' in panel
+
+def test_click_on_division_scatter_finds_the_season():
+    store = nba_dash.current().store
+    fig = budget_figure(nba_dash.build_scatter_graph_1(store, ['Boston Celtics', 'Miami Heat'], 2010, 2010),
+                        len(nba_dash.click_columns))
+    teams = {nba_dash.clicked_season({'points': [{'customdata': json.loads(fig.to_json())['data'][i]['customdata'][0]}]})
+             for i in range(len(fig.data))}
+
+    assert teams == {('Boston Celtics', 2010), ('Miami Heat', 2010)}
+
+def test_default_figures_keep_the_click_columns():
+    state = nba_dash.current()
+    for name in ['scatter-graph-1', 'scatter-graph-2']:
+        for trace in state.figures[name]['data']:
+            team, year = trace['customdata'][0][:2]
+            assert team in nba_dash.default_teams
+            assert year == int(year) and year >= 2000